@@ -0,0 +1,166 @@
+"""Benchmark runner for the parse -> design matrix -> fit pipeline.
+
+Usage (from the repository root)::
+
+    PYTHONPATH=src python benchmarks/run.py --profile small medium --output bench.json
+    PYTHONPATH=src python benchmarks/run.py --profile medium --compare bench.json
+
+Every case is timed ``--repeat`` times (best and median wall time reported) and
+run once more under ``tracemalloc`` to record peak Python/NumPy allocation.
+``--compare`` exits non-zero when a case is slower than the baseline by more
+than ``--threshold``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic import random_molecule, synthetic_graph, write_trajectory  # noqa: E402
+
+from linearESPcharges.linear import ANGSTROM_TO_BOHR, build_design_matrix, explicit_solution  # noqa: E402
+from parser import ParseDotXYZ, ParseESPXYZ, ParseRespDotOut, clear_cache  # noqa: E402
+from resp.resp import fit_resp_charges, fit_resp_system  # noqa: E402
+from symmetry import wl_refine  # noqa: E402
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "small": {"n_atoms": 30, "density": 1.0, "n_frames": 20},
+    "medium": {"n_atoms": 78, "density": 4.0, "n_frames": 100},
+    "large": {"n_atoms": 200, "density": 4.0, "n_frames": 200},
+}
+
+
+@dataclass
+class CaseResult:
+    profile: str
+    case: str
+    best_s: float
+    median_s: float
+    peak_mib: float
+    repeat: int
+
+
+def _measure(func: Callable[[], Any], repeat: int) -> tuple[float, float, float]:
+    timings: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(timings), statistics.median(timings), peak / 2**20
+
+
+def build_cases(profile: Dict[str, Any], workdir: Path) -> Dict[str, Callable[[], Any]]:
+    n_atoms = profile["n_atoms"]
+    resp_out, esp_xyz, geometry = write_trajectory(
+        workdir, n_atoms, profile["n_frames"], density=profile["density"]
+    )
+
+    frames = ParseRespDotOut(resp_out, n_atoms).extract_frames()
+    grid = ParseESPXYZ(esp_xyz).frames()[0]
+    grid_bohr = np.asarray(grid.coordinates) * ANGSTROM_TO_BOHR
+    V = np.asarray(grid.potentials)
+    atoms_bohr = np.asarray(frames[0].positions)
+    Q = float(np.sum(frames[0].esp_charges))
+    A = build_design_matrix(grid_bohr, atoms_bohr)
+    mask = np.ones(n_atoms, dtype=bool)
+    symbols = ParseDotXYZ(geometry).elements()[0].symbols
+    positions_angstrom, _ = random_molecule(n_atoms)
+    graph = synthetic_graph(symbols, positions_angstrom)
+
+    def fit_resp_from_files() -> Any:
+        clear_cache()
+        return fit_resp_charges(resp_out, esp_xyz, geometry, n_atoms, frame_index=0)
+
+    return {
+        "ParseRespDotOut.extract_frames": lambda: ParseRespDotOut(resp_out, n_atoms).extract_frames(),
+        "ParseESPXYZ.frames": lambda: ParseESPXYZ(esp_xyz).frames(),
+        "build_design_matrix": lambda: build_design_matrix(grid_bohr, atoms_bohr),
+        "explicit_solution.fit": lambda: explicit_solution().fit(A, V, Q),
+        "fit_resp_system": lambda: fit_resp_system(A, V, mask, Q),
+        "fit_resp_system[history=off]": lambda: fit_resp_system(A, V, mask, Q, history="off"),
+        "fit_resp_system[history=all]": lambda: fit_resp_system(A, V, mask, Q, history="all"),
+        "fit_resp_charges": fit_resp_from_files,
+        "wl_refine": lambda: wl_refine(graph, r=3),
+    }
+
+
+def run(profiles: List[str], repeat: int, cases_filter: List[str] | None) -> List[CaseResult]:
+    results: List[CaseResult] = []
+    for name in profiles:
+        profile = PROFILES[name]
+        with tempfile.TemporaryDirectory(prefix=f"biliresp-bench-{name}-") as tmp:
+            cases = build_cases(profile, Path(tmp))
+            for case, func in cases.items():
+                if cases_filter and not any(token in case for token in cases_filter):
+                    continue
+                best, median, peak = _measure(func, repeat)
+                results.append(CaseResult(name, case, best, median, peak, repeat))
+                print(f"{name:<7} {case:<32} best {best * 1e3:10.2f} ms  median {median * 1e3:10.2f} ms  peak {peak:9.1f} MiB")
+    return results
+
+
+def compare(results: List[CaseResult], baseline_path: Path, threshold: float) -> int:
+    baseline = {
+        (entry["profile"], entry["case"]): entry
+        for entry in json.loads(baseline_path.read_text())["results"]
+    }
+    regressions = 0
+    print(f"\nComparison against {baseline_path} (threshold x{threshold:.2f})")
+    for result in results:
+        reference = baseline.get((result.profile, result.case))
+        if reference is None:
+            continue
+        ratio = result.best_s / reference["best_s"]
+        flag = "REGRESSION" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"{result.profile:<7} {result.case:<32} x{ratio:6.2f} {flag}")
+    return 1 if regressions else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark biliresp parsing and fitting stages.")
+    parser.add_argument("--profile", nargs="+", choices=sorted(PROFILES), default=["small"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--case", nargs="*", default=None, help="Only run cases containing these substrings")
+    parser.add_argument("--output", type=Path, default=None, help="Write results as JSON")
+    parser.add_argument("--compare", type=Path, default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args()
+
+    results = run(args.profile, args.repeat, args.case)
+
+    if args.output is not None:
+        payload = {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "results": [asdict(result) for result in results],
+        }
+        args.output.write_text(json.dumps(payload, indent=1))
+        print(f"Wrote {args.output}")
+
+    if args.compare is not None:
+        sys.exit(compare(results, args.compare, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Synthetic TeraChem-like inputs of arbitrary size for benchmarking.
+
+Molecules are random clouds of C/N/O/H atoms with a minimum interatomic
+separation, grids come from :func:`linearESPcharges.grid.connolly_grid`, and
+potentials are generated from random reference charges so that fits are well
+posed.  Files are written with the package's own writers, so the parsers see
+exactly the layout they would read from TeraChem.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+import networkx as nx
+import numpy as np
+
+from linearESPcharges.grid import connolly_grid
+from linearESPcharges.linear import ANGSTROM_TO_BOHR, build_design_matrix
+from parser import write_esp_xyz, write_resp_out
+from parser.parser import ESPGridFrame, Frame
+
+_ELEMENTS = ("C", "C", "C", "N", "O", "H", "H", "H")
+_ATOMIC_NUMBERS = {"H": 1, "C": 6, "N": 7, "O": 8}
+
+
+def random_molecule(
+    n_atoms: int,
+    *,
+    min_distance: float = 1.3,
+    seed: int = 0,
+) -> Tuple[np.ndarray, List[str]]:
+    """Random compact molecule: ``(positions_angstrom, symbols)``."""
+
+    rng = np.random.default_rng(seed)
+    radius = 1.2 * (n_atoms ** (1.0 / 3.0)) * min_distance
+    positions: List[np.ndarray] = []
+    while len(positions) < n_atoms:
+        candidate = rng.uniform(-radius, radius, size=3)
+        if np.linalg.norm(candidate) > radius:
+            continue
+        if positions and np.min(np.linalg.norm(np.asarray(positions) - candidate, axis=1)) < min_distance:
+            continue
+        positions.append(candidate)
+    symbols = [str(s) for s in rng.choice(_ELEMENTS, size=n_atoms)]
+    return np.asarray(positions), symbols
+
+
+def synthetic_system(
+    n_atoms: int,
+    *,
+    density: float = 1.0,
+    seed: int = 0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]:
+    """Return ``(grid_bohr, esp_values, atom_positions_bohr, symbols)``."""
+
+    positions_angstrom, symbols = random_molecule(n_atoms, seed=seed)
+    atoms_bohr = positions_angstrom * ANGSTROM_TO_BOHR
+    grid_bohr = connolly_grid(atoms_bohr, symbols, density=density)
+    rng = np.random.default_rng(seed + 1)
+    charges = rng.normal(scale=0.3, size=n_atoms)
+    charges -= charges.mean()
+    esp = build_design_matrix(grid_bohr, atoms_bohr) @ charges
+    esp += rng.normal(scale=1e-3 * np.std(esp), size=esp.shape)
+    return grid_bohr, esp, atoms_bohr, symbols
+
+
+def write_trajectory(
+    directory: Path,
+    n_atoms: int,
+    n_frames: int,
+    *,
+    density: float = 1.0,
+    n_grids: int = 1,
+    jitter: float = 0.05,
+    seed: int = 0,
+) -> Tuple[Path, Path, Path]:
+    """Write ``resp.out``, ``esp.xyz`` and a geometry xyz for a jittered trajectory."""
+
+    directory.mkdir(parents=True, exist_ok=True)
+    grid_bohr, esp, atoms_bohr, symbols = synthetic_system(n_atoms, density=density, seed=seed)
+    rng = np.random.default_rng(seed + 2)
+    reference = rng.normal(scale=0.3, size=n_atoms)
+    reference -= reference.mean()
+
+    frames: List[Frame] = []
+    for _ in range(n_frames):
+        positions = atoms_bohr + rng.normal(scale=jitter, size=atoms_bohr.shape)
+        frames.append(
+            Frame(
+                center_of_mass=tuple(positions.mean(axis=0) / ANGSTROM_TO_BOHR),
+                dipole_moment_vector=(1.0, 0.0, 0.0),
+                dipole_moment_magnitude=1.0,
+                positions=[tuple(row) for row in positions],
+                esp_charges=list(reference),
+                exposure_fractions=list(rng.uniform(size=n_atoms)),
+                esp_rms_error=0.1,
+                resp_charges=list(reference),
+                resp_rms_error=0.1,
+            )
+        )
+    resp_out = write_resp_out(directory / "resp.out", frames, symbols)
+
+    grid_angstrom = grid_bohr / ANGSTROM_TO_BOHR
+    grids = [ESPGridFrame([tuple(row) for row in grid_angstrom], list(esp)) for _ in range(n_grids)]
+    esp_xyz = write_esp_xyz(directory / "esp.xyz", grids)
+
+    geometry = directory / "geometry.xyz"
+    with geometry.open("w") as fh:
+        fh.write(f"{n_atoms}\nsynthetic\n")
+        for symbol, (x, y, z) in zip(symbols, atoms_bohr / ANGSTROM_TO_BOHR):
+            fh.write(f"{symbol} {x:.6f} {y:.6f} {z:.6f}\n")
+    return resp_out, esp_xyz, geometry
+
+
+def synthetic_graph(symbols: Sequence[str], positions_angstrom: np.ndarray, *, cutoff: float = 1.9) -> nx.Graph:
+    """Distance-based bond graph with the node attributes ``wl_refine`` expects."""
+
+    graph = nx.Graph()
+    for idx, symbol in enumerate(symbols):
+        graph.add_node(idx, element=symbol, Z=_ATOMIC_NUMBERS[symbol])
+    diffs = positions_angstrom[:, None, :] - positions_angstrom[None, :, :]
+    distances = np.linalg.norm(diffs, axis=2)
+    for i, j in zip(*np.nonzero(np.triu(distances < cutoff, k=1))):
+        graph.add_edge(int(i), int(j), order=1.0, aromatic=False, bond_type="SINGLE")
+    return graph
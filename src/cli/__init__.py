@@ -0,0 +1,5 @@
+"""Command-line interface for batch trajectory processing."""
+
+from .main import build_parser, main
+
+__all__ = ["build_parser", "main"]
@@ -0,0 +1,314 @@
+"""``biliresp`` command-line interface.
+
+Every trajectory subcommand takes a ``--frames start:stop:step`` selection,
+parses only those frames, optionally spreads the work over ``--jobs`` worker
+processes (or overlaps parsing and fitting with ``--threads``) and writes one
+array per output column instead of printing per-atom lines.  Outputs ending in
+``.npz`` are written in one go; any other path is treated as a :mod:`results`
+store that rows are streamed into as frames finish.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Callable, Mapping, Sequence
+
+import numpy as np
+
+
+def _write_columns(path: Path, columns: Mapping[str, np.ndarray]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(path, **columns)
+    n_rows = len(next(iter(columns.values()))) if columns else 0
+    print(f"Wrote {n_rows} rows x {len(columns)} columns to {path}")
+
+
+def _write_output(path: Path, columns: Mapping[str, np.ndarray]) -> None:
+    """Write finished columns to ``path``: an ``.npz`` file or, for any other path, a results store."""
+    if path.suffix == ".npz":
+        _write_columns(path, columns)
+        return
+
+    from results import ResultsWriter
+
+    n_rows = len(next(iter(columns.values()))) if columns else 0
+    with ResultsWriter(path) as sink:
+        sink.extend({name: values[row] for name, values in columns.items()} for row in range(n_rows))
+    print(f"Wrote {sink.n_rows} rows to results store {path}")
+
+
+def _run_to_output(path: Path, driver: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+    if path.suffix == ".npz":
+        _write_columns(path, driver(*args, **kwargs))
+        return
+
+    from results import ResultsWriter
+
+    with ResultsWriter(path) as sink:
+        driver(*args, sink=sink, **kwargs)
+    print(f"Wrote {sink.n_rows} rows to results store {path}")
+
+
+def _cmd_index(args: argparse.Namespace) -> None:
+    from parser import ParseESPXYZ, ParseRespDotOut
+
+    index = {}
+    if args.resp_out is not None:
+        offsets = ParseRespDotOut(args.resp_out, 0).frame_offsets()
+        index["resp_out"] = {"path": str(args.resp_out), "frames": len(offsets), "offsets": offsets}
+    if args.esp_xyz is not None:
+        offsets = ParseESPXYZ(args.esp_xyz).block_offsets()
+        index["esp_xyz"] = {"path": str(args.esp_xyz), "blocks": len(offsets), "offsets": offsets}
+    if not index:
+        raise SystemExit("index: pass --resp-out and/or --esp-xyz")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(index, indent=1))
+    for name, entry in index.items():
+        unit = "frames" if "frames" in entry else "blocks"
+        print(f"{name}: {entry[unit]} {unit} in {entry['path']}")
+    print(f"Wrote index to {args.output}")
+
+
+def _cmd_convert(args: argparse.Namespace) -> None:
+    from trajectory import convert_frames
+
+    _run_to_output(args.output, convert_frames, args.resp_out, args.n_atoms, args.frames)
+
+
+def _cmd_fit_linear(args: argparse.Namespace) -> None:
+    from trajectory import fit_linear_frames
+
+    _run_to_output(
+        args.output,
+        fit_linear_frames,
+        args.resp_out,
+        args.esp_xyz,
+        args.n_atoms,
+        args.frames,
+        grid_frame_index=args.grid_frame,
+        total_charge=args.total_charge,
+        ridge=args.ridge,
+        precision=args.precision,
+        incremental_tol=args.incremental_tol,
+        jobs=args.jobs,
+        threads=args.threads,
+        checkpoint=args.checkpoint,
+    )
+
+
+def _cmd_fit_resp(args: argparse.Namespace) -> None:
+    from resp.resp import HyperbolicRestraint
+    from trajectory import fit_resp_frames
+
+    if args.loss_history != "off" and args.output.suffix != ".npz":
+        # Results stores hold fixed-shape columns only; the history would be dropped.
+        raise SystemExit("fit-resp: --loss-history needs an .npz output, results stores cannot hold it")
+    _run_to_output(
+        args.output,
+        fit_resp_frames,
+        args.resp_out,
+        args.esp_xyz,
+        args.geom_xyz,
+        args.n_atoms,
+        args.frames,
+        grid_frame_index=args.grid_frame,
+        total_charge=args.total_charge,
+        restraint=HyperbolicRestraint(a=args.a, b=args.b),
+        restrain_all_atoms=not args.heavy_atoms_only,
+        solver_tol=args.tol,
+        maxiter=args.maxiter,
+        precision=args.precision,
+        history=args.loss_history,
+        jobs=args.jobs,
+        threads=args.threads,
+        checkpoint=args.checkpoint,
+    )
+
+
+def _cmd_dipoles(args: argparse.Namespace) -> None:
+    from trajectory import dipole_frames
+
+    _run_to_output(
+        args.output,
+        dipole_frames,
+        args.resp_out,
+        args.esp_xyz,
+        args.n_atoms,
+        args.frames,
+        grid_frame_index=args.grid_frame,
+        jobs=args.jobs,
+        threads=args.threads,
+        checkpoint=args.checkpoint,
+    )
+
+
+def _cmd_parity(args: argparse.Namespace) -> None:
+    from resp.parity import parity_report
+    from resp.resp import HyperbolicRestraint
+
+    report = parity_report(
+        args.resp_out,
+        args.esp_xyz,
+        args.geom_xyz,
+        args.n_atoms,
+        args.frames,
+        restraint=HyperbolicRestraint(a=args.a, b=args.b),
+        restrain_all_atoms=not args.heavy_atoms_only,
+        grid_frame_index=args.grid_frame,
+        total_charge=args.total_charge,
+        jobs=args.jobs,
+        threads=args.threads,
+    )
+    print(report.summary())
+    _write_output(args.output, report.to_columns())
+    if args.plot is not None:
+        report.plot(filename=args.plot)
+        print(f"Wrote parity plot to {args.plot}")
+
+
+def _cmd_symmetry(args: argparse.Namespace) -> None:
+    from symmetry import buckets_from_pdb
+
+    buckets = buckets_from_pdb(args.pdb, radius=args.radius, remove_hs=not args.keep_hydrogens)
+    n_atoms = sum(len(bucket) for bucket in buckets)
+    labels = np.empty(n_atoms, dtype=np.int64)
+    for label, bucket in enumerate(buckets):
+        labels[bucket] = label
+    _write_columns(args.output, {"atom": np.arange(n_atoms), "bucket": labels})
+
+
+def _add_trajectory_arguments(sub: argparse.ArgumentParser, *, needs_grid: bool = True) -> None:
+    sub.add_argument("resp_out", type=Path)
+    if needs_grid:
+        sub.add_argument("esp_xyz", type=Path)
+    sub.add_argument("n_atoms", type=int)
+    sub.add_argument("--frames", default=None, help="Frame range start:stop:step (default: all frames)")
+    sub.add_argument("-o", "--output", type=Path, required=True, help="Output .npz file or results store directory")
+    if needs_grid:
+        sub.add_argument("--grid-frame", type=int, default=0, help="esp.xyz block used as the grid (default: 0)")
+        sub.add_argument("--jobs", type=int, default=1, help="Worker processes (default: 1)")
+        sub.add_argument(
+            "--threads",
+            type=int,
+            default=0,
+            help="Fit in this many threads while a reader thread parses ahead (default: 0, off)",
+        )
+
+
+def _add_checkpoint_argument(sub: argparse.ArgumentParser) -> None:
+    sub.add_argument(
+        "--checkpoint",
+        type=Path,
+        default=None,
+        help="Save each finished frame here and, on a rerun with the same inputs, fit only the missing frames",
+    )
+
+
+def _add_precision_argument(sub: argparse.ArgumentParser) -> None:
+    sub.add_argument(
+        "--precision",
+        choices=("double", "mixed"),
+        default="double",
+        help="Design matrix precision; 'mixed' stores A in float32 with float64 accumulation",
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="biliresp", description="Batch ESP/RESP charge tools for TeraChem trajectories.")
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        default=None,
+        help="Record per-stage timings and solver counters; print a summary and write a JSON trace here",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sub = subparsers.add_parser("index", help="Record frame/grid byte offsets for fast random access")
+    sub.add_argument("--resp-out", type=Path, default=None)
+    sub.add_argument("--esp-xyz", type=Path, default=None)
+    sub.add_argument("-o", "--output", type=Path, required=True, help="Output .json file")
+    sub.set_defaults(func=_cmd_index)
+
+    sub = subparsers.add_parser("convert", help="Convert resp.out frames to columnar arrays")
+    _add_trajectory_arguments(sub, needs_grid=False)
+    sub.set_defaults(func=_cmd_convert)
+
+    sub = subparsers.add_parser("fit-linear", help="Fit unrestrained ESP charges per frame")
+    _add_trajectory_arguments(sub)
+    sub.add_argument("--total-charge", type=float, default=None, help="Override the per-frame total charge")
+    sub.add_argument("--ridge", type=float, default=0.0)
+    sub.add_argument(
+        "--incremental-tol",
+        type=float,
+        default=None,
+        help="Reuse the previous frame's design matrix, recomputing columns of atoms that moved more than this (bohr)",
+    )
+    _add_precision_argument(sub)
+    _add_checkpoint_argument(sub)
+    sub.set_defaults(func=_cmd_fit_linear)
+
+    sub = subparsers.add_parser("fit-resp", help="Fit RESP charges per frame")
+    _add_trajectory_arguments(sub)
+    sub.add_argument("--geom-xyz", type=Path, required=True, help="Geometry xyz providing element symbols")
+    sub.add_argument("--total-charge", type=float, default=None, help="Override the per-frame total charge")
+    sub.add_argument("-a", type=float, default=0.0005, help="Restraint strength a")
+    sub.add_argument("-b", type=float, default=0.001, help="Restraint width b")
+    sub.add_argument("--heavy-atoms-only", action="store_true", help="Restrain heavy atoms only")
+    sub.add_argument("--tol", type=float, default=1e-11)
+    sub.add_argument("--maxiter", type=int, default=100)
+    sub.add_argument(
+        "--loss-history",
+        choices=("off", "outer", "all"),
+        default="off",
+        help="Record the loss per Newton step ('outer') or per residual evaluation ('all'); needs an .npz output",
+    )
+    _add_precision_argument(sub)
+    _add_checkpoint_argument(sub)
+    sub.set_defaults(func=_cmd_fit_resp)
+
+    sub = subparsers.add_parser("dipoles", help="QM, TeraChem and refitted dipoles per frame")
+    _add_trajectory_arguments(sub)
+    _add_checkpoint_argument(sub)
+    sub.set_defaults(func=_cmd_dipoles)
+
+    sub = subparsers.add_parser("parity", help="TeraChem RESP charges vs refitted RESP, KKT residuals and inferred a")
+    _add_trajectory_arguments(sub)
+    sub.add_argument("--geom-xyz", type=Path, required=True, help="Geometry xyz providing element symbols")
+    sub.add_argument("--total-charge", type=float, default=None, help="Override the per-frame total charge")
+    sub.add_argument("-a", type=float, default=0.0005, help="Restraint strength a")
+    sub.add_argument("-b", type=float, default=0.001, help="Restraint width b")
+    sub.add_argument("--heavy-atoms-only", action="store_true", help="Restrain heavy atoms only")
+    sub.add_argument("--plot", type=Path, default=None, help="Also save a parity plot of the charges here")
+    sub.set_defaults(func=_cmd_parity)
+
+    sub = subparsers.add_parser("symmetry", help="WL symmetry buckets for a PDB structure")
+    sub.add_argument("pdb", type=Path)
+    sub.add_argument("--radius", type=int, default=2)
+    sub.add_argument("--keep-hydrogens", action="store_true")
+    sub.add_argument("-o", "--output", type=Path, required=True, help="Output .npz file")
+    sub.set_defaults(func=_cmd_symmetry)
+
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    args = build_parser().parse_args(argv)
+    if args.trace is None:
+        args.func(args)
+        return
+
+    import sys
+
+    from instrumentation import recording
+
+    with recording(trace=True) as recorder:
+        args.func(args)
+    print(recorder.summary(), file=sys.stderr)
+    recorder.write_json(args.trace)
+
+
+if __name__ == "__main__":
+    main()
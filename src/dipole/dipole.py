@@ -2,8 +2,7 @@ import numpy as np
 from pathlib import Path
 from typing import Dict, Tuple
 
-from constants.atomic_masses import atomic_masses
-from parser import ParseDotXYZ, ParseRespDotOut
+from parser import ParseDotXYZ, ParseRespDotOut, load_topology
 
 BOHR_PER_ANG = 1.8897261254578281
 DEBYE_PER_E_BOHR = 2.541746
@@ -38,30 +37,26 @@ def center_of_mass_bohr_from_xyz(
     """Mass-weighted center of mass in bohr using element labels from an xyz file.
 
     ``coords`` lets callers supply any coordinates (e.g., from RESP output) while
-    still reusing the element-to-mass mapping from the xyz file.
+    still reusing the element-to-mass mapping from the xyz file.  Masses come
+    from the cached :func:`parser.load_topology`, so only the requested frame's
+    coordinates are parsed, and not at all when ``coords`` is given.
     """
 
-    frames = ParseDotXYZ(xyz_path).elements()
-    total_frames = len(frames)
-    if total_frames == 0:
-        raise ValueError("No frames available in xyz file")
-    try:
-        idx = _normalize_frame_index(frame_index, total_frames)
-    except IndexError:
-        idx = _normalize_frame_index(-1, total_frames)
-
-    frame = frames[idx]
-    symbols = frame.symbols
-    n_atoms = len(symbols)
+    topology = load_topology(xyz_path)
 
     if coords is None:
-        coords_ang = np.asarray(frame.coordinates, dtype=float)
+        parser = ParseDotXYZ(xyz_path)
+        offsets = parser.block_offsets()
+        total_frames = len(offsets)
+        if total_frames == 0:
+            raise ValueError("No frames available in xyz file")
+        try:
+            idx = _normalize_frame_index(frame_index, total_frames)
+        except IndexError:
+            idx = _normalize_frame_index(-1, total_frames)
+        coords_ang = np.asarray(parser.elements([idx], offsets=offsets)[0].coordinates, dtype=float)
     else:
         coords_arr = np.asarray(coords, dtype=float)
-        if coords_arr.shape != (n_atoms, 3):
-            raise ValueError(
-                f"Custom coordinates shape {coords_arr.shape} does not match number of atoms ({n_atoms})"
-            )
         unit = coords_unit.lower()
         if unit in {"ang", "angs", "angstrom", "angstroms"}:
             coords_ang = coords_arr
@@ -70,16 +65,4 @@ def center_of_mass_bohr_from_xyz(
         else:
             raise ValueError("coords_unit must be 'ang' (angstrom) or 'bohr'")
 
-    try:
-        masses = np.array([atomic_masses[symbol] for symbol in symbols], dtype=float)
-    except KeyError as exc:
-        missing = exc.args[0]
-        raise KeyError(f"Atomic mass for element '{missing}' not found in atomic_masses dictionary") from exc
-
-    total_mass = masses.sum()
-    if total_mass == 0.0:
-        raise ValueError("Total mass computed as zero; check atomic_masses dictionary")
-
-    com_ang = (masses[:, None] * coords_ang).sum(axis=0) / total_mass
-    return com_ang * BOHR_PER_ANG
-
+    return topology.center_of_mass(coords_ang) * BOHR_PER_ANG
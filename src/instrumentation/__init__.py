@@ -0,0 +1,23 @@
+"""Opt-in per-stage timing and solver instrumentation."""
+
+from .recorder import (
+    Recorder,
+    StageStats,
+    active_recorder,
+    count,
+    frame_scope,
+    recording,
+    stage,
+    timed,
+)
+
+__all__ = [
+    "Recorder",
+    "StageStats",
+    "active_recorder",
+    "count",
+    "frame_scope",
+    "recording",
+    "stage",
+    "timed",
+]
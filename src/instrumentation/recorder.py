@@ -0,0 +1,227 @@
+"""Opt-in wall-time and call-count instrumentation.
+
+Library code marks its stages with :func:`stage` (a context manager), the
+:func:`timed` decorator and :func:`count`.  Nothing is recorded unless a
+:class:`Recorder` is active::
+
+    with recording() as rec:
+        fit_resp_charges(...)
+    print(rec.summary())
+    rec.write_json("trace.json")
+
+When no recorder is active ``stage`` hands back a shared no-op context manager
+and ``count`` returns immediately, so the hooks cost a single context-variable
+lookup.  Stage times are inclusive: a stage nested inside another is counted in
+both.  Recording is per process and thread-safe; with ``--jobs > 1`` worker
+processes are not instrumented.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+StageCallback = Callable[[str, float, Optional[int]], None]
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    total_s: float = 0.0
+    min_s: float = float("inf")
+    max_s: float = 0.0
+
+    def add(self, duration: float) -> None:
+        self.calls += 1
+        self.total_s += duration
+        self.min_s = min(self.min_s, duration)
+        self.max_s = max(self.max_s, duration)
+
+
+class Recorder:
+    """Accumulates stage timings and counters, overall and per frame.
+
+    Parameters
+    ----------
+    trace
+        Keep every individual stage event (name, frame, start, duration) in
+        addition to the aggregates.
+    callback
+        Called as ``callback(stage_name, duration_s, frame)`` whenever a stage
+        finishes.
+    """
+
+    def __init__(self, *, trace: bool = False, callback: StageCallback | None = None) -> None:
+        self.trace = trace
+        self.callback = callback
+        self.stages: Dict[str, StageStats] = {}
+        self.counters: Dict[str, int] = {}
+        self.frames: Dict[int, Dict[str, StageStats]] = {}
+        self.frame_counters: Dict[int, Dict[str, int]] = {}
+        self.events: List[Dict[str, Any]] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, name: str, start: float, duration: float) -> None:
+        frame = _FRAME.get()
+        with self._lock:
+            self.stages.setdefault(name, StageStats()).add(duration)
+            if frame is not None:
+                self.frames.setdefault(frame, {}).setdefault(name, StageStats()).add(duration)
+            if self.trace:
+                self.events.append(
+                    {"stage": name, "frame": frame, "start_s": start - self._origin, "duration_s": duration}
+                )
+        if self.callback is not None:
+            self.callback(name, duration, frame)
+
+    def add_count(self, name: str, n: int = 1) -> None:
+        frame = _FRAME.get()
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            if frame is not None:
+                per_frame = self.frame_counters.setdefault(frame, {})
+                per_frame[name] = per_frame.get(name, 0) + n
+
+    def to_dict(self) -> Dict[str, Any]:
+        def _stats(stats: Dict[str, StageStats]) -> Dict[str, Dict[str, float]]:
+            return {name: asdict(value) for name, value in stats.items()}
+
+        payload: Dict[str, Any] = {
+            "stages": _stats(self.stages),
+            "counters": dict(self.counters),
+            "frames": {
+                str(frame): {
+                    "stages": _stats(stats),
+                    "counters": dict(self.frame_counters.get(frame, {})),
+                }
+                for frame, stats in sorted(self.frames.items())
+            },
+        }
+        if self.trace:
+            payload["events"] = list(self.events)
+        return payload
+
+    def write_json(self, path: Path | str) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=1))
+        return path
+
+    def summary(self) -> str:
+        """Stage table sorted by total time, followed by the counters."""
+        lines = [f"{'stage':<36} {'calls':>8} {'total [s]':>11} {'mean [ms]':>11} {'max [ms]':>10}"]
+        for name, stats in sorted(self.stages.items(), key=lambda item: -item[1].total_s):
+            mean_ms = 1e3 * stats.total_s / stats.calls if stats.calls else 0.0
+            lines.append(
+                f"{name:<36} {stats.calls:>8d} {stats.total_s:>11.4f} {mean_ms:>11.3f} {1e3 * stats.max_s:>10.3f}"
+            )
+        if self.counters:
+            lines.append("")
+            lines.append(f"{'counter':<36} {'value':>8}")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name:<36} {value:>8d}")
+        return "\n".join(lines)
+
+
+_ACTIVE: ContextVar[Optional[Recorder]] = ContextVar("biliresp_recorder", default=None)
+_FRAME: ContextVar[Optional[int]] = ContextVar("biliresp_frame", default=None)
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info: object) -> None:
+        return None
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("recorder", "name", "start")
+
+    def __init__(self, recorder: Recorder, name: str) -> None:
+        self.recorder = recorder
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.recorder.record(self.name, self.start, time.perf_counter() - self.start)
+
+
+def active_recorder() -> Recorder | None:
+    return _ACTIVE.get()
+
+
+def stage(name: str) -> _Stage | _NullStage:
+    """Context manager timing the enclosed block as ``name`` when recording."""
+    recorder = _ACTIVE.get()
+    if recorder is None:
+        return _NULL_STAGE
+    return _Stage(recorder, name)
+
+
+def count(name: str, n: int = 1) -> None:
+    """Increment counter ``name`` when recording."""
+    recorder = _ACTIVE.get()
+    if recorder is not None:
+        recorder.add_count(name, n)
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """Decorator recording each call of the wrapped function as stage ``name``."""
+
+    def decorate(func: F) -> F:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            recorder = _ACTIVE.get()
+            if recorder is None:
+                return func(*args, **kwargs)
+            with _Stage(recorder, name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+@contextmanager
+def recording(
+    recorder: Recorder | None = None,
+    *,
+    trace: bool = False,
+    callback: StageCallback | None = None,
+) -> Iterator[Recorder]:
+    """Activate ``recorder`` (a new one by default) for the enclosed block."""
+    recorder = recorder or Recorder(trace=trace, callback=callback)
+    token = _ACTIVE.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _ACTIVE.reset(token)
+
+
+@contextmanager
+def frame_scope(index: int) -> Iterator[None]:
+    """Attribute stages and counters recorded in the block to trajectory frame ``index``."""
+    token = _FRAME.set(index)
+    try:
+        yield
+    finally:
+        _FRAME.reset(token)
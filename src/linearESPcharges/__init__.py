@@ -1,13 +1,65 @@
 from .linear import (
     ANGSTROM_TO_BOHR,
+    constrained_solution,
     explicit_solution,
     build_design_matrix,
+    linear_system_from_frames,
     prepare_linear_system,
 )
+from .batch import MoleculeSystem, fit_systems
+from .constraints import (
+    dipole_constraints,
+    frame_constraints,
+    group_charge_constraints,
+    stack_constraints,
+    total_charge_constraint,
+)
+from .grid import DEFAULT_LAYER_SCALES, connolly_grid
+from .incremental import IncrementalLinearSystem, IncrementalUpdate
+from .compressed import CompressedCoulombOperator
+from .design_cache import DesignMatrixCache, cached_design_matrix, clear_design_matrix_cache
+from .iterative import CoulombOperator, iterative_solution
+from .planner import STRATEGIES, FitPlan, plan_fit
+from .resampling import ChargeUncertainty, bootstrap_charges, jackknife_charges
+from .spatial import CellList
+from .weighting import WEIGHTING_SCHEMES, point_weights
+from .subsample import GridSubsample, apply_subsample, compare_subsampled_fit, subsample_grid
 
 __all__ = [
     "ANGSTROM_TO_BOHR",
+    "constrained_solution",
     "explicit_solution",
     "build_design_matrix",
+    "linear_system_from_frames",
     "prepare_linear_system",
+    "MoleculeSystem",
+    "fit_systems",
+    "dipole_constraints",
+    "frame_constraints",
+    "group_charge_constraints",
+    "stack_constraints",
+    "total_charge_constraint",
+    "DEFAULT_LAYER_SCALES",
+    "connolly_grid",
+    "CellList",
+    "CompressedCoulombOperator",
+    "CoulombOperator",
+    "DesignMatrixCache",
+    "cached_design_matrix",
+    "clear_design_matrix_cache",
+    "IncrementalLinearSystem",
+    "IncrementalUpdate",
+    "ChargeUncertainty",
+    "bootstrap_charges",
+    "jackknife_charges",
+    "WEIGHTING_SCHEMES",
+    "point_weights",
+    "iterative_solution",
+    "STRATEGIES",
+    "FitPlan",
+    "plan_fit",
+    "GridSubsample",
+    "apply_subsample",
+    "compare_subsampled_fit",
+    "subsample_grid",
 ]
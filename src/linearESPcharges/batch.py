@@ -0,0 +1,175 @@
+"""Closed-form ESP fits of many different molecules in one call.
+
+Screening runs fit hundreds of small systems, each with its own
+``resp.out``/``esp.xyz``.  :func:`fit_systems` parses every system and reduces
+it to its normal equations ``H = A^T A``, ``g = A^T V`` and ``V^T V`` in worker
+processes, then groups the systems by atom count and solves each group as one
+stacked ``np.linalg.solve``.
+
+Atom counts are rounded up to a multiple of ``bucket_width`` and the smaller
+systems of a bucket are padded: padded atoms get an identity block in ``H``,
+a zero right-hand side and a zero entry in the charge-constraint vector, so
+their charges come out exactly zero and the real atoms see the unpadded
+problem.  Results are returned in input order.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from instrumentation import stage, timed
+
+from .linear import normal_equations, prepare_linear_system
+
+_BUCKET_WIDTH = 8
+
+
+@dataclass(frozen=True)
+class MoleculeSystem:
+    """One ``resp.out``/``esp.xyz`` pair and the frame to fit.
+
+    ``total_charge`` defaults to the sum of the frame's TeraChem ESP charges,
+    as in :func:`~linearESPcharges.linear.prepare_linear_system`.
+    """
+
+    resp_out: Path | str
+    esp_xyz: Path | str
+    number_of_atoms: int
+    frame_index: int | None = None
+    grid_frame_index: int = 0
+    total_charge: float | None = None
+
+
+def _as_system(system: MoleculeSystem | Sequence[Any]) -> MoleculeSystem:
+    if isinstance(system, MoleculeSystem):
+        return system
+    return MoleculeSystem(*system)
+
+
+def _system_statistics(task: Tuple[MoleculeSystem, str]) -> Dict[str, Any]:
+    system, precision = task
+    A, V, Q, esp_charges = prepare_linear_system(
+        system.resp_out,
+        system.esp_xyz,
+        system.number_of_atoms,
+        frame_index=system.frame_index,
+        grid_frame_index=system.grid_frame_index,
+        precision=precision,
+    )
+    H, g = normal_equations(A, V)
+    return {
+        "H": H,
+        "g": g,
+        "vv": float(V @ V),
+        "n_points": V.shape[0],
+        "total_charge": Q if system.total_charge is None else float(system.total_charge),
+        "esp_charges": esp_charges,
+    }
+
+
+def solve_padded_batch(
+    H: np.ndarray,
+    g: np.ndarray,
+    n_atoms: np.ndarray,
+    total_charge: np.ndarray,
+    *,
+    ridge: float = 0.0,
+) -> np.ndarray:
+    """Charge-constrained solutions of ``B`` systems padded to a common size ``N``.
+
+    ``H`` is ``(B, N, N)`` and ``g`` ``(B, N)``; only the leading
+    ``n_atoms[b]`` rows and columns of system ``b`` are used.  Returns
+    ``(B, N)`` charges with zeros in the padded entries.
+    """
+
+    B, N = g.shape
+    n_atoms = np.asarray(n_atoms, dtype=np.int64)
+    active = np.arange(N)[np.newaxis, :] < n_atoms[:, np.newaxis]
+    pair = active[:, :, np.newaxis] & active[:, np.newaxis, :]
+    H = np.where(pair, H, 0.0) + ridge * np.eye(N)
+    diagonal = np.arange(N)
+    H[:, diagonal, diagonal] += ~active
+    g = np.where(active, g, 0.0)
+    c = active.astype(np.float64)
+
+    solved = np.linalg.solve(H, np.stack([g, c], axis=2))
+    q0, X = solved[..., 0], solved[..., 1]
+    shift = ((q0 * c).sum(axis=1) - np.asarray(total_charge, dtype=np.float64)) / (X * c).sum(axis=1)
+    return q0 - shift[:, np.newaxis] * X
+
+
+def _bucket_size(n_atoms: int, bucket_width: int) -> int:
+    return -(-n_atoms // bucket_width) * bucket_width
+
+
+@timed("linear.fit_systems")
+def fit_systems(
+    systems: Sequence[MoleculeSystem | Sequence[Any]],
+    *,
+    ridge: float = 0.0,
+    bucket_width: int = _BUCKET_WIDTH,
+    precision: str = "double",
+    jobs: int = 1,
+) -> List[Dict[str, Any]]:
+    """Fit the ESP charges of every system; one result dict per system, in input order.
+
+    ``systems`` holds :class:`MoleculeSystem` entries or tuples of its fields.
+    Each result carries ``q``, ``sum_q``, ``total_charge``, ``rmse``, ``rrms``,
+    ``n_points`` and the TeraChem ``esp_charges``; ``rmse``/``rrms`` follow
+    from ``q^T H q - 2 g^T q + V^T V`` without rebuilding ``A``.  With
+    ``jobs > 1`` parsing and the ``A^T A`` products run in worker processes.
+    """
+
+    if bucket_width < 1:
+        raise ValueError("bucket_width must be at least 1")
+    systems = [_as_system(system) for system in systems]
+    tasks = [(system, precision) for system in systems]
+    with stage("linear.fit_systems.parse"):
+        if jobs <= 1 or len(tasks) <= 1:
+            statistics = [_system_statistics(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                chunksize = max(1, len(tasks) // (4 * jobs))
+                statistics = list(pool.map(_system_statistics, tasks, chunksize=chunksize))
+
+    buckets: Dict[int, List[int]] = defaultdict(list)
+    for index, stats in enumerate(statistics):
+        buckets[_bucket_size(stats["g"].shape[0], bucket_width)].append(index)
+
+    results: List[Dict[str, Any]] = [{} for _ in systems]
+    with stage("linear.fit_systems.solve"):
+        for size, members in sorted(buckets.items()):
+            n_atoms = np.array([statistics[i]["g"].shape[0] for i in members])
+            H = np.zeros((len(members), size, size))
+            g = np.zeros((len(members), size))
+            for row, i in enumerate(members):
+                n = n_atoms[row]
+                H[row, :n, :n] = statistics[i]["H"]
+                g[row, :n] = statistics[i]["g"]
+            total_charge = np.array([statistics[i]["total_charge"] for i in members])
+            charges = solve_padded_batch(H, g, n_atoms, total_charge, ridge=ridge)
+
+            for row, i in enumerate(members):
+                stats = statistics[i]
+                n = n_atoms[row]
+                q = charges[row, :n]
+                sse = max(float(q @ stats["H"] @ q - 2.0 * stats["g"] @ q + stats["vv"]), 0.0)
+                results[i] = {
+                    "q": q,
+                    "sum_q": float(q.sum()),
+                    "total_charge": stats["total_charge"],
+                    "rmse": float(np.sqrt(sse / stats["n_points"])),
+                    "rrms": float(np.sqrt(sse / stats["vv"])) if stats["vv"] > 0.0 else float("nan"),
+                    "n_points": stats["n_points"],
+                    "esp_charges": stats["esp_charges"],
+                }
+    return results
+
+
+__all__ = ["MoleculeSystem", "fit_systems", "solve_padded_batch"]
@@ -0,0 +1,230 @@
+"""Compressed Coulomb design matrix for very large grids.
+
+``A[i, j] = 1 / |G_i - R_j|`` is a smooth kernel between point sets, so the
+block coupling a compact cluster of grid points to atoms well away from it
+has low numerical rank.  :class:`CompressedCoulombOperator`
+
+1. splits the grid into clusters of at most ``leaf_size`` points by recursive
+   bisection along the longest axis;
+2. for every cluster of radius ``r`` around its centroid ``c``, treats atoms
+   with ``|R_j - c| >= r / eta`` as far field and the rest as near field;
+3. stores the near-field block densely and approximates the far-field block
+   by adaptive cross approximation (ACA, partial pivoting), recompressed with
+   a truncated SVD to the relative Frobenius tolerance ``tol``.
+
+Far-field blocks whose approximation would not save memory are kept dense.
+Build time and the cost of ``A @ q``/``A.T @ r`` grow as ``M (n_near + k)``
+with ``k`` the far-field rank, i.e. linearly in the number of grid points.
+The operator is a drop-in :class:`~linearESPcharges.iterative.CoulombOperator`
+for :class:`~linearESPcharges.iterative.iterative_solution`.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+from instrumentation import count, timed
+
+from .iterative import CoulombOperator
+from .linear import _coulomb_kernel
+
+_LEAF_SIZE = 512
+_ETA = 0.5
+
+
+@dataclass(frozen=True)
+class _Leaf:
+    start: int
+    stop: int
+    near: np.ndarray
+    near_block: np.ndarray
+    far: np.ndarray
+    U: np.ndarray
+    V: np.ndarray
+
+
+def _bisect(points: np.ndarray, leaf_size: int) -> Tuple[np.ndarray, List[Tuple[int, int]]]:
+    """Permutation of ``points`` making every cluster contiguous, and the ``(start, stop)`` of each."""
+    order = np.arange(points.shape[0])
+    leaves: List[Tuple[int, int]] = []
+    stack = [(0, points.shape[0])]
+    while stack:
+        start, stop = stack.pop()
+        if stop - start <= leaf_size:
+            leaves.append((start, stop))
+            continue
+        segment = order[start:stop]
+        coordinates = points[segment]
+        axis = int(np.argmax(np.ptp(coordinates, axis=0)))
+        middle = (stop - start) // 2
+        order[start:stop] = segment[np.argpartition(coordinates[:, axis], middle)]
+        stack.append((start + middle, stop))
+        stack.append((start, start + middle))
+    return order, sorted(leaves)
+
+
+def _aca(grid: np.ndarray, atoms: np.ndarray, tol: float, max_rank: int) -> Tuple[np.ndarray, np.ndarray, bool]:
+    """Partially pivoted ACA: ``_coulomb_kernel(grid, atoms) ~ U @ V.T`` to relative Frobenius ``tol``."""
+    m, n = grid.shape[0], atoms.shape[0]
+    U = np.empty((m, max_rank))
+    V = np.empty((n, max_rank))
+    used = np.zeros(m, dtype=bool)
+    norm2 = 0.0
+    rank = 0
+    i = 0
+    for _attempt in range(m):
+        if rank == max_rank:
+            break
+        used[i] = True
+        row = _coulomb_kernel(grid[i : i + 1], atoms)[0] - U[i, :rank] @ V[:, :rank].T
+        j = int(np.argmax(np.abs(row)))
+        if row[j] == 0.0:
+            # Row already reproduced exactly; move on to an unused one.
+            remaining = np.flatnonzero(~used)
+            if remaining.size == 0:
+                return U[:, :rank], V[:, :rank], True
+            i = int(remaining[0])
+            continue
+        v = row / row[j]
+        u = _coulomb_kernel(grid, atoms[j : j + 1])[:, 0] - U[:, :rank] @ V[j, :rank]
+        uv2 = float(u @ u) * float(v @ v)
+        norm2 += uv2 + 2.0 * float((U[:, :rank].T @ u) @ (V[:, :rank].T @ v))
+        U[:, rank] = u
+        V[:, rank] = v
+        rank += 1
+        if np.sqrt(uv2) <= tol * np.sqrt(norm2):
+            return U[:, :rank], V[:, :rank], True
+        pivots = np.abs(u)
+        pivots[used] = -1.0
+        i = int(np.argmax(pivots))
+    return U[:, :rank], V[:, :rank], False
+
+
+def _recompress(U: np.ndarray, V: np.ndarray, tol: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Truncated SVD of ``U @ V.T`` keeping the relative Frobenius error below ``tol``."""
+    Qu, Ru = np.linalg.qr(U)
+    Qv, Rv = np.linalg.qr(V)
+    W, s, Zt = np.linalg.svd(Ru @ Rv.T)
+    tail = np.sqrt(np.cumsum((s**2)[::-1]))[::-1]
+    rank = int(np.count_nonzero(tail > tol * tail[0])) if s.size else 0
+    return Qu @ (W[:, :rank] * s[:rank]), Qv @ Zt[:rank].T
+
+
+class CompressedCoulombOperator(CoulombOperator):
+    """Near-field dense / far-field low-rank approximation of the Coulomb design matrix.
+
+    Parameters
+    ----------
+    grid_coordinates_bohr, atom_positions_bohr
+        As for :class:`~linearESPcharges.iterative.CoulombOperator`.
+    tol
+        Relative Frobenius-norm tolerance of every far-field block.
+    leaf_size
+        Maximum number of grid points per cluster.
+    eta
+        Admissibility parameter: an atom is far from a cluster of radius ``r``
+        when it lies at least ``r / eta`` from the cluster centroid.
+    """
+
+    @timed("linear.compress_operator")
+    def __init__(
+        self,
+        grid_coordinates_bohr: np.ndarray,
+        atom_positions_bohr: np.ndarray,
+        *,
+        tol: float = 1e-6,
+        leaf_size: int = _LEAF_SIZE,
+        eta: float = _ETA,
+        epsilon: float = 1e-12,
+    ) -> None:
+        super().__init__(grid_coordinates_bohr, atom_positions_bohr, epsilon=epsilon)
+        if not 0.0 < tol < 1.0:
+            raise ValueError("tol must lie in (0, 1)")
+        if leaf_size < 1:
+            raise ValueError("leaf_size must be positive")
+        if not 0.0 < eta < 1.0:
+            raise ValueError("eta must lie in (0, 1)")
+        self.tol = float(tol)
+        self.eta = float(eta)
+
+        self.order, clusters = _bisect(self.grid, int(leaf_size))
+        self.leaves: List[_Leaf] = []
+        all_atoms = np.arange(self.atoms.shape[0])
+        for start, stop in clusters:
+            points = self.grid[self.order[start:stop]]
+            centre = points.mean(axis=0)
+            radius = float(np.sqrt(np.max(np.sum((points - centre) ** 2, axis=1))))
+            distance = np.sqrt(np.sum((self.atoms - centre) ** 2, axis=1))
+            far = all_atoms[distance * self.eta >= radius]
+            near = all_atoms[distance * self.eta < radius]
+            m, n_far = points.shape[0], far.size
+            U = V = np.empty((0, 0))
+            if n_far:
+                # Only keep the low-rank form while it stores fewer numbers than the block.
+                max_rank = max(1, (m * n_far) // (m + n_far) - 1)
+                U, V, converged = _aca(points, self.atoms[far], 0.5 * self.tol, max_rank)
+                if converged and U.shape[1]:
+                    U, V = _recompress(U, V, 0.5 * self.tol)
+                if not converged or U.shape[1] * (m + n_far) >= m * n_far:
+                    near, far = all_atoms, far[:0]
+                    U = V = np.empty((0, 0))
+            near_block = _coulomb_kernel(points, self.atoms[near])
+            self.leaves.append(_Leaf(start, stop, near, near_block, far, U, V))
+
+    @property
+    def max_rank(self) -> int:
+        return max((leaf.U.shape[1] for leaf in self.leaves if leaf.far.size), default=0)
+
+    @property
+    def stored_entries(self) -> int:
+        return sum(leaf.near_block.size + leaf.U.size + leaf.V.size for leaf in self.leaves)
+
+    @property
+    def compression_ratio(self) -> float:
+        """Stored numbers relative to the ``M x N`` dense matrix."""
+        M, N = self.shape
+        return self.stored_entries / float(M * N)
+
+    def matvec(self, q: np.ndarray) -> np.ndarray:
+        count("linear.operator_passes")
+        q = np.asarray(q, dtype=np.float64)
+        permuted = np.empty(self.shape[0], dtype=np.float64)
+        for leaf in self.leaves:
+            values = leaf.near_block @ q[leaf.near]
+            if leaf.far.size:
+                values += leaf.U @ (leaf.V.T @ q[leaf.far])
+            permuted[leaf.start : leaf.stop] = values
+        out = np.empty_like(permuted)
+        out[self.order] = permuted
+        return out
+
+    def rmatvec(self, r: np.ndarray) -> np.ndarray:
+        count("linear.operator_passes")
+        permuted = np.asarray(r, dtype=np.float64)[self.order]
+        out = np.zeros(self.shape[1], dtype=np.float64)
+        for leaf in self.leaves:
+            block = permuted[leaf.start : leaf.stop]
+            out[leaf.near] += leaf.near_block.T @ block
+            if leaf.far.size:
+                out[leaf.far] += leaf.V @ (leaf.U.T @ block)
+        return out
+
+    def normal_matvec(self, q: np.ndarray) -> np.ndarray:
+        """``A.T @ (A @ q)`` of the compressed matrix."""
+        return self.rmatvec(self.matvec(q))
+
+    def to_dense(self) -> np.ndarray:
+        """The compressed approximation as a dense array (for testing)."""
+        dense = np.zeros(self.shape, dtype=np.float64)
+        for leaf in self.leaves:
+            rows = self.order[leaf.start : leaf.stop]
+            dense[np.ix_(rows, leaf.near)] = leaf.near_block
+            if leaf.far.size:
+                dense[np.ix_(rows, leaf.far)] = leaf.U @ leaf.V.T
+        return dense
+
+
+__all__ = ["CompressedCoulombOperator"]
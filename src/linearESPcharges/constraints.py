@@ -0,0 +1,126 @@
+"""Linear charge constraints ``C q = d`` for :class:`~linearESPcharges.linear.constrained_solution`.
+
+Each builder returns a ``(C, d)`` pair with one row per constraint;
+:func:`stack_constraints` concatenates them.  Typical use: the total charge,
+the charges of fragments such as the ring and tail groups of
+``notebooks/bv_ring_tail_split.png``, and optionally the QM dipole of the frame.
+Dipole rows depend on the atom positions, so across a trajectory they are
+built per frame and passed to :meth:`constrained_solution.solve_batch` as a
+``(B, K, N)`` stack.
+"""
+
+from __future__ import annotations
+
+from typing import Mapping, Sequence, Tuple
+
+import numpy as np
+
+from dipole.dipole import BOHR_PER_ANG, DEBYE_PER_E_BOHR
+from parser.parser import Frame
+
+Constraints = Tuple[np.ndarray, np.ndarray]
+
+_AXES = {"x": 0, "y": 1, "z": 2}
+
+
+def total_charge_constraint(number_of_atoms: int, total_charge: float) -> Constraints:
+    """``sum_j q_j = Q``."""
+    return np.ones((1, number_of_atoms)), np.array([float(total_charge)])
+
+
+def group_charge_constraints(
+    number_of_atoms: int,
+    groups: Mapping[str, Sequence[int]] | Sequence[Sequence[int]],
+    charges: Mapping[str, float] | Sequence[float],
+) -> Constraints:
+    """One row per group: the charges of its atoms (0-based indices) sum to the group's target."""
+
+    if isinstance(groups, Mapping):
+        if not isinstance(charges, Mapping) or set(charges) != set(groups):
+            raise ValueError("Pass one target charge per named group")
+        names = list(groups)
+        members = [groups[name] for name in names]
+        targets = [charges[name] for name in names]
+    else:
+        members = list(groups)
+        targets = list(charges)
+        if len(targets) != len(members):
+            raise ValueError("Pass one target charge per group")
+    C = np.zeros((len(members), number_of_atoms))
+    for row, atoms in enumerate(members):
+        atoms = np.asarray(atoms, dtype=np.int64)
+        if atoms.size == 0 or np.any((atoms < 0) | (atoms >= number_of_atoms)):
+            raise ValueError(f"Group {row} must list atom indices in [0, {number_of_atoms})")
+        C[row, atoms] = 1.0
+    return C, np.asarray(targets, dtype=np.float64)
+
+
+def dipole_constraints(
+    atom_positions_bohr: np.ndarray,
+    origin_bohr: np.ndarray,
+    dipole_debye: Sequence[float],
+    *,
+    components: str = "xyz",
+) -> Constraints:
+    """``sum_j q_j (R_j - origin)_k = mu_k`` for the selected Cartesian components.
+
+    ``dipole_debye`` is converted to e*bohr; for a charged molecule the target
+    must be taken about the same ``origin`` (TeraChem reports it about the
+    center of mass).
+    """
+
+    positions = np.asarray(atom_positions_bohr, dtype=np.float64)
+    relative = positions - np.asarray(origin_bohr, dtype=np.float64)[np.newaxis, :]
+    try:
+        axes = [_AXES[axis] for axis in components]
+    except KeyError:
+        raise ValueError(f"components must be drawn from 'xyz', got {components!r}") from None
+    target = np.asarray(dipole_debye, dtype=np.float64) / DEBYE_PER_E_BOHR
+    return relative[:, axes].T.copy(), target[axes]
+
+
+def stack_constraints(*constraints: Constraints) -> Constraints:
+    if not constraints:
+        raise ValueError("Pass at least one constraint block")
+    return (
+        np.vstack([np.atleast_2d(C) for C, _ in constraints]),
+        np.concatenate([np.atleast_1d(d) for _, d in constraints]),
+    )
+
+
+def frame_constraints(
+    frame: Frame,
+    *,
+    total_charge: float | None = None,
+    groups: Mapping[str, Sequence[int]] | Sequence[Sequence[int]] | None = None,
+    group_charges: Mapping[str, float] | Sequence[float] | None = None,
+    dipole: bool = False,
+    dipole_components: str = "xyz",
+) -> Constraints:
+    """Total charge (default: the frame's ESP charge sum), optional groups and the frame's QM dipole."""
+
+    n_atoms = len(frame.positions)
+    if total_charge is None:
+        total_charge = float(np.sum(frame.esp_charges))
+    blocks = [total_charge_constraint(n_atoms, total_charge)]
+    if groups is not None:
+        if group_charges is None:
+            raise ValueError("group_charges is required with groups")
+        blocks.append(group_charge_constraints(n_atoms, groups, group_charges))
+    if dipole:
+        if frame.center_of_mass is None or frame.dipole_moment_vector is None:
+            raise ValueError("Frame is missing CENTER OF MASS or DIPOLE MOMENT data")
+        origin = np.asarray(frame.center_of_mass, dtype=np.float64) * BOHR_PER_ANG
+        blocks.append(
+            dipole_constraints(frame.positions, origin, frame.dipole_moment_vector, components=dipole_components)
+        )
+    return stack_constraints(*blocks)
+
+
+__all__ = [
+    "dipole_constraints",
+    "frame_constraints",
+    "group_charge_constraints",
+    "stack_constraints",
+    "total_charge_constraint",
+]
@@ -0,0 +1,131 @@
+"""Reuse of Coulomb design matrices across repeated fits.
+
+Many workflows fit the same frame against the same grid more than once: the
+explicit and RESP fits of one frame, the dipole scripts, parity checks, or
+screening loops over restraint parameters.  ``A`` depends only on the grid
+and the atom positions, so :func:`cached_design_matrix` keys it by
+``(grid hash, atom-position hash, dtype)`` and keeps recent matrices in a
+process-wide LRU cache bounded by :data:`DEFAULT_MAX_BYTES`.  A hit skips
+design-matrix assembly entirely.
+
+Grid hashes come from :attr:`parser.parser.ESPGridFrame.grid_hash` (computed
+from the coordinates in Å as parsed) when available, otherwise from the
+coordinates passed in.  Cached matrices are shared between callers and
+therefore read-only.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+import numpy as np
+
+from instrumentation import count
+from parser.parser import coordinates_hash
+
+from .linear import build_design_matrix
+
+DEFAULT_MAX_BYTES = 512 * 1024**2
+DEFAULT_MAX_ENTRIES = 16
+
+_Key = Tuple[str, str, str]
+
+
+class DesignMatrixCache:
+    """LRU cache of design matrices bounded by entry count and total bytes.
+
+    Matrices larger than ``max_bytes`` are built and returned but not kept.
+    """
+
+    def __init__(self, *, max_bytes: int = DEFAULT_MAX_BYTES, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        if max_bytes < 0 or max_entries < 0:
+            raise ValueError("max_bytes and max_entries must be non-negative")
+        self.max_bytes = int(max_bytes)
+        self.max_entries = int(max_entries)
+        self._entries: "OrderedDict[_Key, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(matrix.nbytes for matrix in self._entries.values())
+
+    def get(
+        self,
+        grid_coordinates_bohr: np.ndarray,
+        atom_positions_bohr: np.ndarray,
+        *,
+        dtype: np.dtype | type = np.float64,
+        grid_hash: str | None = None,
+    ) -> np.ndarray:
+        """The design matrix of this grid and geometry, built on a miss."""
+        key = (
+            grid_hash or coordinates_hash(grid_coordinates_bohr),
+            coordinates_hash(atom_positions_bohr),
+            np.dtype(dtype).str,
+        )
+        with self._lock:
+            matrix = self._entries.get(key)
+            if matrix is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                count("linear.design_matrix_cache_hits")
+                return matrix
+            self.misses += 1
+        count("linear.design_matrix_cache_misses")
+
+        matrix = build_design_matrix(grid_coordinates_bohr, atom_positions_bohr, dtype=dtype)
+        matrix.setflags(write=False)
+        if matrix.nbytes > self.max_bytes or self.max_entries == 0:
+            return matrix
+        with self._lock:
+            self._entries[key] = matrix
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                self._entries.popitem(last=False)
+        return matrix
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_CACHE = DesignMatrixCache()
+
+
+def design_matrix_cache() -> DesignMatrixCache:
+    """The process-wide :class:`DesignMatrixCache` used by :func:`cached_design_matrix`."""
+    return _CACHE
+
+
+def cached_design_matrix(
+    grid_coordinates_bohr: np.ndarray,
+    atom_positions_bohr: np.ndarray,
+    *,
+    dtype: np.dtype | type = np.float64,
+    grid_hash: str | None = None,
+) -> np.ndarray:
+    """Read-only :func:`~linearESPcharges.linear.build_design_matrix`, memoised per grid and geometry."""
+    return _CACHE.get(grid_coordinates_bohr, atom_positions_bohr, dtype=dtype, grid_hash=grid_hash)
+
+
+def clear_design_matrix_cache() -> None:
+    """Drop every cached design matrix."""
+    _CACHE.clear()
+
+
+__all__ = [
+    "DEFAULT_MAX_BYTES",
+    "DesignMatrixCache",
+    "cached_design_matrix",
+    "clear_design_matrix_cache",
+    "design_matrix_cache",
+]
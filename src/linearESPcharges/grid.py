@@ -0,0 +1,118 @@
+"""Layered Connolly-surface ESP grids generated from atom positions.
+
+Mirrors the TeraChem RESP setup described in ``data/raw/README.txt``: points are
+placed on spheres of radius ``s * r_vdW`` around every atom for each layer scale
+``s`` (1.2, 1.4, 1.6, 1.8 by default) at a given density in points/Å², and
+points buried inside a neighbouring atom's sphere of the same layer are
+discarded.  Coordinates are returned in bohr, ready for
+:func:`~linearESPcharges.linear.build_design_matrix`.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from constants.vdw_radii import vdw_radii
+
+from .linear import ANGSTROM_TO_BOHR
+
+DEFAULT_LAYER_SCALES = (1.2, 1.4, 1.6, 1.8)
+
+_GOLDEN_ANGLE = np.pi * (3.0 - np.sqrt(5.0))
+
+
+def _unit_sphere(n_points: int) -> np.ndarray:
+    """Quasi-uniform Fibonacci lattice of ``n_points`` unit vectors."""
+    k = np.arange(n_points) + 0.5
+    z = 1.0 - 2.0 * k / n_points
+    rho = np.sqrt(1.0 - z * z)
+    phi = _GOLDEN_ANGLE * k
+    return np.column_stack((rho * np.cos(phi), rho * np.sin(phi), z))
+
+
+def vdw_radii_bohr(symbols: Sequence[str]) -> np.ndarray:
+    """Van der Waals radii (bohr) for each element symbol."""
+    try:
+        return np.array([vdw_radii[symbol] for symbol in symbols], dtype=float) * ANGSTROM_TO_BOHR
+    except KeyError as exc:
+        missing = exc.args[0]
+        raise KeyError(f"Van der Waals radius for element '{missing}' not found in vdw_radii dictionary") from exc
+
+
+def connolly_grid(
+    atom_positions_bohr: np.ndarray,
+    symbols: Sequence[str],
+    *,
+    density: float = 1.0,
+    layer_scales: Sequence[float] = DEFAULT_LAYER_SCALES,
+    return_labels: bool = False,
+) -> np.ndarray | Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Generate layered Connolly surface points around a molecule.
+
+    Parameters
+    ----------
+    atom_positions_bohr
+        ``(N, 3)`` atom positions in bohr.
+    symbols
+        Element symbol of each atom, used to look up van der Waals radii.
+    density
+        Surface density in points per Å² (TeraChem's ``esp_grid_dens``).
+    layer_scales
+        Multiples of the van der Waals radius defining each layer.
+    return_labels
+        Also return the owning atom index and layer index of every point.
+    """
+
+    positions = np.asarray(atom_positions_bohr, dtype=float)
+    if positions.ndim != 2 or positions.shape[1] != 3:
+        raise ValueError("atom_positions_bohr must have shape (N, 3)")
+    if len(symbols) != positions.shape[0]:
+        raise ValueError("symbols must have one entry per atom")
+    if density <= 0.0:
+        raise ValueError("density must be positive")
+
+    radii = vdw_radii_bohr(symbols)
+    atom_tree = cKDTree(positions)
+    sphere_cache: Dict[int, np.ndarray] = {}
+
+    coords_parts = []
+    atom_parts = []
+    layer_parts = []
+    for layer, scale in enumerate(layer_scales):
+        layer_radii = scale * radii
+        radii_angstrom = layer_radii / ANGSTROM_TO_BOHR
+        counts = np.maximum(1, np.ceil(density * 4.0 * np.pi * radii_angstrom**2).astype(int))
+
+        owners = np.repeat(np.arange(positions.shape[0]), counts)
+        units = np.concatenate(
+            [sphere_cache.setdefault(int(n), _unit_sphere(int(n))) for n in counts]
+        )
+        points = positions[owners] + units * layer_radii[owners, np.newaxis]
+
+        # Every atom whose sphere could bury a point lies within the largest radius.
+        pairs = cKDTree(points).sparse_distance_matrix(
+            atom_tree, float(layer_radii.max()), output_type="coo_matrix"
+        )
+        point_idx, atom_idx, dist = pairs.row, pairs.col, pairs.data
+        buried_pairs = (atom_idx != owners[point_idx]) & (dist < layer_radii[atom_idx])
+        keep = np.ones(points.shape[0], dtype=bool)
+        keep[point_idx[buried_pairs]] = False
+
+        coords_parts.append(points[keep])
+        atom_parts.append(owners[keep])
+        layer_parts.append(np.full(int(keep.sum()), layer, dtype=int))
+
+    coordinates = np.concatenate(coords_parts)
+    if return_labels:
+        return coordinates, np.concatenate(atom_parts), np.concatenate(layer_parts)
+    return coordinates
+
+
+__all__ = [
+    "DEFAULT_LAYER_SCALES",
+    "connolly_grid",
+    "vdw_radii_bohr",
+]
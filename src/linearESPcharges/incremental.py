@@ -0,0 +1,138 @@
+"""Incremental design-matrix updates along a trajectory with a fixed grid.
+
+Consecutive MD frames usually share one ESP grid (``grid_frame_index=0``), and
+between them most atoms move very little.  :class:`IncrementalLinearSystem`
+keeps ``A``, ``H = A^T A`` and ``g = A^T V`` from the previous frame and, for
+the next set of positions, recomputes only the columns of ``A`` belonging to
+atoms that moved by more than ``tolerance`` bohr, together with the matching
+rows/columns of ``H`` and entries of ``g``.  Updating ``k`` columns costs
+``O(M k N)`` instead of the ``O(M N^2)`` of a rebuild.
+
+Atoms below the tolerance keep the position their column was last computed
+at, so the error in ``A`` is bounded by ``tolerance`` per atom and does not
+accumulate across frames.  ``tolerance=0`` reproduces a full rebuild exactly.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict
+
+import numpy as np
+
+from instrumentation import timed
+
+from .linear import (
+    _ACCUMULATE_ROWS,
+    _metrics,
+    build_design_matrix,
+    explicit_solution,
+    normal_equations,
+)
+
+
+@dataclass(frozen=True)
+class IncrementalUpdate:
+    """What :meth:`IncrementalLinearSystem.update` had to recompute.
+
+    ``moved`` lists the atoms whose columns were recomputed: every atom after
+    a full rebuild.
+    """
+
+    moved: np.ndarray
+    full_rebuild: bool
+
+    @property
+    def columns_recomputed(self) -> int:
+        return int(self.moved.size)
+
+
+class IncrementalLinearSystem:
+    """Normal equations for a fixed grid, updated column by column as atoms move.
+
+    Parameters
+    ----------
+    grid_coordinates_bohr, esp_values
+        The shared ESP grid and its potentials.
+    tolerance
+        Displacement (bohr) from the position an atom's column was computed at
+        above which that column is recomputed.
+    dtype
+        Storage dtype of ``A`` (see ``linearESPcharges.linear.PRECISIONS``);
+        ``H`` and ``g`` are always float64.
+    """
+
+    def __init__(
+        self,
+        grid_coordinates_bohr: np.ndarray,
+        esp_values: np.ndarray,
+        *,
+        tolerance: float = 1e-6,
+        dtype: np.dtype | type = np.float64,
+    ) -> None:
+        if tolerance < 0.0:
+            raise ValueError("tolerance must be non-negative")
+        self.grid = np.asarray(grid_coordinates_bohr, dtype=dtype)
+        self.esp_values = np.asarray(esp_values, dtype=np.float64)
+        self.tolerance = float(tolerance)
+        self.dtype = np.dtype(dtype)
+        self.A: np.ndarray | None = None
+        self.H: np.ndarray | None = None
+        self.g: np.ndarray | None = None
+        self.positions: np.ndarray | None = None
+
+    @timed("linear.incremental_update")
+    def update(self, atom_positions_bohr: np.ndarray) -> IncrementalUpdate:
+        """Bring ``A``, ``H`` and ``g`` up to date for new atom positions."""
+
+        positions = np.asarray(atom_positions_bohr, dtype=np.float64)
+        if self.positions is None or positions.shape != self.positions.shape:
+            return self._rebuild(positions, np.arange(positions.shape[0]))
+
+        displacement = np.linalg.norm(positions - self.positions, axis=1)
+        moved = np.flatnonzero(displacement > self.tolerance)
+        # Past half the columns a symmetric rebuild of H is cheaper than patching it.
+        if 2 * moved.size > positions.shape[0]:
+            return self._rebuild(positions, np.arange(positions.shape[0]))
+        if moved.size:
+            columns = build_design_matrix(self.grid, positions[moved], dtype=self.dtype)
+            self.A[:, moved] = columns
+            self.positions[moved] = positions[moved]
+            cross, g_moved = self._cross_products(columns)
+            self.H[moved, :] = cross
+            self.H[:, moved] = cross.T
+            self.g[moved] = g_moved
+        return IncrementalUpdate(moved=moved, full_rebuild=False)
+
+    def _rebuild(self, positions: np.ndarray, moved: np.ndarray) -> IncrementalUpdate:
+        self.A = build_design_matrix(self.grid, positions, dtype=self.dtype)
+        self.H, self.g = normal_equations(self.A, self.esp_values)
+        self.positions = positions.copy()
+        return IncrementalUpdate(moved=moved, full_rebuild=True)
+
+    def _cross_products(self, columns: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """``(columns^T A, columns^T V)`` accumulated in float64 row tiles."""
+        if self.A.dtype == np.float64:
+            return columns.T @ self.A, columns.T @ self.esp_values
+        cross = np.zeros((columns.shape[1], self.A.shape[1]), dtype=np.float64)
+        g_moved = np.zeros(columns.shape[1], dtype=np.float64)
+        for start in range(0, self.A.shape[0], _ACCUMULATE_ROWS):
+            stop = start + _ACCUMULATE_ROWS
+            block = columns[start:stop].astype(np.float64).T
+            cross += block @ self.A[start:stop].astype(np.float64)
+            g_moved += block @ self.esp_values[start:stop]
+        return cross, g_moved
+
+    def fit(self, Q: float, *, ridge: float = 0.0) -> Dict[str, Any]:
+        """Constrained charges from the current normal equations (see :class:`explicit_solution`)."""
+        if self.H is None:
+            raise RuntimeError("Call update() with atom positions before fit()")
+        out = explicit_solution(ridge=ridge).solve_normal(self.H, self.g, Q)
+        out.update(_metrics(self.A, self.esp_values, out["q"]))
+        return out
+
+
+__all__ = [
+    "IncrementalLinearSystem",
+    "IncrementalUpdate",
+]
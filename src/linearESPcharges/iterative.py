@@ -0,0 +1,251 @@
+"""Matrix-free iterative ESP fitting for large atom counts.
+
+:class:`explicit_solution` forms ``A`` (``M x N``) and ``H = A^T A`` at
+``O(M N^2)`` cost, which dominates once ``N`` reaches QM/MM-region sizes.
+:class:`CoulombOperator` instead applies ``A`` and ``A^T`` tile by tile from
+the grid and atom coordinates, so only ``O(tile_rows * N)`` entries of ``A``
+exist at any time, and :class:`iterative_solution` solves the
+charge-constrained least-squares problem
+
+.. math::  \\min_q \\|A q - V\\|^2 \\quad \\text{s.t.} \\quad \\mathbf{1}^\\top q = Q
+
+with either projected conjugate gradients on the normal equations (``"cg"``,
+one pass over the grid per iteration) or LSQR on the constraint-projected
+operator (``"lsqr"``, better behaved for ill-conditioned grids).  Both accept
+a warm start, typically the charges of the previous trajectory frame.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict
+
+import numpy as np
+
+from instrumentation import count, timed
+
+from .linear import _PROXIMITY_CELL_BOHR, _coulomb_kernel, _matvec, _metrics, _rmatvec
+from .spatial import CellList
+
+_TILE_ROWS = 4096
+
+ITERATIVE_METHODS = ("cg", "lsqr")
+
+
+class CoulombOperator:
+    """Matrix-free Coulomb design matrix ``A[i, j] = 1 / |G_i - R_j|`` (bohr).
+
+    Supports ``A @ q``, ``A.T @ r`` and the fused normal product
+    ``A.T @ (A @ q)``; every product regenerates ``A`` in row tiles of
+    ``tile_rows`` grid points and accumulates in float64.  ``dtype=np.float32``
+    computes the tiles in single precision (the ``"mixed"`` precision).
+    """
+
+    def __init__(
+        self,
+        grid_coordinates_bohr: np.ndarray,
+        atom_positions_bohr: np.ndarray,
+        *,
+        tile_rows: int = _TILE_ROWS,
+        epsilon: float = 1e-12,
+        dtype: np.dtype | type = np.float64,
+    ) -> None:
+        self.grid = np.ascontiguousarray(grid_coordinates_bohr, dtype=np.float64)
+        self.atoms = np.ascontiguousarray(atom_positions_bohr, dtype=np.float64)
+        self._dtype = np.dtype(dtype)
+        if tile_rows < 1:
+            raise ValueError("tile_rows must be positive")
+        self.tile_rows = int(tile_rows)
+        index = CellList(self.atoms, cell_size=_PROXIMITY_CELL_BOHR)
+        if np.any(index.any_within(self.grid, epsilon)):
+            raise ValueError("Encountered grid point too close to an atom position when forming Coulomb matrix.")
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.grid.shape[0], self.atoms.shape[0]
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dtype
+
+    @property
+    def T(self) -> "_TransposedCoulombOperator":
+        return _TransposedCoulombOperator(self)
+
+    def _tiles(self):
+        grid = self.grid.astype(self._dtype, copy=False)
+        atoms = self.atoms.astype(self._dtype, copy=False)
+        for start in range(0, grid.shape[0], self.tile_rows):
+            stop = start + self.tile_rows
+            yield start, stop, _coulomb_kernel(grid[start:stop], atoms)
+
+    def matvec(self, q: np.ndarray) -> np.ndarray:
+        count("linear.operator_passes")
+        out = np.empty(self.shape[0], dtype=np.float64)
+        for start, stop, tile in self._tiles():
+            out[start:stop] = tile @ q
+        return out
+
+    def rmatvec(self, r: np.ndarray) -> np.ndarray:
+        count("linear.operator_passes")
+        out = np.zeros(self.shape[1], dtype=np.float64)
+        for start, stop, tile in self._tiles():
+            out += tile.T @ r[start:stop]
+        return out
+
+    def normal_matvec(self, q: np.ndarray) -> np.ndarray:
+        """``A.T @ (A @ q)`` in a single pass over the grid."""
+        count("linear.operator_passes")
+        out = np.zeros(self.shape[1], dtype=np.float64)
+        for _start, _stop, tile in self._tiles():
+            out += tile.T @ (tile @ q)
+        return out
+
+    def __matmul__(self, q: np.ndarray) -> np.ndarray:
+        return self.matvec(np.asarray(q, dtype=np.float64))
+
+    def to_dense(self) -> np.ndarray:
+        return _coulomb_kernel(self.grid.astype(self._dtype, copy=False), self.atoms.astype(self._dtype, copy=False))
+
+
+class _TransposedCoulombOperator:
+    def __init__(self, operator: CoulombOperator) -> None:
+        self.operator = operator
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        rows, cols = self.operator.shape
+        return cols, rows
+
+    def __matmul__(self, r: np.ndarray) -> np.ndarray:
+        return self.operator.rmatvec(np.asarray(r, dtype=np.float64))
+
+
+def _normal_matvec(A: np.ndarray | CoulombOperator, q: np.ndarray) -> np.ndarray:
+    if isinstance(A, CoulombOperator):
+        return A.normal_matvec(q)
+    return _rmatvec(A, _matvec(A, q))
+
+
+def _rmat(A: np.ndarray | CoulombOperator, r: np.ndarray) -> np.ndarray:
+    if isinstance(A, CoulombOperator):
+        return A.rmatvec(r)
+    return _rmatvec(A, r)
+
+
+def _project(vec: np.ndarray) -> np.ndarray:
+    """Project onto the zero-sum hyperplane ``1^T x = 0``."""
+    return vec - vec.mean()
+
+
+@dataclass
+class iterative_solution:
+    """Charge-constrained least squares by projected CG or LSQR.
+
+    ``tol`` is relative: CG stops when the projected gradient norm falls below
+    ``tol`` times its value at ``q = 0``; LSQR uses it for both ``atol`` and
+    ``btol``.  ``maxiter`` defaults to ``10 N``.
+    """
+
+    method: str = "cg"
+    tol: float = 1e-10
+    maxiter: int | None = None
+    ridge: float = 0.0
+
+    @timed("linear.iterative_fit")
+    def fit(
+        self,
+        A: np.ndarray | CoulombOperator,
+        V: np.ndarray,
+        Q: float,
+        *,
+        x0: np.ndarray | None = None,
+    ) -> Dict[str, Any]:
+        if self.method not in ITERATIVE_METHODS:
+            raise ValueError(f"Unknown iterative method {self.method!r}; choose from {', '.join(ITERATIVE_METHODS)}")
+        _, N = A.shape
+        V = np.asarray(V, dtype=np.float64)
+        maxiter = self.maxiter if self.maxiter is not None else 10 * N
+
+        # Feasible start: shift the warm start (or zero) onto 1^T q = Q.
+        q = np.zeros(N) if x0 is None else np.array(x0, dtype=np.float64)
+        if q.shape != (N,):
+            raise ValueError("x0 must have one entry per atom")
+        q += (Q - q.sum()) / N
+
+        g = _rmat(A, V)
+        if self.method == "cg":
+            q, iterations, converged, gradient_norm = self._cg(A, g, q, maxiter)
+        else:
+            q, iterations, converged, gradient_norm = self._lsqr(A, V, q, maxiter)
+        # Remove the round-off drift of 1^T q accumulated over the iterations.
+        q += (Q - q.sum()) / N
+
+        out: Dict[str, Any] = {
+            "q": q,
+            "iterations": iterations,
+            "converged": converged,
+            "projected_gradient_norm": gradient_norm,
+            "method": self.method,
+        }
+        out.update(_metrics(A, V, q))
+        return out
+
+    def _cg(self, A, g: np.ndarray, q: np.ndarray, maxiter: int):
+        def apply_h(vec: np.ndarray) -> np.ndarray:
+            out = _normal_matvec(A, vec)
+            if self.ridge > 0.0:
+                out = out + self.ridge * vec
+            return out
+
+        threshold = self.tol * max(float(np.linalg.norm(_project(g))), np.finfo(float).tiny)
+        r = _project(g - apply_h(q))
+        p = r.copy()
+        rr = float(r @ r)
+        iterations = 0
+        while np.sqrt(rr) > threshold and iterations < maxiter:
+            hp = apply_h(p)
+            step = rr / float(p @ hp)
+            q = q + step * p
+            r = r - step * _project(hp)
+            rr_new = float(r @ r)
+            p = r + (rr_new / rr) * p
+            rr = rr_new
+            iterations += 1
+        return q, iterations, bool(np.sqrt(rr) <= threshold), float(np.sqrt(rr))
+
+    def _lsqr(self, A, V: np.ndarray, q: np.ndarray, maxiter: int):
+        from scipy.sparse.linalg import LinearOperator, lsqr
+
+        M, N = A.shape
+        # q = q_feasible + P z keeps the constraint exactly; solve min ||A P z - b||.
+        # The ridge acts on the whole q, not on the step z away from the start,
+        # so it enters as the extra rows sqrt(ridge) (P z + q_feasible) ~ 0.
+        damp = float(np.sqrt(self.ridge)) if self.ridge > 0.0 else 0.0
+        b = V - _matvec(A, q)
+        if damp > 0.0:
+            projected = LinearOperator(
+                (M + N, N),
+                matvec=lambda z: np.concatenate([_matvec(A, _project(np.ravel(z))), damp * _project(np.ravel(z))]),
+                rmatvec=lambda r: _project(_rmat(A, np.ravel(r)[:M]) + damp * np.ravel(r)[M:]),
+                dtype=np.float64,
+            )
+            b = np.concatenate([b, -damp * q])
+        else:
+            projected = LinearOperator(
+                (M, N),
+                matvec=lambda z: _matvec(A, _project(np.ravel(z))),
+                rmatvec=lambda r: _project(_rmat(A, np.ravel(r))),
+                dtype=np.float64,
+            )
+        z, istop, iterations, *_rest = lsqr(projected, b, atol=self.tol, btol=self.tol, iter_lim=maxiter)
+        q = q + _project(z)
+        gradient = _project(_rmat(A, V - _matvec(A, q)) - self.ridge * q)
+        return q, int(iterations), istop in (1, 2, 4, 5), float(np.linalg.norm(gradient))
+
+
+__all__ = [
+    "CoulombOperator",
+    "ITERATIVE_METHODS",
+    "iterative_solution",
+]
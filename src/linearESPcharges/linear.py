@@ -2,10 +2,15 @@ from __future__ import annotations
 
 import numpy as np
 from dataclasses import dataclass
+from scipy.linalg import cho_factor, cho_solve
 from pathlib import Path
-from typing import Dict, Any, Tuple
+from typing import Any, Dict, Sequence, Tuple
 
-from parser import ParseRespDotOut, ParseESPXYZ
+from instrumentation import timed
+from parser import load_esp_grids, load_resp_frames
+from parser.parser import ESPGridFrame, Frame
+
+from .spatial import CellList
 
 ANGSTROM_TO_BOHR = 1.8897261254578281
 
@@ -37,25 +42,149 @@ ANGSTROM_TO_BOHR = 1.8897261254578281
 # ============================================================
 
 
+# Working precision of the design matrix.  "mixed" stores A in float32 (half the
+# memory and bandwidth) while every reduction over grid points -- A^T A, A^T V,
+# A q -- is accumulated in float64, so only the 1/r entries themselves carry
+# single-precision rounding.  On the data/raw sample this moves fitted charges
+# by well under 1e-4 e (see tests/test_linear_solver.py).
+PRECISIONS = {"double": np.float64, "mixed": np.float32}
+
+_ACCUMULATE_ROWS = 4096
+
+# Cell edge (bohr) of the atom index used to catch grid points sitting on atoms;
+# comparable to a bond length, so each cell holds at most a few atoms.
+_PROXIMITY_CELL_BOHR = 2.0
+
+
+def _precision_dtype(precision: str) -> np.dtype:
+    try:
+        return np.dtype(PRECISIONS[precision])
+    except KeyError:
+        raise ValueError(f"precision must be one of {sorted(PRECISIONS)}, got {precision!r}") from None
+
+
+@timed("linear.design_matrix")
 def build_design_matrix(
     grid_coordinates_bohr: np.ndarray,
     atom_positions_bohr: np.ndarray,
     *,
     epsilon: float = 1e-12,
+    dtype: np.dtype | type = np.float64,
+    cutoff: float | None = None,
 ) -> np.ndarray:
-    diffs = grid_coordinates_bohr[:, np.newaxis, :] - atom_positions_bohr[np.newaxis, :, :]
-    distances = np.linalg.norm(diffs, axis=2)
-    if np.any(distances <= epsilon):
+    """Coulomb matrix ``A[i, j] = 1 / |G_i - R_j|`` (bohr).
+
+    The grid-point-on-atom check goes through a :class:`~linearESPcharges.spatial.CellList`
+    over the atoms, so it only looks at local neighbourhoods.  With ``cutoff``
+    (bohr) entries beyond that distance are screened to zero and only the
+    pairs within it are ever evaluated.
+    """
+    grid = np.asarray(grid_coordinates_bohr, dtype=dtype)
+    atoms = np.asarray(atom_positions_bohr, dtype=dtype)
+    index = CellList(atoms, cell_size=_PROXIMITY_CELL_BOHR if cutoff is None else cutoff)
+    if np.any(index.any_within(grid, epsilon)):
         raise ValueError("Encountered grid point too close to an atom position when forming Coulomb matrix.")
-    return 1.0 / distances
+    if cutoff is not None:
+        rows, cols, distances = index.query_pairs(grid, cutoff)
+        A = np.zeros((grid.shape[0], atoms.shape[0]), dtype=dtype)
+        A[rows, cols] = 1.0 / distances
+        return A
+    return _coulomb_kernel(grid, atoms)
+
+
+def _coulomb_kernel(grid: np.ndarray, atoms: np.ndarray) -> np.ndarray:
+    """Dense ``1 / r`` block in the dtype of ``grid``; no proximity check."""
+    # Accumulate squared distances one axis at a time instead of materialising
+    # the (M, N, 3) difference tensor.
+    distances = np.subtract.outer(grid[:, 0], atoms[:, 0])
+    np.square(distances, out=distances)
+    axis_diff = np.empty_like(distances)
+    for axis in (1, 2):
+        np.subtract.outer(grid[:, axis], atoms[:, axis], out=axis_diff)
+        np.square(axis_diff, out=axis_diff)
+        distances += axis_diff
+    np.sqrt(distances, out=distances)
+    return np.reciprocal(distances, out=distances)
+
+
+@timed("linear.normal_equations")
+def normal_equations(
+    A: np.ndarray,
+    V: np.ndarray,
+    *,
+    weights: np.ndarray | None = None,
+    chunk_rows: int = _ACCUMULATE_ROWS,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return ``(A^T W A, A^T W V)`` accumulated in float64 whatever the dtype of ``A``.
+
+    ``weights`` is the diagonal of ``W`` as a vector; row tiles are scaled by
+    ``sqrt(w)`` so no ``M x M`` matrix is ever formed.  ``A`` may also be a
+    :class:`~linearESPcharges.iterative.CoulombOperator`, whose row tiles are
+    accumulated one at a time (the ``"tiled"`` strategy).
+    """
+    if not isinstance(A, np.ndarray):
+        # CoulombOperator: tiles are regenerated, so A never exists as a whole.
+        tiles = A._tiles()
+    elif weights is None and A.dtype == np.float64:
+        return A.T @ A, A.T @ V
+    else:
+        tiles = (
+            (start, start + chunk_rows, A[start : start + chunk_rows]) for start in range(0, A.shape[0], chunk_rows)
+        )
+    N = A.shape[1]
+    H = np.zeros((N, N), dtype=np.float64)
+    g = np.zeros(N, dtype=np.float64)
+    for start, stop, tile in tiles:
+        block = tile.astype(np.float64)
+        rhs = V[start:stop]
+        if weights is not None:
+            scale = np.sqrt(weights[start:stop])
+            block *= scale[:, np.newaxis]
+            rhs = rhs * scale
+        H += block.T @ block
+        g += block.T @ rhs
+    return H, g
 
 
-def _metrics(A: np.ndarray, V: np.ndarray, q: np.ndarray) -> Dict[str, Any]:
-    pred = A @ q
+def _matvec(A: np.ndarray, q: np.ndarray, *, chunk_rows: int = _ACCUMULATE_ROWS) -> np.ndarray:
+    """``A @ q`` in float64 without materialising a float64 copy of a reduced-precision ``A``."""
+    if not isinstance(A, np.ndarray) or A.dtype == np.float64:
+        return A @ q
+    out = np.empty(A.shape[0], dtype=np.float64)
+    for start in range(0, A.shape[0], chunk_rows):
+        out[start : start + chunk_rows] = A[start : start + chunk_rows].astype(np.float64) @ q
+    return out
+
+
+def _rmatvec(A: np.ndarray, r: np.ndarray, *, chunk_rows: int = _ACCUMULATE_ROWS) -> np.ndarray:
+    """``A.T @ r`` in float64; see :func:`_matvec`."""
+    if not isinstance(A, np.ndarray) or A.dtype == np.float64:
+        return A.T @ r
+    out = np.zeros(A.shape[1], dtype=np.float64)
+    for start in range(0, A.shape[0], chunk_rows):
+        out += A[start : start + chunk_rows].astype(np.float64).T @ r[start : start + chunk_rows]
+    return out
+
+
+def _metrics(A: np.ndarray, V: np.ndarray, q: np.ndarray, weights: np.ndarray | None = None) -> Dict[str, Any]:
+    pred = _matvec(A, q)
     resid = pred - V
     rmse = float(np.sqrt(np.mean(resid**2)))
     rrms = float(np.sqrt(np.mean(resid**2) / np.mean(V**2))) if np.any(V) else float("nan")
-    return {"pred": pred, "rmse": rmse, "rrms": rrms, "sum_q": float(q.sum())}
+    out = {"pred": pred, "rmse": rmse, "rrms": rrms, "sum_q": float(q.sum())}
+    if weights is not None:
+        out["weighted_rrms"] = (
+            float(np.sqrt((weights @ resid**2) / (weights @ V**2))) if np.any(V) else float("nan")
+        )
+    return out
+
+def _check_weights(weights: np.ndarray, n_points: int) -> np.ndarray:
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.shape != (n_points,):
+        raise ValueError(f"weights must have one entry per grid point ({n_points}), got shape {weights.shape}")
+    if np.any(weights < 0.0):
+        raise ValueError("weights must be non-negative")
+    return weights
 
 def _solve_sym(H: np.ndarray, b: np.ndarray) -> np.ndarray:
     try:
@@ -68,25 +197,192 @@ def _solve_sym(H: np.ndarray, b: np.ndarray) -> np.ndarray:
 class explicit_solution:
     """Closed-form LS + Lagrange projection (no block).
        q* = q0 - ((1^T q0 - Q) / (1^T H^{-1} 1)) * H^{-1} 1
-       where H=A^T A, q0 = H^{-1}A^T V."""
+       where H=A^T A, q0 = H^{-1}A^T V.
+       ``strategy`` (see ``linearESPcharges.planner``) matters when A is a
+       CoulombOperator: "tiled" accumulates H from row tiles, "dense" builds A,
+       "matrix_free" hands the fit to iterative_solution; "auto" plans it."""
     ridge: float = 0.0
+    strategy: str = "auto"
+    memory_budget: int | None = None
+
+    @timed("linear.explicit_fit")
+    def fit(
+        self,
+        A: np.ndarray,
+        V: np.ndarray,
+        Q: float,
+        *,
+        weights: np.ndarray | None = None,
+    ) -> Dict[str, Any]:
+        """Fit charges; ``weights`` (one per grid point) turns this into weighted LS.
+
+        ``rmse``/``rrms`` are always unweighted; a weighted fit also reports
+        ``weighted_rrms``.  A ``"matrix_free"`` fit returns the result of
+        :class:`~linearESPcharges.iterative.iterative_solution` (no ``H``).
+        """
+        if weights is not None:
+            weights = _check_weights(weights, A.shape[0])
+        strategy = self.strategy
+        if strategy == "auto":
+            if isinstance(A, np.ndarray):
+                strategy = "dense"
+            else:
+                from .planner import plan_fit
+
+                strategy = plan_fit(*A.shape, memory_budget=self.memory_budget, allow_dense=False).strategy
+        if strategy == "matrix_free":
+            if weights is not None:
+                raise ValueError("The matrix_free strategy does not support weights")
+            from .iterative import iterative_solution
 
-    def fit(self, A: np.ndarray, V: np.ndarray, Q: float) -> Dict[str, Any]:
-        _, N = A.shape
+            out = iterative_solution(ridge=self.ridge).fit(A, V, Q)
+        else:
+            if strategy == "dense" and not isinstance(A, np.ndarray):
+                A = A.to_dense()
+            elif strategy not in ("dense", "tiled"):
+                raise ValueError(f"Unknown strategy {strategy!r}; choose from auto, dense, tiled, matrix_free")
+            H, g = normal_equations(A, V, weights=weights)
+            out = self.solve_normal(H, g, Q)
+            out.update(_metrics(A, V, out["q"], weights))
+        out["strategy"] = strategy
+        return out
+
+    def solve_normal(self, H: np.ndarray, g: np.ndarray, Q: float) -> Dict[str, Any]:
+        """Constrained solution from precomputed normal equations ``H = A^T A``, ``g = A^T V``."""
+        N = H.shape[0]
         ones = np.ones(N)
-        H = A.T @ A
         if self.ridge > 0.0:
             H = H + self.ridge * np.eye(N)
-        g = A.T @ V
         q0 = _solve_sym(H, g)        # unconstrained LS
         c  = _solve_sym(H, ones)     # correction direction
         alpha = float(ones @ c)
         s = float(ones @ q0)
         q = q0 - ((s - Q) / alpha) * c
-        out = {"q": q, "q0": q0, "H": H, "g": g, "alpha": alpha, "s": s}
-        out.update(_metrics(A, V, q))
+        return {"q": q, "q0": q0, "H": H, "g": g, "alpha": alpha, "s": s}
+
+@dataclass
+class constrained_solution:
+    """Closed-form LS under linear equality constraints ``C q = d``.
+       q* = q0 - H^{-1} C^T mu,   (C H^{-1} C^T) mu = C q0 - d
+       where H=A^T A, q0 = H^{-1}A^T V.  H is factorised once (Cholesky) and
+       the K constraints only add a K x K Schur complement, so total charge,
+       group charges and dipole components cost one fit.  With the single row
+       C = 1^T this is :class:`explicit_solution`."""
+    ridge: float = 0.0
+
+    @timed("linear.constrained_fit")
+    def fit(
+        self,
+        A: np.ndarray,
+        V: np.ndarray,
+        C: np.ndarray,
+        d: np.ndarray,
+        *,
+        weights: np.ndarray | None = None,
+    ) -> Dict[str, Any]:
+        """Fit charges subject to ``C q = d`` (see ``linearESPcharges.constraints``)."""
+        if weights is not None:
+            weights = _check_weights(weights, A.shape[0])
+        H, g = normal_equations(A, V, weights=weights)
+        out = self.solve_normal(H, g, C, d)
+        out.update(_metrics(A, V, out["q"], weights))
         return out
 
+    def solve_normal(self, H: np.ndarray, g: np.ndarray, C: np.ndarray, d: np.ndarray) -> Dict[str, Any]:
+        """Constrained solution from precomputed normal equations ``H = A^T A``, ``g = A^T V``."""
+        C, d = _check_constraints(C, d, H.shape[0])
+        if self.ridge > 0.0:
+            H = H + self.ridge * np.eye(H.shape[0])
+        rhs = np.column_stack([g, C.T])
+        try:
+            solved = cho_solve(cho_factor(H), rhs)
+        except np.linalg.LinAlgError:
+            solved = _solve_sym(H, rhs)
+        q0, X = solved[:, 0], solved[:, 1:]
+        schur = C @ X
+        multipliers = _solve_sym(schur, C @ q0 - d)
+        q = q0 - X @ multipliers
+        return {
+            "q": q,
+            "q0": q0,
+            "multipliers": multipliers,
+            "constraint_residual": C @ q - d,
+            "H": H,
+            "g": g,
+        }
+
+    def solve_batch(self, H: np.ndarray, g: np.ndarray, C: np.ndarray, d: np.ndarray) -> Dict[str, np.ndarray]:
+        """:meth:`solve_normal` for stacks ``H`` ``(B, N, N)``, ``g`` ``(B, N)``.
+
+        ``C`` is ``(K, N)`` (shared) or ``(B, K, N)`` (per frame, e.g. dipole
+        rows built from each frame's positions); ``d`` is ``(K,)`` or ``(B, K)``.
+        """
+        H = np.asarray(H, dtype=np.float64)
+        g = np.asarray(g, dtype=np.float64)
+        B, N = g.shape
+        C = np.broadcast_to(np.asarray(C, dtype=np.float64), (B,) + np.shape(C)[-2:])
+        d = np.broadcast_to(np.asarray(d, dtype=np.float64), (B, C.shape[1]))
+        if C.shape[2] != N:
+            raise ValueError(f"Constraint matrix must have {N} columns, got {C.shape[2]}")
+        if self.ridge > 0.0:
+            H = H + self.ridge * np.eye(N)
+        solved = np.linalg.solve(H, np.concatenate([g[..., np.newaxis], np.swapaxes(C, 1, 2)], axis=2))
+        q0, X = solved[..., 0], solved[..., 1:]
+        schur = C @ X
+        violation = np.einsum("bkn,bn->bk", C, q0) - d
+        try:
+            multipliers = np.linalg.solve(schur, violation[..., np.newaxis])[..., 0]
+        except np.linalg.LinAlgError:  # redundant constraint rows
+            multipliers = np.einsum("bkl,bl->bk", np.linalg.pinv(schur), violation)
+        q = q0 - np.einsum("bnk,bk->bn", X, multipliers)
+        return {
+            "q": q,
+            "q0": q0,
+            "multipliers": multipliers,
+            "constraint_residual": np.einsum("bkn,bn->bk", C, q) - d,
+        }
+
+
+def _check_constraints(C: np.ndarray, d: np.ndarray, n_atoms: int) -> Tuple[np.ndarray, np.ndarray]:
+    C = np.atleast_2d(np.asarray(C, dtype=np.float64))
+    d = np.atleast_1d(np.asarray(d, dtype=np.float64))
+    if C.shape[1] != n_atoms:
+        raise ValueError(f"Constraint matrix must have {n_atoms} columns, got {C.shape[1]}")
+    if d.shape != (C.shape[0],):
+        raise ValueError("d must have one entry per constraint row")
+    return C, d
+
+
+def linear_system_from_frames(
+    frame: Frame,
+    grid_frame: ESPGridFrame,
+    *,
+    precision: str = "double",
+) -> Tuple[np.ndarray, np.ndarray, float, np.ndarray, np.ndarray]:
+    """Assemble ``(A, V, Q, esp_charges, atom_positions_bohr)`` from parsed frames.
+
+    ``A`` comes from :func:`linearESPcharges.design_cache.cached_design_matrix`,
+    so repeated calls for the same grid and geometry reuse one read-only matrix.
+    """
+    from .design_cache import cached_design_matrix
+
+    atom_positions_bohr = np.asarray(frame.positions, dtype=np.float64)
+    grid_coordinates_angstrom = np.asarray(grid_frame.coordinates, dtype=np.float64)
+    grid_coordinates_bohr = grid_coordinates_angstrom * ANGSTROM_TO_BOHR
+    esp_values = np.asarray(grid_frame.potentials, dtype=np.float64)
+
+    design_matrix = cached_design_matrix(
+        grid_coordinates_bohr,
+        atom_positions_bohr,
+        dtype=_precision_dtype(precision),
+        grid_hash=grid_frame.grid_hash,
+    )
+
+    esp_charges = np.asarray(frame.esp_charges, dtype=np.float64)
+    total_charge = float(esp_charges.sum())
+    return design_matrix, esp_values, total_charge, esp_charges, atom_positions_bohr
+
+
 def prepare_linear_system(
     resp_out: Path | str,
     esp_xyz: Path | str,
@@ -95,28 +391,83 @@ def prepare_linear_system(
     frame_index: int | None = None,
     grid_frame_index: int = 0,
     return_positions: bool = False,
-) -> Tuple[np.ndarray, np.ndarray, float, np.ndarray] | Tuple[np.ndarray, np.ndarray, float, np.ndarray, np.ndarray]:
-    resp_parser = ParseRespDotOut(resp_out, number_of_atoms)
-    frames = resp_parser.extract_frames()
-    grid_frames = ParseESPXYZ(esp_xyz).frames()
+    precision: str = "double",
+    weighting: str | np.ndarray | None = None,
+    symbols: Sequence[str] | None = None,
+    strategy: str = "dense",
+    memory_budget: int | None = None,
+) -> Tuple[np.ndarray, ...]:
+    """Assemble ``(A, V, Q, esp_charges)`` for one frame of a TeraChem run.
+
+    ``return_positions`` appends the atom positions (bohr).  ``weighting``
+    appends per-point weights: either an explicit array or a scheme name from
+    :data:`linearESPcharges.weighting.WEIGHTING_SCHEMES`.  The ``"layer"`` and
+    ``"distance"`` schemes need element ``symbols``, and ``"exposure"`` uses the
+    frame's exposure fractions.
+
+    ``A`` is a dense array unless a non-dense ``strategy`` is requested.
+    ``"tiled"``/``"matrix_free"`` return a
+    :class:`~linearESPcharges.iterative.CoulombOperator` (in the ``precision``
+    dtype) that is never materialised; ``"auto"`` lets
+    :func:`linearESPcharges.planner.plan_fit` choose within ``memory_budget``
+    bytes, so the type of ``A`` then depends on the host's free memory.
+    """
+    from .planner import plan_fit
+
+    frames = load_resp_frames(resp_out, number_of_atoms)
+    grid_frames = load_esp_grids(esp_xyz)
 
     if frame_index is None:
         frame_index = len(frames) - 1
     elif frame_index < 0:
         frame_index = len(frames) + frame_index
 
-    frame = frames[frame_index]
+    plan = None
+    if strategy != "dense":
+        plan = plan_fit(
+            len(grid_frames[grid_frame_index].potentials),
+            number_of_atoms,
+            memory_budget=memory_budget,
+            precision=precision,
+            strategy=strategy,
+        )
+    if plan is None or plan.strategy == "dense":
+        design_matrix, esp_values, total_charge, esp_charges, atom_positions_bohr = linear_system_from_frames(
+            frames[frame_index],
+            grid_frames[grid_frame_index],
+            precision=precision,
+        )
+    else:
+        from .iterative import CoulombOperator
 
-    atom_positions_bohr = np.asarray(frame.positions, dtype=np.float64)
-    grid_coordinates_angstrom = np.asarray(grid_frames[grid_frame_index].coordinates, dtype=np.float64)
-    grid_coordinates_bohr = grid_coordinates_angstrom * ANGSTROM_TO_BOHR
-    esp_values = np.asarray(grid_frames[grid_frame_index].potentials, dtype=np.float64)
-
-    design_matrix = build_design_matrix(grid_coordinates_bohr, atom_positions_bohr)
-
-    esp_charges = np.asarray(frame.esp_charges, dtype=np.float64)
-    total_charge = float(esp_charges.sum())
+        atom_positions_bohr = np.asarray(frames[frame_index].positions, dtype=np.float64)
+        grid_bohr = np.asarray(grid_frames[grid_frame_index].coordinates, dtype=np.float64) * ANGSTROM_TO_BOHR
+        design_matrix = CoulombOperator(
+            grid_bohr,
+            atom_positions_bohr,
+            tile_rows=plan.tile_rows,
+            dtype=_precision_dtype(precision),
+        )
+        esp_values = np.asarray(grid_frames[grid_frame_index].potentials, dtype=np.float64)
+        esp_charges = np.asarray(frames[frame_index].esp_charges, dtype=np.float64)
+        total_charge = float(esp_charges.sum())
 
+    result: Tuple[np.ndarray, ...] = (design_matrix, esp_values, total_charge, esp_charges)
     if return_positions:
-        return design_matrix, esp_values, total_charge, esp_charges, atom_positions_bohr
-    return design_matrix, esp_values, total_charge, esp_charges
+        result += (atom_positions_bohr,)
+    if weighting is not None:
+        if isinstance(weighting, str):
+            from .weighting import point_weights
+
+            grid_bohr = np.asarray(grid_frames[grid_frame_index].coordinates, dtype=np.float64) * ANGSTROM_TO_BOHR
+            weights = point_weights(
+                weighting,
+                grid_bohr,
+                atom_positions_bohr,
+                symbols,
+                exposure_fractions=frames[frame_index].exposure_fractions,
+            )
+        else:
+            weights = _check_weights(weighting, esp_values.shape[0])
+        result += (weights,)
+    return result
@@ -0,0 +1,191 @@
+"""Choose how to form and solve the ESP least-squares problem.
+
+Three strategies solve the same charge-constrained fit:
+
+- ``"dense"``: build ``A`` (``M x N``) with :func:`~linearESPcharges.linear.build_design_matrix`
+  and form ``H = A^T A`` from it.  Fastest, but building ``A`` holds two
+  ``M x N`` arrays at once.
+- ``"tiled"``: never hold ``A``; accumulate ``H`` and ``g`` from row tiles of
+  a :class:`~linearESPcharges.iterative.CoulombOperator`.  Same ``O(M N^2)``
+  flops as dense, memory ``O(tile_rows N + N^2)``.
+- ``"matrix_free"``: solve with :class:`~linearESPcharges.iterative.iterative_solution`
+  on the operator; no ``N x N`` matrix at all, ``O(M N)`` work per pass.
+
+:func:`plan_fit` estimates the peak memory of each strategy from the grid
+size, atom count and precision, keeps those within ``memory_budget``
+(default: half of ``MemAvailable``), and picks dense if it fits,
+otherwise the cheaper of tiled and matrix-free by a flop estimate that
+accounts for warm-started iterative solves over ``n_frames`` frames.  The
+decision and its expected peak memory are logged on this module's logger, at
+DEBUG level unless the chosen strategy exceeds the budget (WARNING).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict
+
+from .linear import _ACCUMULATE_ROWS, _precision_dtype
+
+STRATEGIES = ("dense", "tiled", "matrix_free")
+
+# Rough pass counts of the iterative solver over the grid: a cold start needs a
+# few hundred CG iterations on the sample, a warm start from the previous frame
+# far fewer.
+_COLD_PASSES = 300
+_WARM_PASSES = 50
+_FALLBACK_BUDGET_BYTES = 4 * 1024**3
+_MEMINFO = "/proc/meminfo"
+
+logger = logging.getLogger(__name__)
+
+
+def _available_memory() -> int | None:
+    """``MemAvailable`` in bytes (free plus reclaimable page cache), or ``None`` if unknown.
+
+    ``SC_AVPHYS_PAGES`` reports only ``MemFree``, which a busy machine keeps
+    close to zero, so it is used only where ``/proc/meminfo`` is missing.
+    """
+    try:
+        with open(_MEMINFO) as fh:
+            for line in fh:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return int(os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE"))
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def _default_memory_budget() -> int:
+    """Half of the available physical memory, or 4 GiB if unknown."""
+    available = _available_memory()
+    return _FALLBACK_BUDGET_BYTES if available is None else available // 2
+
+
+def estimate_peak_bytes(
+    strategy: str,
+    n_points: int,
+    n_atoms: int,
+    *,
+    precision: str = "double",
+    tile_rows: int = _ACCUMULATE_ROWS,
+) -> int:
+    """Expected peak working memory of one fit, in bytes."""
+
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}; choose from {', '.join(STRATEGIES)}")
+    M, N = int(n_points), int(n_atoms)
+    tile = min(M, int(tile_rows))
+    float64 = 8
+    # Grid coordinates, V and two length-M work vectors (prediction, residual).
+    grid_vectors = (3 + 3) * M * float64
+    # A row tile of 1/r plus the per-axis scratch of _coulomb_kernel.
+    tile_bytes = 2 * tile * N * float64
+    normal = N * N * float64
+    if strategy == "dense":
+        item = _precision_dtype(precision).itemsize
+        cast_tile = tile * N * float64 if item != float64 else 0
+        return 2 * M * N * item + normal + grid_vectors + cast_tile
+    if strategy == "tiled":
+        return tile_bytes + normal + grid_vectors
+    return tile_bytes + grid_vectors
+
+
+def _estimate_flops(strategy: str, n_points: int, n_atoms: int, n_frames: int) -> float:
+    M, N, F = float(n_points), float(n_atoms), max(int(n_frames), 1)
+    if strategy == "matrix_free":
+        return 2.0 * M * N * (_COLD_PASSES + (F - 1) * _WARM_PASSES)
+    return F * M * N * N
+
+
+@dataclass(frozen=True)
+class FitPlan:
+    """Outcome of :func:`plan_fit`."""
+
+    strategy: str
+    n_points: int
+    n_atoms: int
+    n_frames: int
+    precision: str
+    tile_rows: int
+    memory_budget: int
+    estimates: Dict[str, int]
+    reason: str
+
+    @property
+    def peak_bytes(self) -> int:
+        return self.estimates[self.strategy]
+
+    @property
+    def within_budget(self) -> bool:
+        return self.peak_bytes <= self.memory_budget
+
+    def describe(self) -> str:
+        mib = 1024.0**2
+        return (
+            f"ESP fit strategy {self.strategy!r} for {self.n_points} grid points x {self.n_atoms} atoms"
+            f" ({self.n_frames} frame{'s' if self.n_frames != 1 else ''}): expected peak"
+            f" {self.peak_bytes / mib:.1f} MiB of {self.memory_budget / mib:.1f} MiB budget; {self.reason}"
+        )
+
+
+def plan_fit(
+    n_points: int,
+    n_atoms: int,
+    *,
+    n_frames: int = 1,
+    memory_budget: int | None = None,
+    precision: str = "double",
+    strategy: str = "auto",
+    tile_rows: int = _ACCUMULATE_ROWS,
+    allow_dense: bool = True,
+) -> FitPlan:
+    """Pick a strategy from :data:`STRATEGIES` (or validate an explicit one) and log it.
+
+    ``allow_dense=False`` restricts the choice to the operator-based
+    strategies, e.g. when ``A`` already is a :class:`~linearESPcharges.iterative.CoulombOperator`.
+    """
+
+    if strategy != "auto" and strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}; choose from auto, {', '.join(STRATEGIES)}")
+    budget = _default_memory_budget() if memory_budget is None else int(memory_budget)
+    estimates = {
+        name: estimate_peak_bytes(name, n_points, n_atoms, precision=precision, tile_rows=tile_rows)
+        for name in STRATEGIES
+    }
+
+    if strategy != "auto":
+        chosen, reason = strategy, "requested explicitly"
+    elif allow_dense and estimates["dense"] <= budget:
+        chosen, reason = "dense", "the dense design matrix fits the budget"
+    else:
+        fitting = [name for name in ("tiled", "matrix_free") if estimates[name] <= budget]
+        if fitting:
+            chosen = min(fitting, key=lambda name: _estimate_flops(name, n_points, n_atoms, n_frames))
+            reason = ("dense A exceeds the budget; " if allow_dense else "A is an operator; ") + (
+                "lowest estimated work" if len(fitting) > 1 else "only strategy within the budget"
+            )
+        else:
+            chosen, reason = "matrix_free", "no strategy fits the budget; using the smallest footprint"
+
+    plan = FitPlan(
+        strategy=chosen,
+        n_points=int(n_points),
+        n_atoms=int(n_atoms),
+        n_frames=int(n_frames),
+        precision=precision,
+        tile_rows=int(tile_rows),
+        memory_budget=budget,
+        estimates=estimates,
+        reason=reason,
+    )
+    logger.log(logging.DEBUG if plan.within_budget else logging.WARNING, plan.describe())
+    return plan
+
+
+__all__ = ["FitPlan", "STRATEGIES", "estimate_peak_bytes", "plan_fit"]
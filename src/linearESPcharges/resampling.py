@@ -0,0 +1,223 @@
+"""Bootstrap and jackknife uncertainties for fitted ESP charges.
+
+Resampling grid points is equivalent to reweighting them, so replicate ``b``
+only needs the weighted normal equations ``H_b = sum_i w_bi a_i a_i^T`` and
+``g_b = sum_i w_bi V_i a_i``.  For a tile of grid rows these are computed for
+all replicates at once as one matrix product of the ``(B, tile)`` weight
+matrix with the tile's pairwise column products (upper triangle only), and
+the ``B`` constrained systems are then solved as a single stacked
+``np.linalg.solve``.  Large replicate counts can be split over processes;
+replicate weights are drawn from per-batch seeds, so results do not depend on
+``jobs``.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from instrumentation import timed
+
+from .linear import explicit_solution
+
+# Cap on the (tile rows x N(N+1)/2) pair-product buffers of one grid tile.
+_PAIR_TILE_BYTES = 32 * 1024**2
+# Up to this many replicates, each H_b is a plain (tile * w_b).T @ tile product.
+_PER_REPLICATE_MAX = 4
+
+_WORKER_STATE: Dict[str, Any] = {}
+
+
+@dataclass(frozen=True)
+class ChargeUncertainty:
+    """Per-atom spread of charges over resampled fits."""
+
+    method: str
+    estimate: np.ndarray
+    replicates: np.ndarray
+    mean: np.ndarray
+    std: np.ndarray
+    covariance: np.ndarray
+
+    @property
+    def n_replicates(self) -> int:
+        return int(self.replicates.shape[0])
+
+
+def weighted_normal_equations(
+    A: np.ndarray,
+    V: np.ndarray,
+    weights: np.ndarray,
+    *,
+    chunk_rows: int | None = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Stacked ``(H_b, g_b)`` for every row of ``weights`` (shape ``(B, M)``), in float64.
+
+    ``chunk_rows`` defaults to the largest tile whose pair products fit in
+    :data:`_PAIR_TILE_BYTES`.
+    """
+
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    B = weights.shape[0]
+    M, N = A.shape
+    if weights.shape[1] != M:
+        raise ValueError("weights must have one column per grid point")
+    g = np.zeros((B, N), dtype=np.float64)
+
+    if B <= _PER_REPLICATE_MAX:
+        rows = chunk_rows or max(1, _PAIR_TILE_BYTES // (8 * N))
+        H = np.zeros((B, N, N), dtype=np.float64)
+        for start in range(0, M, rows):
+            stop = start + rows
+            tile = np.asarray(A[start:stop], dtype=np.float64)
+            W = weights[:, start:stop]
+            for b in range(B):
+                H[b] += (tile * W[b, :, np.newaxis]).T @ tile
+            g += W @ (tile * V[start:stop, np.newaxis])
+        return H, g
+
+    upper_i, upper_j = np.triu_indices(N)
+    pairs = upper_i.size
+    rows = min(M, chunk_rows or max(1, _PAIR_TILE_BYTES // (2 * 8 * pairs)))
+    left = np.empty((rows, pairs), dtype=np.float64)
+    right = np.empty((rows, pairs), dtype=np.float64)
+    H_upper = np.zeros((B, pairs), dtype=np.float64)
+    for start in range(0, M, rows):
+        stop = min(start + rows, M)
+        tile = np.asarray(A[start:stop], dtype=np.float64)
+        W = weights[:, start:stop]
+        n = stop - start
+        np.take(tile, upper_i, axis=1, out=left[:n])
+        np.take(tile, upper_j, axis=1, out=right[:n])
+        np.multiply(left[:n], right[:n], out=left[:n])
+        H_upper += W @ left[:n]
+        g += W @ (tile * V[start:stop, np.newaxis])
+    H = np.empty((B, N, N), dtype=np.float64)
+    H[:, upper_i, upper_j] = H_upper
+    H[:, upper_j, upper_i] = H_upper
+    return H, g
+
+
+def solve_constrained_batch(H: np.ndarray, g: np.ndarray, Q: float, *, ridge: float = 0.0) -> np.ndarray:
+    """Batched :class:`explicit_solution` projection: one charge vector per ``(H_b, g_b)``."""
+
+    B, N, _ = H.shape
+    if ridge > 0.0:
+        H = H + ridge * np.eye(N)
+    rhs = np.stack([g, np.ones((B, N))], axis=2)
+    solved = np.linalg.solve(H, rhs)
+    q0, c = solved[..., 0], solved[..., 1]
+    shift = (q0.sum(axis=1) - Q) / c.sum(axis=1)
+    return q0 - shift[:, np.newaxis] * c
+
+
+def _init_worker(state: Dict[str, Any]) -> None:
+    _WORKER_STATE.clear()
+    _WORKER_STATE.update(state)
+
+
+def _bootstrap_batch(task: Tuple[np.random.SeedSequence, int]) -> np.ndarray:
+    seed, size = task
+    A, V = _WORKER_STATE["A"], _WORKER_STATE["V"]
+    M = A.shape[0]
+    rng = np.random.default_rng(seed)
+    counts = np.stack([np.bincount(rng.integers(0, M, size=M), minlength=M) for _ in range(size)])
+    H, g = weighted_normal_equations(A, V, counts)
+    return solve_constrained_batch(H, g, _WORKER_STATE["Q"], ridge=_WORKER_STATE["ridge"])
+
+
+def _summarise(method: str, estimate: np.ndarray, replicates: np.ndarray, scale: float) -> ChargeUncertainty:
+    mean = replicates.mean(axis=0)
+    centred = replicates - mean
+    covariance = scale * (centred.T @ centred)
+    return ChargeUncertainty(
+        method=method,
+        estimate=estimate,
+        replicates=replicates,
+        mean=mean,
+        std=np.sqrt(np.diag(covariance)),
+        covariance=covariance,
+    )
+
+
+@timed("linear.bootstrap")
+def bootstrap_charges(
+    A: np.ndarray,
+    V: np.ndarray,
+    Q: float,
+    *,
+    n_replicates: int = 200,
+    batch_size: int = 256,
+    ridge: float = 0.0,
+    seed: int | None = None,
+    jobs: int = 1,
+) -> ChargeUncertainty:
+    """Nonparametric bootstrap over grid points.
+
+    Each replicate draws ``M`` grid points with replacement (the draw counts
+    are used as weights).  Replicates are generated and solved in batches of
+    ``batch_size``; with ``jobs > 1`` batches are spread over worker processes.
+    """
+
+    if n_replicates < 2:
+        raise ValueError("n_replicates must be at least 2")
+    V = np.asarray(V, dtype=np.float64)
+    estimate = explicit_solution(ridge=ridge).fit(A, V, Q)["q"]
+
+    sizes = [batch_size] * (n_replicates // batch_size)
+    if n_replicates % batch_size:
+        sizes.append(n_replicates % batch_size)
+    tasks = list(zip(np.random.SeedSequence(seed).spawn(len(sizes)), sizes))
+    state = {"A": A, "V": V, "Q": float(Q), "ridge": ridge}
+
+    batches: List[np.ndarray]
+    if jobs <= 1 or len(tasks) == 1:
+        _init_worker(state)
+        batches = [_bootstrap_batch(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(state,)) as pool:
+            batches = list(pool.map(_bootstrap_batch, tasks))
+    replicates = np.concatenate(batches)
+    return _summarise("bootstrap", estimate, replicates, 1.0 / (n_replicates - 1))
+
+
+@timed("linear.jackknife")
+def jackknife_charges(
+    A: np.ndarray,
+    V: np.ndarray,
+    Q: float,
+    *,
+    n_groups: int = 20,
+    ridge: float = 0.0,
+    seed: int | None = None,
+) -> ChargeUncertainty:
+    """Delete-a-group jackknife: grid points are split into ``n_groups`` random groups.
+
+    Each replicate drops one group; the covariance uses the jackknife factor
+    ``(n_groups - 1) / n_groups``.
+    """
+
+    M = A.shape[0]
+    if not 2 <= n_groups <= M:
+        raise ValueError(f"n_groups must be in [2, {M}]")
+    V = np.asarray(V, dtype=np.float64)
+    estimate = explicit_solution(ridge=ridge).fit(A, V, Q)["q"]
+
+    rng = np.random.default_rng(seed)
+    groups = rng.permutation(M) % n_groups
+    weights = (groups[np.newaxis, :] != np.arange(n_groups)[:, np.newaxis]).astype(np.float64)
+    H, g = weighted_normal_equations(A, V, weights)
+    replicates = solve_constrained_batch(H, g, Q, ridge=ridge)
+    return _summarise("jackknife", estimate, replicates, (n_groups - 1) / n_groups)
+
+
+__all__ = [
+    "ChargeUncertainty",
+    "bootstrap_charges",
+    "jackknife_charges",
+    "solve_constrained_batch",
+    "weighted_normal_equations",
+]
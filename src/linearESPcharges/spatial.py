@@ -0,0 +1,143 @@
+"""Cell-list spatial index for local neighbourhood queries.
+
+Points (atom positions in bohr) are binned into cubic cells of edge
+``cell_size``; a query only inspects the ``(2k + 1)^3`` cells around its own,
+with ``k = ceil(radius / cell_size)``, so finding every point within
+``radius`` of ``M`` queries costs ``O(M)`` cell lookups plus the number of
+candidate pairs instead of the ``O(M N)`` of a dense distance matrix.  All
+loops run over cell offsets, never over points.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+
+_MAX_CELLS_PER_AXIS = 256
+
+
+class CellList:
+    """Cell list over ``points`` with cubic cells of edge ``cell_size``.
+
+    Parameters
+    ----------
+    points
+        ``(N, 3)`` coordinates to index (typically atom positions in bohr).
+    cell_size
+        Cell edge in the units of ``points``.  Queries are fastest when the
+        search radius is at most one cell edge.  The edge is enlarged if needed
+        to keep at most ``_MAX_CELLS_PER_AXIS`` cells along any axis.
+    """
+
+    def __init__(self, points: np.ndarray, cell_size: float) -> None:
+        points = np.asarray(points, dtype=np.float64)
+        if points.ndim != 2 or points.shape[1] != 3:
+            raise ValueError("points must have shape (N, 3)")
+        if not cell_size > 0.0:
+            raise ValueError("cell_size must be positive")
+
+        self.points = points
+        self.origin = points.min(axis=0) if points.size else np.zeros(3)
+        extent = float(np.max(points.max(axis=0) - self.origin)) if points.size else 0.0
+        self.cell_size = max(float(cell_size), extent / _MAX_CELLS_PER_AXIS)
+        cells = self._cells(points)
+        self.shape = cells.max(axis=0) + 1 if points.size else np.ones(3, dtype=np.int64)
+
+        keys = self._keys(cells, self.shape)
+        self.order = np.argsort(keys, kind="stable")
+        cell_keys, self.starts, self.counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+        self._cell_keys = cell_keys
+        self._tables: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.points.shape[0]
+
+    def _cells(self, coordinates: np.ndarray) -> np.ndarray:
+        return np.floor((coordinates - self.origin) / self.cell_size).astype(np.int64)
+
+    @staticmethod
+    def _keys(cells: np.ndarray, shape: np.ndarray) -> np.ndarray:
+        return (cells[:, 0] * shape[1] + cells[:, 1]) * shape[2] + cells[:, 2]
+
+    def _table(self, span: int) -> np.ndarray:
+        """Dense cell -> slot lookup padded so that every neighbour of a clipped query cell is in range."""
+        table = self._tables.get(span)
+        if table is None:
+            pad = 2 * span + 1
+            padded = self.shape + 2 * pad
+            table = np.full(int(np.prod(padded)), -1, dtype=np.int64)
+            occupied = np.stack(np.unravel_index(self._cell_keys, tuple(self.shape)), axis=1)
+            table[self._keys(occupied + pad, padded)] = np.arange(self._cell_keys.size)
+            self._tables[span] = table
+        return table
+
+    def _neighbour_blocks(self, queries: np.ndarray, radius: float) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Yield ``(query_idx, point_idx)`` candidate pairs, one block per cell offset."""
+
+        span = max(1, int(np.ceil(radius / self.cell_size)))
+        pad = 2 * span + 1
+        padded = self.shape + 2 * pad
+        table = self._table(span)
+        # Queries further out than ``span`` cells cannot reach any point; clipping
+        # them keeps every lookup inside the padded table.
+        query_cells = np.clip(self._cells(queries), -(span + 1), self.shape + span) + pad
+        base_keys = self._keys(query_cells, padded)
+        steps = np.arange(-span, span + 1)
+        offsets = np.stack(np.meshgrid(steps, steps, steps, indexing="ij"), axis=-1).reshape(-1, 3)
+        # Skip offsets whose nearest corner is already further than ``radius``.
+        gap = np.maximum(np.abs(offsets) - 1, 0) * self.cell_size
+        offsets = offsets[np.einsum("ij,ij->i", gap, gap) <= radius * radius]
+
+        for delta in self._keys(offsets, padded):
+            slot = table[base_keys + delta]
+            query_idx = np.flatnonzero(slot >= 0)
+            if query_idx.size == 0:
+                continue
+            slot = slot[query_idx]
+            counts = self.counts[slot]
+            total = int(counts.sum())
+            # Expand every (query, cell) hit into one entry per point in the cell.
+            first = np.repeat(self.starts[slot] - (np.cumsum(counts) - counts), counts)
+            yield np.repeat(query_idx, counts), self.order[first + np.arange(total)]
+
+    def candidates(self, queries: np.ndarray, radius: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Query/point index pairs sharing a neighbourhood, before any distance test."""
+
+        queries = np.asarray(queries, dtype=np.float64)
+        blocks = list(self._neighbour_blocks(queries, radius))
+        if not blocks:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+        return np.concatenate([b[0] for b in blocks]), np.concatenate([b[1] for b in blocks])
+
+    def query_pairs(self, queries: np.ndarray, radius: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Every ``(query_index, point_index, distance)`` with ``distance <= radius``."""
+
+        queries = np.asarray(queries, dtype=np.float64)
+        query_parts = []
+        point_parts = []
+        distance_parts = []
+        for query_idx, point_idx in self._neighbour_blocks(queries, radius):
+            diffs = queries[query_idx]
+            diffs -= self.points[point_idx]
+            squared = np.einsum("ij,ij->i", diffs, diffs)
+            keep = np.flatnonzero(squared <= radius * radius)
+            query_parts.append(query_idx[keep])
+            point_parts.append(point_idx[keep])
+            distance_parts.append(np.sqrt(squared[keep]))
+        if not query_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        return np.concatenate(query_parts), np.concatenate(point_parts), np.concatenate(distance_parts)
+
+    def any_within(self, queries: np.ndarray, radius: float) -> np.ndarray:
+        """Boolean mask of the queries that have at least one point within ``radius``."""
+
+        queries = np.asarray(queries, dtype=np.float64)
+        query_idx, _point_idx, _distances = self.query_pairs(queries, radius)
+        mask = np.zeros(queries.shape[0], dtype=bool)
+        mask[query_idx] = True
+        return mask
+
+
+__all__ = ["CellList"]
@@ -0,0 +1,191 @@
+"""Pre-fit grid reduction for dense ESP grids.
+
+Dense Connolly grids (``esp_grid_dens 4.0``) carry far more points than the
+``N``-dimensional fit needs.  The routines here pick a representative subset of
+grid rows and attach importance weights so that the weighted least-squares
+problem on the subset is an unbiased estimate of the full one:
+
+- ``"leverage"`` samples rows with probability proportional to (approximate)
+  statistical leverage ``a_i^T (A^T A)^{-1} a_i``, mixed with a uniform floor
+  so that no row is starved by an inaccurate score.  Scores come from a sketch
+  (a uniform pilot sample plus a Gaussian projection), costing ``O(M N k)``
+  rather than the ``O(M N^2)`` of an exact computation.
+- ``"stratified"`` groups points by their nearest atom and by distance shell
+  (a proxy for the Connolly layer) and samples each stratum proportionally.
+
+Weights are applied by scaling rows with ``sqrt(w)``, so the reduced system can
+be handed to :class:`explicit_solution` unchanged.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from .linear import _matvec, explicit_solution
+
+
+@dataclass(frozen=True)
+class GridSubsample:
+    """Selected grid rows and the importance weight of each."""
+
+    indices: np.ndarray
+    weights: np.ndarray
+    method: str
+    n_total: int
+
+    @property
+    def fraction(self) -> float:
+        return self.indices.size / self.n_total
+
+
+def approximate_leverage_scores(
+    A: np.ndarray,
+    *,
+    sketch_size: int = 32,
+    pilot_rows: int | None = None,
+    seed: int | None = None,
+) -> np.ndarray:
+    """Sketched leverage scores of the rows of ``A`` (they sum to roughly ``N``)."""
+
+    rng = np.random.default_rng(seed)
+    M, N = A.shape
+    pilot_rows = min(M, pilot_rows if pilot_rows is not None else 20 * N)
+    pilot = rng.choice(M, size=pilot_rows, replace=False)
+    # R from a uniform pilot approximates the R factor of A up to the sampling scale.
+    R = np.linalg.qr(A[pilot].astype(np.float64) * np.sqrt(M / pilot_rows), mode="r")
+    omega = rng.standard_normal((N, sketch_size)) / np.sqrt(sketch_size)
+    try:
+        projection = np.linalg.solve(R, omega)
+    except np.linalg.LinAlgError:
+        projection, *_ = np.linalg.lstsq(R, omega, rcond=None)
+    sketched = A @ projection.astype(A.dtype, copy=False)
+    return np.einsum("ij,ij->i", sketched, sketched, dtype=np.float64)
+
+
+def _grid_strata(A: np.ndarray, n_shells: int) -> np.ndarray:
+    nearest_atom = np.argmax(A, axis=1)
+    nearest_distance = 1.0 / A[np.arange(A.shape[0]), nearest_atom]
+    edges = np.quantile(nearest_distance, np.linspace(0.0, 1.0, n_shells + 1)[1:-1])
+    shell = np.searchsorted(edges, nearest_distance)
+    return nearest_atom * n_shells + shell
+
+
+def subsample_grid(
+    A: np.ndarray,
+    *,
+    n_points: int | None = None,
+    fraction: float | None = None,
+    method: str = "leverage",
+    n_shells: int = 4,
+    uniform_mix: float = 0.2,
+    seed: int | None = None,
+) -> GridSubsample:
+    """Choose a weighted subset of the grid rows of ``A``.
+
+    Exactly one of ``n_points``/``fraction`` sets the target size.  For
+    ``"leverage"`` sampling the target is the number of draws; duplicate draws
+    are merged into one row with a larger weight, so slightly fewer unique
+    points may be returned.
+    """
+
+    M = A.shape[0]
+    if (n_points is None) == (fraction is None):
+        raise ValueError("Provide exactly one of n_points or fraction")
+    if n_points is None:
+        n_points = int(round(fraction * M))
+    if not 0 < n_points <= M:
+        raise ValueError(f"n_points must be in (0, {M}], got {n_points}")
+
+    rng = np.random.default_rng(seed)
+
+    if method == "leverage":
+        scores = approximate_leverage_scores(A, seed=None if seed is None else seed + 1)
+        probabilities = (1.0 - uniform_mix) * scores / scores.sum() + uniform_mix / M
+        draws = rng.choice(M, size=n_points, replace=True, p=probabilities)
+        indices, counts = np.unique(draws, return_counts=True)
+        weights = counts / (n_points * probabilities[indices])
+    elif method == "stratified":
+        strata = _grid_strata(A, n_shells)
+        labels, inverse, sizes = np.unique(strata, return_inverse=True, return_counts=True)
+        quota = np.maximum(1, np.round(sizes * (n_points / M))).astype(int)
+        picked = []
+        weights_list = []
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.concatenate([[0], np.cumsum(sizes)])
+        for label in range(labels.size):
+            members = order[bounds[label] : bounds[label + 1]]
+            chosen = rng.choice(members, size=min(quota[label], members.size), replace=False)
+            picked.append(chosen)
+            weights_list.append(np.full(chosen.size, members.size / chosen.size))
+        indices = np.concatenate(picked)
+        weights = np.concatenate(weights_list)
+        sort = np.argsort(indices)
+        indices, weights = indices[sort], weights[sort]
+    else:
+        raise ValueError(f"Unknown subsampling method {method!r}; use 'leverage' or 'stratified'")
+
+    return GridSubsample(indices=indices, weights=weights, method=method, n_total=M)
+
+
+def apply_subsample(
+    A: np.ndarray,
+    V: np.ndarray,
+    subsample: GridSubsample,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return ``(sqrt(w) * A[idx], sqrt(w) * V[idx])`` for a weighted fit on the subset."""
+
+    scale = np.sqrt(subsample.weights)
+    A_sub = A[subsample.indices] * scale[:, np.newaxis].astype(A.dtype, copy=False)
+    V_sub = V[subsample.indices] * scale
+    return A_sub, V_sub
+
+
+def compare_subsampled_fit(
+    A: np.ndarray,
+    V: np.ndarray,
+    Q: float,
+    subsample: GridSubsample,
+    *,
+    solver: explicit_solution | None = None,
+) -> Dict[str, Any]:
+    """Fit on the full grid and on ``subsample`` and report how much the charges move.
+
+    ``rrms_subsampled`` evaluates the subset charges on the *full* grid, so it is
+    directly comparable to ``rrms_full``.
+    """
+
+    solver = solver or explicit_solution()
+    full = solver.fit(A, V, Q)
+    A_sub, V_sub = apply_subsample(A, V, subsample)
+    reduced = solver.fit(A_sub, V_sub, Q)
+
+    q_full = full["q"]
+    q_sub = reduced["q"]
+    resid = _matvec(A, q_sub) - V
+    rrms_sub = float(np.sqrt(np.mean(resid**2) / np.mean(V**2))) if np.any(V) else float("nan")
+    delta = q_sub - q_full
+    return {
+        "q_full": q_full,
+        "q_subsampled": q_sub,
+        "max_abs_charge_diff": float(np.max(np.abs(delta))),
+        "rms_charge_diff": float(np.sqrt(np.mean(delta**2))),
+        "rrms_full": full["rrms"],
+        "rrms_subsampled": rrms_sub,
+        "rmse_full": full["rmse"],
+        "rmse_subsampled": float(np.sqrt(np.mean(resid**2))),
+        "n_points": int(subsample.indices.size),
+        "fraction": subsample.fraction,
+        "method": subsample.method,
+    }
+
+
+__all__ = [
+    "GridSubsample",
+    "approximate_leverage_scores",
+    "apply_subsample",
+    "compare_subsampled_fit",
+    "subsample_grid",
+]
@@ -0,0 +1,147 @@
+"""Per-point weights for weighted ESP/RESP fits.
+
+A weighted fit minimises ``sum_i w_i (a_i^T q - V_i)^2``.  The weights are
+consumed as vectors by :func:`~linearESPcharges.linear.normal_equations`
+(``A^T W A`` is formed from row-scaled tiles, never from a diagonal matrix),
+:class:`~linearESPcharges.linear.explicit_solution` and the RESP solver.
+
+Built-in schemes, all normalised to mean 1 so that ridge and restraint
+strengths keep their unweighted meaning:
+
+- ``"layer"``: each point is assigned to the Connolly layer ``s * r_vdW`` it
+  lies on; every layer gets the same total weight by default, or the
+  per-layer factors passed as ``layer_factors``.
+- ``"distance"``: ``w = s^-power`` with ``s`` the point's distance to the
+  molecular surface in units of van der Waals radii, so far points count less.
+- ``"exposure"``: each point takes the solvent-exposure fraction of the atom
+  it belongs to (``Frame.exposure_fractions``), downweighting points over
+  buried regions; ``floor`` keeps every weight positive.
+"""
+
+from __future__ import annotations
+
+from typing import Sequence, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .grid import DEFAULT_LAYER_SCALES, vdw_radii_bohr
+
+WEIGHTING_SCHEMES = ("uniform", "layer", "distance", "exposure")
+
+_OWNER_CANDIDATES = 16
+
+
+def _normalise(weights: np.ndarray) -> np.ndarray:
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.ndim != 1 or np.any(weights < 0.0) or not np.any(weights > 0.0):
+        raise ValueError("weights must be a non-negative 1-D array with at least one positive entry")
+    return weights * (weights.size / weights.sum())
+
+
+def surface_owners(
+    grid_coordinates_bohr: np.ndarray,
+    atom_positions_bohr: np.ndarray,
+    symbols: Sequence[str],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """For every grid point, the atom minimising ``|G - R_j| / r_vdW,j`` and that ratio."""
+
+    atoms = np.asarray(atom_positions_bohr, dtype=np.float64)
+    radii = vdw_radii_bohr(symbols)
+    k = min(_OWNER_CANDIDATES, atoms.shape[0])
+    distances, neighbours = cKDTree(atoms).query(np.asarray(grid_coordinates_bohr, dtype=np.float64), k=k)
+    distances = distances.reshape(-1, k)
+    neighbours = neighbours.reshape(-1, k)
+    ratios = distances / radii[neighbours]
+    best = np.argmin(ratios, axis=1)
+    rows = np.arange(ratios.shape[0])
+    return neighbours[rows, best], ratios[rows, best]
+
+
+def layer_weights(
+    grid_coordinates_bohr: np.ndarray,
+    atom_positions_bohr: np.ndarray,
+    symbols: Sequence[str],
+    *,
+    layer_scales: Sequence[float] = DEFAULT_LAYER_SCALES,
+    layer_factors: Sequence[float] | None = None,
+) -> np.ndarray:
+    """Per-layer weights; by default every layer carries the same total weight."""
+
+    _, ratios = surface_owners(grid_coordinates_bohr, atom_positions_bohr, symbols)
+    scales = np.asarray(layer_scales, dtype=np.float64)
+    layers = np.argmin(np.abs(ratios[:, np.newaxis] - scales[np.newaxis, :]), axis=1)
+    if layer_factors is None:
+        counts = np.bincount(layers, minlength=scales.size).astype(np.float64)
+        factors = np.divide(1.0, counts, out=np.zeros_like(counts), where=counts > 0)
+    else:
+        factors = np.asarray(layer_factors, dtype=np.float64)
+        if factors.shape != scales.shape:
+            raise ValueError("layer_factors must have one entry per layer scale")
+    return _normalise(factors[layers])
+
+
+def distance_weights(
+    grid_coordinates_bohr: np.ndarray,
+    atom_positions_bohr: np.ndarray,
+    symbols: Sequence[str],
+    *,
+    power: float = 2.0,
+) -> np.ndarray:
+    """``(d / r_vdW)^-power`` of each point's closest atom surface."""
+
+    _, ratios = surface_owners(grid_coordinates_bohr, atom_positions_bohr, symbols)
+    return _normalise(ratios ** (-power))
+
+
+def exposure_weights(
+    grid_coordinates_bohr: np.ndarray,
+    atom_positions_bohr: np.ndarray,
+    symbols: Sequence[str],
+    exposure_fractions: Sequence[float],
+    *,
+    floor: float = 0.05,
+) -> np.ndarray:
+    """Exposure fraction of the atom owning each point, clipped below at ``floor``."""
+
+    exposure = np.asarray(exposure_fractions, dtype=np.float64)
+    if exposure.shape != (len(symbols),):
+        raise ValueError("exposure_fractions must have one entry per atom")
+    owners, _ = surface_owners(grid_coordinates_bohr, atom_positions_bohr, symbols)
+    return _normalise(np.maximum(exposure[owners], floor))
+
+
+def point_weights(
+    scheme: str,
+    grid_coordinates_bohr: np.ndarray,
+    atom_positions_bohr: np.ndarray,
+    symbols: Sequence[str] | None = None,
+    *,
+    exposure_fractions: Sequence[float] | None = None,
+) -> np.ndarray:
+    """Weights for one of :data:`WEIGHTING_SCHEMES` with default parameters."""
+
+    M = np.asarray(grid_coordinates_bohr).shape[0]
+    if scheme == "uniform":
+        return np.ones(M)
+    if scheme not in WEIGHTING_SCHEMES:
+        raise ValueError(f"Unknown weighting scheme {scheme!r}; choose from {', '.join(WEIGHTING_SCHEMES)}")
+    if symbols is None:
+        raise ValueError(f"Weighting scheme {scheme!r} needs element symbols for van der Waals radii")
+    if scheme == "layer":
+        return layer_weights(grid_coordinates_bohr, atom_positions_bohr, symbols)
+    if scheme == "distance":
+        return distance_weights(grid_coordinates_bohr, atom_positions_bohr, symbols)
+    if exposure_fractions is None or len(exposure_fractions) == 0:
+        raise ValueError("Weighting scheme 'exposure' needs per-atom exposure fractions")
+    return exposure_weights(grid_coordinates_bohr, atom_positions_bohr, symbols, exposure_fractions)
+
+
+__all__ = [
+    "WEIGHTING_SCHEMES",
+    "distance_weights",
+    "exposure_weights",
+    "layer_weights",
+    "point_weights",
+    "surface_owners",
+]
@@ -1,6 +1,37 @@
-
 """RESP/ESP parsing utilities."""
 
-from .parser import ParseRespDotOut, ParseESPXYZ, ParseDotXYZ
+from .parser import ParseRespDotOut, ParseESPXYZ, ParseDotXYZ, coordinates_hash
+from .cache import (
+    clear_cache,
+    load_esp_grid,
+    load_esp_grids,
+    load_resp_frames,
+    load_resp_offsets,
+    load_topology,
+    load_xyz_elements,
+)
+from .compressed import GzipSeekIndex, gzip_seek_index, open_seekable, open_stream
+from .topology import Topology, read_topology
+from .writer import write_esp_xyz, write_resp_out
 
-__all__ = ["ParseRespDotOut", "ParseESPXYZ", "ParseDotXYZ"]
+__all__ = [
+    "ParseRespDotOut",
+    "ParseESPXYZ",
+    "ParseDotXYZ",
+    "coordinates_hash",
+    "clear_cache",
+    "load_esp_grid",
+    "load_esp_grids",
+    "load_resp_frames",
+    "load_resp_offsets",
+    "load_topology",
+    "load_xyz_elements",
+    "GzipSeekIndex",
+    "gzip_seek_index",
+    "open_seekable",
+    "open_stream",
+    "Topology",
+    "read_topology",
+    "write_esp_xyz",
+    "write_resp_out",
+]
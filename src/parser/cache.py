@@ -0,0 +1,88 @@
+"""Process-wide memoisation of parsed trajectory files.
+
+Trajectory drivers touch the same ``resp.out``/``esp.xyz``/geometry files many
+times (one call per frame and per subcommand).  The loaders below parse each
+file once and hand back the cached result until the file changes on disk, which
+is detected through its size and modification time.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Tuple
+
+from .compressed import _FileKey, _file_key, clear_seek_indices
+from .parser import ESPGridFrame, Elements, Frame, ParseDotXYZ, ParseESPXYZ, ParseRespDotOut
+from .topology import Topology, read_topology
+
+
+@lru_cache(maxsize=8)
+def _resp_frames(key: _FileKey, number_of_atoms: int) -> Tuple[Frame, ...]:
+    return tuple(ParseRespDotOut(key[0], number_of_atoms).extract_frames())
+
+
+@lru_cache(maxsize=8)
+def _esp_grids(key: _FileKey) -> Tuple[ESPGridFrame, ...]:
+    return tuple(ParseESPXYZ(key[0]).frames())
+
+
+@lru_cache(maxsize=8)
+def _xyz_elements(key: _FileKey) -> Tuple[Elements, ...]:
+    return tuple(ParseDotXYZ(key[0]).elements())
+
+
+@lru_cache(maxsize=8)
+def _resp_offsets(key: _FileKey) -> Tuple[int, ...]:
+    return tuple(ParseRespDotOut(key[0], 0).frame_offsets())
+
+
+@lru_cache(maxsize=8)
+def _topology(key: _FileKey) -> Topology:
+    return read_topology(key[0])
+
+
+@lru_cache(maxsize=32)
+def _esp_grid(key: _FileKey, index: int) -> ESPGridFrame:
+    return ParseESPXYZ(key[0]).frames([index])[0]
+
+
+def load_resp_frames(resp_out: Path | str, number_of_atoms: int) -> List[Frame]:
+    """Return all frames of ``resp_out``, parsing the file at most once."""
+    return list(_resp_frames(_file_key(resp_out), number_of_atoms))
+
+
+def load_esp_grids(esp_xyz: Path | str) -> List[ESPGridFrame]:
+    """Return all grid blocks of ``esp_xyz``, parsing the file at most once."""
+    return list(_esp_grids(_file_key(esp_xyz)))
+
+
+def load_xyz_elements(geometry_xyz: Path | str) -> List[Elements]:
+    """Return all geometry blocks of ``geometry_xyz``, parsing the file at most once."""
+    return list(_xyz_elements(_file_key(geometry_xyz)))
+
+
+def load_resp_offsets(resp_out: Path | str) -> List[int]:
+    """Return the byte offsets of every frame in ``resp_out`` (scanned once)."""
+    return list(_resp_offsets(_file_key(resp_out)))
+
+
+def load_esp_grid(esp_xyz: Path | str, index: int = 0) -> ESPGridFrame:
+    """Return a single grid block of ``esp_xyz`` without parsing the others."""
+    return _esp_grid(_file_key(esp_xyz), index)
+
+
+def load_topology(geometry_xyz: Path | str) -> Topology:
+    """Return the :class:`~parser.topology.Topology` of ``geometry_xyz``, reading its first block once."""
+    return _topology(_file_key(geometry_xyz))
+
+
+def clear_cache() -> None:
+    """Drop every cached parse result."""
+    _resp_offsets.cache_clear()
+    _esp_grid.cache_clear()
+    _resp_frames.cache_clear()
+    _esp_grids.cache_clear()
+    _xyz_elements.cache_clear()
+    _topology.cache_clear()
+    clear_seek_indices()
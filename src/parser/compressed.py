@@ -0,0 +1,273 @@
+"""Transparent reading of gzip/xz/bzip2-compressed TeraChem outputs.
+
+Every parser opens its input through :func:`open_stream` (sequential reads,
+line iteration) or :func:`open_seekable` (``seek``/``read`` at byte offsets of
+the *uncompressed* text).  Plain files are opened as before; ``.gz``, ``.xz``
+and ``.bz2`` files are decompressed on the fly, so frame offsets from
+``frame_offsets``/``block_offsets`` mean the same thing for either form.
+
+Random access into gzip files goes through a :class:`GzipSeekIndex`: while
+decompressing forward it snapshots the zlib decompressor (``decompressobj.copy()``)
+together with the compressed and uncompressed positions every ``spacing``
+bytes of output.  A reader keeps its decompressor alive between reads, so
+reading frames one after another by offset decompresses the file once; only
+a backward jump, or a forward one past a later checkpoint, restarts from the
+last checkpoint at or before the target, decompressing at most ``spacing``
+bytes (plus one read chunk) that it does not return.  The most recently
+closed reader's decompressor is handed to the next one, so consecutive
+``extract_frames`` calls continue too.  Checkpoints are added lazily as reads
+move forward and the index is cached per file and process (decompressor
+states cannot be pickled, so worker processes build their own).  xz and bzip2 streams offer no such
+restart points through the standard library; they are read with the
+``lzma``/``bz2`` file objects, whose ``seek`` decompresses from the start on
+a backward jump but continues cheaply on forward ones.
+"""
+
+from __future__ import annotations
+
+import bisect
+import bz2
+import gzip
+import io
+import lzma
+import threading
+import zlib
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import IO, Any, List, Tuple
+
+COMPRESSED_SUFFIXES = {".gz": gzip, ".xz": lzma, ".bz2": bz2}
+
+DEFAULT_CHECKPOINT_SPACING = 4 * 1024**2
+
+_READ_CHUNK = 32 * 1024
+# zlib window bits accepting gzip and zlib headers alike.
+_AUTO_HEADER_WBITS = zlib.MAX_WBITS | 32
+
+_FileKey = Tuple[str, int, int]
+
+
+def _file_key(path: Path | str) -> _FileKey:
+    resolved = Path(path).resolve()
+    stat = resolved.stat()
+    return str(resolved), stat.st_mtime_ns, stat.st_size
+
+
+def compression_of(path: Path | str) -> str | None:
+    """``"gz"``, ``"xz"`` or ``"bz2"`` by file suffix, ``None`` for plain text."""
+    suffix = Path(path).suffix.lower()
+    return suffix[1:] if suffix in COMPRESSED_SUFFIXES else None
+
+
+def open_stream(path: Path | str, mode: str = "rt") -> IO[Any]:
+    """Open ``path`` for sequential reading in text (``"rt"``) or binary (``"rb"``) mode."""
+    if mode not in ("rt", "rb"):
+        raise ValueError("mode must be 'rt' or 'rb'")
+    path = Path(path)
+    module = COMPRESSED_SUFFIXES.get(path.suffix.lower())
+    if module is None:
+        return path.open(mode)
+    return module.open(path, mode)
+
+
+@dataclass(frozen=True)
+class _Checkpoint:
+    output_offset: int
+    input_offset: int
+    state: Any  # zlib decompress object positioned at input_offset, or None for a fresh stream
+
+
+class GzipSeekIndex:
+    """Lazily built restart points into a (possibly multi-member) gzip file."""
+
+    def __init__(self, path: Path | str, *, spacing: int = DEFAULT_CHECKPOINT_SPACING) -> None:
+        if spacing < 1:
+            raise ValueError("spacing must be positive")
+        self.path = Path(path)
+        self.spacing = int(spacing)
+        self._checkpoints: List[_Checkpoint] = [_Checkpoint(0, 0, None)]
+        self._outputs: List[int] = [0]
+        self._lock = threading.Lock()
+        self._idle: _GzipCursor | None = None
+
+    def __len__(self) -> int:
+        return len(self._checkpoints)
+
+    def _nearest(self, offset: int) -> _Checkpoint:
+        with self._lock:
+            return self._checkpoints[bisect.bisect_right(self._outputs, offset) - 1]
+
+    def _record(self, output_offset: int, input_offset: int, state: Any) -> None:
+        with self._lock:
+            if output_offset >= self._outputs[-1] + self.spacing:
+                self._checkpoints.append(_Checkpoint(output_offset, input_offset, state.copy()))
+                self._outputs.append(output_offset)
+
+    def _acquire(self) -> "_GzipCursor":
+        """A cursor for one reader; the last released one is reused, so consecutive readers continue where it stopped."""
+        with self._lock:
+            cursor, self._idle = self._idle, None
+        return cursor if cursor is not None else _GzipCursor(self)
+
+    def _release(self, cursor: "_GzipCursor") -> None:
+        with self._lock:
+            cursor, self._idle = self._idle, cursor
+        if cursor is not None:
+            cursor.close()
+
+    def read_at(self, offset: int, size: int = -1) -> bytes:
+        """Uncompressed bytes ``[offset, offset + size)`` (to the end when ``size < 0``)."""
+        cursor = self._acquire()
+        try:
+            return cursor.read(offset, size)
+        finally:
+            self._release(cursor)
+
+
+class _GzipCursor:
+    """Live decompressor over a gzip file with the not yet consumed output.
+
+    Forward reads continue decompressing from the current position; the
+    index is consulted only for a backward jump or when a checkpoint lies
+    beyond the current position.
+    """
+
+    def __init__(self, index: GzipSeekIndex) -> None:
+        self._index = index
+        self._fh = index.path.open("rb")
+        self._decompressor: Any = None
+        self._position = 0  # uncompressed offset of self._buffer[0]
+        self._buffer = bytearray()
+
+    def close(self) -> None:
+        self._fh.close()
+
+    def _restart(self, offset: int) -> None:
+        checkpoint = self._index._nearest(offset)
+        if checkpoint.state is None:
+            self._decompressor = zlib.decompressobj(_AUTO_HEADER_WBITS)
+        else:
+            self._decompressor = checkpoint.state.copy()
+        self._fh.seek(checkpoint.input_offset)
+        self._position = checkpoint.output_offset
+        self._buffer = bytearray()
+
+    def _fill(self) -> bool:
+        """Decompress one more chunk into the buffer; ``False`` at the end of the file."""
+        chunk = self._fh.read(_READ_CHUNK)
+        if not chunk:
+            return False
+        decompressor = self._decompressor
+        data = decompressor.decompress(chunk)
+        while decompressor.eof and decompressor.unused_data:
+            # Next gzip member.
+            rest = decompressor.unused_data
+            decompressor = self._decompressor = zlib.decompressobj(_AUTO_HEADER_WBITS)
+            data += decompressor.decompress(rest)
+        self._buffer += data
+        if not decompressor.eof:
+            self._index._record(self._position + len(self._buffer), self._fh.tell(), decompressor)
+        return True
+
+    def read(self, offset: int, size: int = -1) -> bytes:
+        if offset < 0:
+            raise ValueError("offset must be non-negative")
+        if (
+            self._decompressor is None
+            or offset < self._position
+            or self._index._nearest(offset).output_offset > self._position + len(self._buffer)
+        ):
+            self._restart(offset)
+        while offset > self._position + len(self._buffer):
+            self._position += len(self._buffer)
+            self._buffer.clear()
+            if not self._fill():
+                return b""
+        del self._buffer[: offset - self._position]
+        self._position = offset
+        while size < 0 or len(self._buffer) < size:
+            if not self._fill():
+                break
+        n = len(self._buffer) if size < 0 else min(size, len(self._buffer))
+        data = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        self._position += n
+        return data
+
+
+@lru_cache(maxsize=16)
+def _gzip_index(key: _FileKey, spacing: int) -> GzipSeekIndex:
+    return GzipSeekIndex(key[0], spacing=spacing)
+
+
+def gzip_seek_index(path: Path | str, *, spacing: int = DEFAULT_CHECKPOINT_SPACING) -> GzipSeekIndex:
+    """The process-wide :class:`GzipSeekIndex` of ``path`` (rebuilt when the file changes)."""
+    return _gzip_index(_file_key(path), int(spacing))
+
+
+class _IndexedGzipReader(io.RawIOBase):
+    """Binary file object reading a gzip file through its :class:`GzipSeekIndex`."""
+
+    def __init__(self, index: GzipSeekIndex) -> None:
+        super().__init__()
+        self._index = index
+        self._cursor = index._acquire()
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._position = int(offset)
+        elif whence == io.SEEK_CUR:
+            self._position += int(offset)
+        else:
+            raise io.UnsupportedOperation("seeking from the end of a gzip stream is not supported")
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._cursor.read(self._position, -1 if size is None else size)
+        self._position += len(data)
+        return data
+
+    def readinto(self, buffer: Any) -> int:
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._index._release(self._cursor)
+        super().close()
+
+
+def open_seekable(path: Path | str) -> IO[bytes]:
+    """Open ``path`` in binary mode for ``seek``/``read`` at uncompressed byte offsets."""
+    path = Path(path)
+    compression = compression_of(path)
+    if compression == "gz":
+        return _IndexedGzipReader(gzip_seek_index(path))
+    return open_stream(path, "rb")
+
+
+def clear_seek_indices() -> None:
+    _gzip_index.cache_clear()
+
+
+__all__ = [
+    "COMPRESSED_SUFFIXES",
+    "DEFAULT_CHECKPOINT_SPACING",
+    "GzipSeekIndex",
+    "compression_of",
+    "gzip_seek_index",
+    "open_seekable",
+    "open_stream",
+]
@@ -1,8 +1,15 @@
 from __future__ import annotations
 
+import hashlib
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from instrumentation import timed
+
+from .compressed import open_seekable, open_stream
 
 
 @dataclass
@@ -17,10 +24,29 @@ class Frame:
     resp_charges: List[float] = field(default_factory=list)
     resp_rms_error: float | None = None
 
+def coordinates_hash(coordinates: Sequence[Sequence[float]] | np.ndarray) -> str:
+    """Content hash of an ``(n, 3)`` coordinate array, identical for identical float64 values."""
+    values = np.ascontiguousarray(coordinates, dtype=np.float64).reshape(-1, 3)
+    digest = hashlib.blake2b(values.tobytes(), digest_size=16)
+    digest.update(str(values.shape[0]).encode())
+    return digest.hexdigest()
+
+
 @dataclass
 class ESPGridFrame:
+    """One ``esp.xyz`` block.
+
+    ``grid_hash`` is the :func:`coordinates_hash` of ``coordinates``; it is
+    computed on construction, so treat ``coordinates`` as immutable.
+    """
+
     coordinates: List[Tuple[float, float, float]]
     potentials: List[float]
+    grid_hash: str | None = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.grid_hash is None:
+            self.grid_hash = coordinates_hash(self.coordinates)
 
 
 @dataclass
@@ -35,15 +61,64 @@ class ParseRespDotOut:
 
     def success_check(self) -> bool:
         success_string = "| Job finished:"
-        with self.file.open() as f:
+        with open_stream(self.file) as f:
             for line in f:
                 if line.strip().startswith(success_string):
                     return True
         return False
 
-    def extract_frames(self) -> List[Frame]:
-        lines = self._read_lines()
-
+    @timed("parser.resp_out.offsets")
+    def frame_offsets(self) -> List[int]:
+        """Byte offsets of every ``CENTER OF MASS:`` line, i.e. the start of each frame."""
+        offsets: List[int] = []
+        position = 0
+        with open_stream(self.file, "rb") as f:
+            for raw in f:
+                if raw.lstrip().startswith(b"CENTER OF MASS:"):
+                    offsets.append(position)
+                position += len(raw)
+        return offsets
+
+    @timed("parser.resp_out")
+    def extract_frames(
+        self,
+        indices: Sequence[int] | None = None,
+        *,
+        offsets: Sequence[int] | None = None,
+    ) -> List[Frame]:
+        """Parse frames from ``resp.out``.
+
+        When ``indices`` is given only those frames are parsed, seeking to each
+        frame with ``offsets`` (as returned by :meth:`frame_offsets`; computed
+        on demand when omitted).
+        """
+        if indices is None:
+            return self._parse_lines(self._read_lines())
+
+        if offsets is None:
+            offsets = self.frame_offsets()
+        if not offsets:
+            frames = self._parse_lines(self._read_lines())
+            return [frames[idx] for idx in indices]
+
+        total = len(offsets)
+        selected: List[Frame] = []
+        with open_seekable(self.file) as f:
+            for idx in indices:
+                if idx < 0:
+                    idx += total
+                if not 0 <= idx < total:
+                    raise IndexError(f"frame index {idx} out of range for {total} frames")
+                f.seek(offsets[idx])
+                size = offsets[idx + 1] - offsets[idx] if idx + 1 < total else -1
+                chunk = f.read(size).decode()
+                parsed = self._parse_lines(chunk.splitlines())
+                if len(parsed) != 1:
+                    raise ValueError(f"Expected one frame at offset {offsets[idx]}, parsed {len(parsed)}")
+                selected.append(parsed[0])
+        return selected
+
+    def _parse_lines(self, lines: Sequence[str]) -> List[Frame]:
         def _parse_braced_triplet(text: str) -> tuple[float, float, float]:
             start = text.find("{")
             end = text.find("}", start + 1)
@@ -179,14 +254,17 @@ class ParseRespDotOut:
         return frames
 
     def _read_lines(self) -> List[str]:
-        with self.file.open() as f:
+        with open_stream(self.file) as f:
             return [line.rstrip("\n") for line in f]
 
 
 def _iter_xyz_blocks(file_path: Path) -> List[Tuple[int, str, List[str]]]:
-    with file_path.open() as fh:
+    with open_stream(file_path) as fh:
         lines = [line.rstrip("\n") for line in fh]
+    return _parse_xyz_lines(lines)
 
+
+def _parse_xyz_lines(lines: Sequence[str]) -> List[Tuple[int, str, List[str]]]:
     idx = 0
     total = len(lines)
     blocks: List[Tuple[int, str, List[str]]] = []
@@ -226,13 +304,84 @@ def _iter_xyz_blocks(file_path: Path) -> List[Tuple[int, str, List[str]]]:
     return blocks
 
 
+def _xyz_block_offsets(file_path: Path) -> List[int]:
+    """Byte offsets of each xyz block header, scanned without parsing the rows."""
+    offsets: List[int] = []
+    position = 0
+    remaining = 0
+    expect_comment = False
+    with open_stream(file_path, "rb") as fh:
+        for raw in fh:
+            start = position
+            position += len(raw)
+            if expect_comment:
+                expect_comment = False
+                continue
+            if not raw.strip():
+                continue
+            if remaining:
+                remaining -= 1
+                continue
+            try:
+                remaining = int(raw.strip())
+            except ValueError as exc:
+                raise ValueError(f"Expected atom count at byte offset {start}, got {raw.strip()!r}") from exc
+            offsets.append(start)
+            expect_comment = True
+    return offsets
+
+
+def _read_xyz_blocks(
+    file_path: Path,
+    indices: Sequence[int],
+    offsets: Sequence[int] | None = None,
+) -> List[Tuple[int, str, List[str]]]:
+    if offsets is None:
+        offsets = _xyz_block_offsets(file_path)
+    total = len(offsets)
+    blocks: List[Tuple[int, str, List[str]]] = []
+    with open_seekable(file_path) as fh:
+        for idx in indices:
+            if idx < 0:
+                idx += total
+            if not 0 <= idx < total:
+                raise IndexError(f"block index {idx} out of range for {total} blocks")
+            fh.seek(offsets[idx])
+            size = offsets[idx + 1] - offsets[idx] if idx + 1 < total else -1
+            parsed = _parse_xyz_lines(fh.read(size).decode().splitlines())
+            if len(parsed) != 1:
+                raise ValueError(f"Expected one xyz block at offset {offsets[idx]}, parsed {len(parsed)}")
+            blocks.append(parsed[0])
+    return blocks
+
+
 class ParseESPXYZ:
     def __init__(self, filename: Path | str) -> None:
         self.file = Path(filename)
 
-    def frames(self) -> List[ESPGridFrame]:
+    def block_offsets(self) -> List[int]:
+        """Byte offsets of each grid block in ``esp.xyz``."""
+        return _xyz_block_offsets(self.file)
+
+    @timed("parser.esp_xyz")
+    def frames(
+        self,
+        indices: Sequence[int] | None = None,
+        *,
+        offsets: Sequence[int] | None = None,
+    ) -> List[ESPGridFrame]:
+        """Parse grid blocks; ``indices``/``offsets`` restrict parsing to selected blocks.
+
+        Blocks with identical grid coordinates share one ``coordinates`` list
+        (and ``grid_hash``); only their potentials are stored per block.
+        """
+        if indices is None:
+            blocks = _iter_xyz_blocks(self.file)
+        else:
+            blocks = _read_xyz_blocks(self.file, indices, offsets)
+        grids: Dict[str, List[Tuple[float, float, float]]] = {}
         frames: List[ESPGridFrame] = []
-        for _natoms, _comment, rows in _iter_xyz_blocks(self.file):
+        for _natoms, _comment, rows in blocks:
             coords: List[Tuple[float, float, float]] = []
             potentials: List[float] = []
             for row in rows:
@@ -241,17 +390,40 @@ class ParseESPXYZ:
                     raise ValueError(f"Malformed esp.xyz line: {row!r}")
                 coords.append((float(parts[1]), float(parts[2]), float(parts[3])))
                 potentials.append(float(parts[4]))
-            frames.append(ESPGridFrame(coords, potentials))
+            grid_hash = coordinates_hash(coords)
+            frames.append(ESPGridFrame(grids.setdefault(grid_hash, coords), potentials, grid_hash))
         return frames
 
+    def distinct_grids(self) -> Dict[str, List[int]]:
+        """Block indices grouped by grid hash, in order of first appearance."""
+        groups: Dict[str, List[int]] = {}
+        for index, frame in enumerate(self.frames()):
+            groups.setdefault(frame.grid_hash, []).append(index)
+        return groups
+
 
 class ParseDotXYZ:
     def __init__(self, filename: Path | str) -> None:
         self.file = Path(filename)
 
-    def elements(self) -> List[Elements]:
+    def block_offsets(self) -> List[int]:
+        """Byte offsets of each geometry block in the xyz file."""
+        return _xyz_block_offsets(self.file)
+
+    @timed("parser.geometry_xyz")
+    def elements(
+        self,
+        indices: Sequence[int] | None = None,
+        *,
+        offsets: Sequence[int] | None = None,
+    ) -> List[Elements]:
+        """Parse geometry blocks; ``indices``/``offsets`` restrict parsing to selected blocks."""
+        if indices is None:
+            blocks = _iter_xyz_blocks(self.file)
+        else:
+            blocks = _read_xyz_blocks(self.file, indices, offsets)
         frames: List[Elements] = []
-        for natoms, _comment, rows in _iter_xyz_blocks(self.file):
+        for natoms, _comment, rows in blocks:
             symbols: List[str] = []
             coords: List[Tuple[float, float, float]] = []
             for row in rows:
@@ -0,0 +1,107 @@
+"""Per-molecule metadata shared by the RESP, dipole and symmetry code.
+
+Element symbols do not change along a trajectory, so :func:`parser.cache.load_topology`
+reads them once from the first block of the geometry xyz (without scanning
+the rest of the file) and keeps the derived per-atom arrays — atomic numbers,
+masses, the heavy-atom mask — for as long as the file is unchanged on disk.
+The arrays are read-only because the same :class:`Topology` is handed to
+every caller in the process.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from constants.atomic_masses import atomic_masses
+
+from .compressed import open_stream
+from .parser import _parse_xyz_lines
+
+# ``atomic_masses`` lists the elements in order of atomic number.
+_ATOMIC_NUMBERS = {symbol: number for number, symbol in enumerate(atomic_masses, start=1)}
+
+
+def _frozen(values: np.ndarray) -> np.ndarray:
+    values.setflags(write=False)
+    return values
+
+
+@dataclass(frozen=True, eq=False)
+class Topology:
+    """Element symbols of a molecule with precomputed per-atom arrays."""
+
+    symbols: Tuple[str, ...]
+    atomic_numbers: np.ndarray
+    masses: np.ndarray
+    heavy_atom_mask: np.ndarray
+
+    @classmethod
+    def from_symbols(cls, symbols: Sequence[str]) -> "Topology":
+        symbols = tuple(symbols)
+        unknown = sorted({symbol for symbol in symbols if symbol not in atomic_masses})
+        if unknown:
+            raise KeyError(f"Atomic mass for element(s) {', '.join(unknown)} not found in atomic_masses dictionary")
+        return cls(
+            symbols=symbols,
+            atomic_numbers=_frozen(np.array([_ATOMIC_NUMBERS[symbol] for symbol in symbols], dtype=np.int64)),
+            masses=_frozen(np.array([atomic_masses[symbol] for symbol in symbols], dtype=np.float64)),
+            heavy_atom_mask=_frozen(np.array([symbol.upper() != "H" for symbol in symbols], dtype=bool)),
+        )
+
+    @property
+    def n_atoms(self) -> int:
+        return len(self.symbols)
+
+    @property
+    def total_mass(self) -> float:
+        return float(self.masses.sum())
+
+    def restraint_mask(self, restrain_all_atoms: bool = True) -> np.ndarray:
+        """Atoms taking part in the RESP restraint: all of them, or the heavy atoms."""
+        if restrain_all_atoms:
+            return np.ones(self.n_atoms, dtype=bool)
+        return self.heavy_atom_mask.copy()
+
+    def center_of_mass(self, positions: np.ndarray) -> np.ndarray:
+        """Mass-weighted center of ``positions`` ``(N, 3)``, in the units of ``positions``."""
+        positions = np.asarray(positions, dtype=np.float64)
+        if positions.shape != (self.n_atoms, 3):
+            raise ValueError(
+                f"Custom coordinates shape {positions.shape} does not match number of atoms ({self.n_atoms})"
+            )
+        total_mass = self.total_mass
+        if total_mass == 0.0:
+            raise ValueError("Total mass computed as zero; check atomic_masses dictionary")
+        return self.masses @ positions / total_mass
+
+
+def read_topology(geometry_xyz: Path | str) -> Topology:
+    """Build a :class:`Topology` from the first block of ``geometry_xyz`` (uncached)."""
+    path = Path(geometry_xyz)
+    _natoms, _comment, rows = _first_xyz_block(path)
+    return Topology.from_symbols([row.split()[0] for row in rows])
+
+
+def _first_xyz_block(path: Path) -> Tuple[int, str, List[str]]:
+    with open_stream(path) as fh:
+        lines: List[str] = []
+        for line in fh:
+            if line.strip():
+                lines.append(line.rstrip("\n"))
+                break
+        if not lines:
+            raise ValueError(f"No geometry blocks found in {path}")
+        try:
+            natoms = int(lines[0].strip())
+        except ValueError as exc:
+            raise ValueError(f"Expected atom count in the first line of {path}, got {lines[0]!r}") from exc
+        lines.extend(line.rstrip("\n") for line in islice(fh, natoms + 1))
+    return _parse_xyz_lines(lines)[0]
+
+
+__all__ = ["Topology", "read_topology"]
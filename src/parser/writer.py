@@ -0,0 +1,78 @@
+"""Writers producing TeraChem-style text that the parsers in this package read back.
+
+Useful for exporting refitted or synthetic trajectories and for building test
+and benchmark inputs.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterable, Sequence, TextIO
+
+from .parser import ESPGridFrame, Frame
+
+_SEPARATOR = "-" * 66
+
+
+def _write_resp_frame(fh: TextIO, frame: Frame, symbols: Sequence[str]) -> None:
+    if frame.center_of_mass is not None:
+        x, y, z = frame.center_of_mass
+        fh.write(f"CENTER OF MASS: {{{x:.6f}, {y:.6f}, {z:.6f}}} ANGS\n")
+    if frame.dipole_moment_vector is not None:
+        x, y, z = frame.dipole_moment_vector
+        magnitude = frame.dipole_moment_magnitude
+        suffix = f" (|D| = {magnitude:.6f})" if magnitude is not None else ""
+        fh.write(f"DIPOLE MOMENT: {{{x:.6f}, {y:.6f}, {z:.6f}}}{suffix} DEBYE\n")
+
+    if frame.esp_charges:
+        fh.write("ESP unrestrained charges:\n")
+        fh.write("  Atom          X          Y          Z     Charge   Exposure\n")
+        fh.write(_SEPARATOR + "\n")
+        exposures = frame.exposure_fractions or [0.0] * len(frame.esp_charges)
+        for symbol, (x, y, z), charge, exposure in zip(symbols, frame.positions, frame.esp_charges, exposures):
+            fh.write(f"{symbol:>6} {x:12.6f} {y:12.6f} {z:12.6f} {charge:10.6f} {exposure:10.6f}\n")
+        fh.write(_SEPARATOR + "\n")
+        if frame.esp_rms_error is not None:
+            fh.write(f"Quality of fit (RRMS): {frame.esp_rms_error:.6f}\n")
+
+    if frame.resp_charges:
+        fh.write("ESP restrained charges:\n")
+        fh.write("  Atom          X          Y          Z     Charge\n")
+        fh.write(_SEPARATOR + "\n")
+        for symbol, (x, y, z), charge in zip(symbols, frame.positions, frame.resp_charges):
+            fh.write(f"{symbol:>6} {x:12.6f} {y:12.6f} {z:12.6f} {charge:10.6f}\n")
+        fh.write(_SEPARATOR + "\n")
+        if frame.resp_rms_error is not None:
+            fh.write(f"Quality of fit (RRMS): {frame.resp_rms_error:.6f}\n")
+    fh.write("\n")
+
+
+def write_resp_out(
+    filename: Path | str,
+    frames: Iterable[Frame],
+    symbols: Sequence[str],
+    *,
+    finished: bool = True,
+) -> Path:
+    """Write ``frames`` in the ``resp.out`` layout understood by ``ParseRespDotOut``."""
+
+    path = Path(filename)
+    with path.open("w") as fh:
+        for frame in frames:
+            _write_resp_frame(fh, frame, symbols)
+        if finished:
+            fh.write("| Job finished: synthetic\n")
+    return path
+
+
+def write_esp_xyz(filename: Path | str, grids: Iterable[ESPGridFrame], *, atom_id: int = 1) -> Path:
+    """Write grid blocks in the ``esp.xyz`` layout understood by ``ParseESPXYZ``."""
+
+    path = Path(filename)
+    with path.open("w") as fh:
+        for grid in grids:
+            fh.write(f" {len(grid.potentials)}\n")
+            fh.write("Type            X            Y            Z                  ESP  Atom ID\n")
+            for (x, y, z), potential in zip(grid.coordinates, grid.potentials):
+                fh.write(f"   X {x:12.7f} {y:12.7f} {z:12.7f} {potential:20.12f} {atom_id:8d}\n")
+    return path
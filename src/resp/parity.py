@@ -0,0 +1,313 @@
+"""Trajectory-wide parity of TeraChem RESP charges against our RESP fit.
+
+:func:`resp.resp.kkt_residual_at` and :func:`resp.resp.infer_a_from_tc` check
+one frame at a time against a dense ``A``.  Here every frame is reduced once
+to its sufficient statistics ``H = A^T A``, ``g = A^T V`` and ``V^T V``
+(:func:`trajectory.driver.normal_equation_frames`), after which
+
+- the KKT gradients at the TeraChem charges are one batched ``H q`` product,
+- the least-squares ``(a, lambda)`` that best explain those charges come from
+  a stacked solve of the 2x2 systems of :func:`~resp.resp.infer_a_from_tc`,
+- the reference RESP fits of all frames take their Newton steps together
+  (:func:`resp.selection.solve_resp_normal_batch`),
+- residual norms follow from ``q^T H q - 2 g^T q + V^T V``.
+
+The result is a :class:`ParityReport` with one row per frame, a compact
+summary table and a parity plot.
+"""
+
+from __future__ import annotations
+
+from contextlib import nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Mapping
+
+import numpy as np
+
+from instrumentation import timed
+from parser import load_topology
+
+from .resp import HyperbolicRestraint
+from .selection import _restraint_gradient_direction, solve_resp_normal_batch
+
+_SUMMARY_COLUMNS = (
+    "charge_max_abs_diff",
+    "charge_rms_diff",
+    "tc_grad_inf_norm",
+    "tc_charge_violation",
+    "a_hat",
+    "a_hat_grad_inf_norm",
+    "tc_rrms",
+    "fit_rrms",
+    "esp_rrms",
+)
+
+
+def _quadratic_residual(H: np.ndarray, g: np.ndarray, vv: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """``||A q - V||^2`` per frame from the sufficient statistics, clipped at zero."""
+    sse = np.einsum("fi,fij,fj->f", q, H, q) - 2.0 * np.einsum("fi,fi->f", g, q) + vv
+    return np.maximum(sse, 0.0)
+
+
+def _rrms(H: np.ndarray, g: np.ndarray, vv: np.ndarray, q: np.ndarray) -> np.ndarray:
+    return np.sqrt(_quadratic_residual(H, g, vv, q) / vv)
+
+
+def _scatter_frames(keep: np.ndarray, values: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Expand columns computed on the frames in ``keep`` to every frame, NaN elsewhere."""
+    expanded: Dict[str, np.ndarray] = {}
+    for name, column in values.items():
+        full = np.full((keep.shape[0], *np.shape(column)[1:]), np.nan)
+        full[keep] = column
+        expanded[name] = full
+    return expanded
+
+
+def kkt_residuals_batch(
+    H: np.ndarray,
+    g: np.ndarray,
+    charges: np.ndarray,
+    total_charge: np.ndarray | float,
+    mask: np.ndarray,
+    *,
+    restraint: HyperbolicRestraint,
+) -> Dict[str, np.ndarray]:
+    """Batched :func:`~resp.resp.kkt_residual_at` on ``(F, N, N)``/``(F, N)`` stacks."""
+
+    q = np.asarray(charges, dtype=np.float64)
+    gradient = 2.0 * (np.einsum("fij,fj->fi", H, q) - g)
+    gradient += restraint.a * _restraint_gradient_direction(q, mask, restraint)
+    lambda_star = -gradient.mean(axis=1)
+    kkt_gradient = gradient + lambda_star[:, np.newaxis]
+    return {
+        "lambda_star": lambda_star,
+        "grad_inf_norm": np.max(np.abs(kkt_gradient), axis=1),
+        "grad_l2_norm": np.linalg.norm(kkt_gradient, axis=1),
+        "charge_violation": q.sum(axis=1) - total_charge,
+    }
+
+
+def infer_a_batch(
+    H: np.ndarray,
+    g: np.ndarray,
+    charges: np.ndarray,
+    mask: np.ndarray,
+    *,
+    b: float,
+    q0: float = 0.0,
+) -> Dict[str, np.ndarray]:
+    """Batched :func:`~resp.resp.infer_a_from_tc`: one stacked 2x2 least-squares solve."""
+
+    q = np.asarray(charges, dtype=np.float64)
+    F, N = q.shape
+    ls_gradient = 2.0 * (np.einsum("fij,fj->fi", H, q) - g)
+    h = _restraint_gradient_direction(q, mask, HyperbolicRestraint(a=1.0, b=b, q0=q0))
+
+    h1 = h.sum(axis=1)
+    system = np.empty((F, 2, 2))
+    system[:, 0, 0] = np.einsum("fi,fi->f", h, h)
+    system[:, 0, 1] = system[:, 1, 0] = h1
+    system[:, 1, 1] = N
+    rhs = -np.stack([np.einsum("fi,fi->f", h, ls_gradient), ls_gradient.sum(axis=1)], axis=1)
+    # pinv is the least-squares solution for singular systems and the inverse otherwise.
+    a_hat, lambda_hat = np.einsum("fij,fj->fi", np.linalg.pinv(system), rhs).T
+
+    residual = ls_gradient + a_hat[:, np.newaxis] * h + lambda_hat[:, np.newaxis]
+    return {
+        "a_hat": a_hat,
+        "lambda_hat": lambda_hat,
+        "grad_inf_norm": np.max(np.abs(residual), axis=1),
+        "grad_l2_norm": np.linalg.norm(residual, axis=1),
+    }
+
+
+@dataclass(frozen=True)
+class ParityReport:
+    """Per-frame parity columns (first axis over frames) and the restraint used."""
+
+    columns: Dict[str, np.ndarray]
+    restraint: HyperbolicRestraint
+
+    @property
+    def n_frames(self) -> int:
+        return int(self.columns["frame"].shape[0])
+
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        return dict(self.columns)
+
+    def summary(self) -> str:
+        """Mean/median/max over frames of the headline columns."""
+        lines = [
+            f"RESP parity over {self.n_frames} frames (a={self.restraint.a:g}, b={self.restraint.b:g})",
+            f"{'column':<24} {'mean':>12} {'median':>12} {'max':>12}",
+        ]
+        for name in _SUMMARY_COLUMNS:
+            values = np.asarray(self.columns[name], dtype=np.float64)
+            if np.all(np.isnan(values)):
+                continue
+            lines.append(
+                f"{name:<24} {np.nanmean(values):>12.4e} {np.nanmedian(values):>12.4e} {np.nanmax(values):>12.4e}"
+            )
+        lines.append(f"{'fits converged':<24} {int(self.columns['fit_converged'].sum()):>12d} / {self.n_frames}")
+        return "\n".join(lines)
+
+    def plot(
+        self,
+        *,
+        show: bool = False,
+        ax: "matplotlib.axes.Axes" | None = None,
+        filename: Path | str | None = None,
+    ) -> "matplotlib.axes.Axes":
+        """Parity plot of TeraChem RESP charges against the refitted ones, all atoms and frames."""
+
+        try:
+            import matplotlib.pyplot as plt
+        except ModuleNotFoundError as exc:  # pragma: no cover - optional dependency
+            raise ImportError("matplotlib is required for plotting RESP parity") from exc
+
+        reference = np.asarray(self.columns["resp_charges"], dtype=np.float64).ravel()
+        fitted = np.asarray(self.columns["fit_charges"], dtype=np.float64).ravel()
+        keep = ~np.isnan(reference)
+        reference, fitted = reference[keep], fitted[keep]
+        if reference.size == 0:
+            raise ValueError("No frame carries TeraChem RESP charges; nothing to plot")
+
+        style_path = Path(__file__).resolve().parents[2] / "notebooks" / "prl.mplstyle"
+        style_context = plt.style.context(style_path) if style_path.exists() else nullcontext()
+        with style_context:
+            if ax is None:
+                _fig, ax = plt.subplots()
+            ax.scatter(reference, fitted, s=12, facecolors="none", edgecolors="r", linewidths=0.6, alpha=0.9)
+            lo = min(reference.min(), fitted.min())
+            hi = max(reference.max(), fitted.max())
+            ax.plot([lo, hi], [lo, hi], linestyle="-", linewidth=1.0, color="0.2", label="y = x")
+            ax.set_xlim(lo, hi)
+            ax.set_ylim(lo, hi)
+            ax.set_aspect("equal", adjustable="box")
+            ax.set_xlabel(r"TeraChem RESP $q$ $(e)$")
+            ax.set_ylabel(r"Refitted RESP $q$ $(e)$")
+            ax.set_title("Parity Test")
+            r = np.corrcoef(reference, fitted)[0, 1] if reference.size > 1 else float("nan")
+            rmse = float(np.sqrt(np.mean((fitted - reference) ** 2)))
+            ax.text(
+                0.02,
+                0.98,
+                rf"$r = {r:.3f},\ \mathrm{{RMSE}} = {rmse:.1e}\ e$",
+                transform=ax.transAxes,
+                va="top",
+                ha="left",
+            )
+            ax.legend(loc="lower right")
+            if filename is not None:
+                Path(filename).parent.mkdir(parents=True, exist_ok=True)
+                ax.figure.savefig(filename)
+            if show:
+                plt.show()
+        return ax
+
+
+@timed("resp.parity")
+def parity_from_statistics(
+    statistics: Mapping[str, np.ndarray],
+    mask: np.ndarray,
+    *,
+    restraint: HyperbolicRestraint | None = None,
+    solver_tol: float = 1e-10,
+    maxiter: int = 100,
+) -> ParityReport:
+    """Build a :class:`ParityReport` from :func:`~trajectory.driver.normal_equation_frames` columns.
+
+    Frames without TeraChem RESP charges (NaN rows of ``resp_charges``) are
+    still refitted; their ``tc_*``, ``a_hat`` and charge-difference columns are NaN.
+    """
+
+    restraint = restraint or HyperbolicRestraint()
+    mask = np.asarray(mask, dtype=bool)
+    H = np.asarray(statistics["H"], dtype=np.float64)
+    g = np.asarray(statistics["g"], dtype=np.float64)
+    vv = np.asarray(statistics["vv"], dtype=np.float64)
+    total_charge = np.asarray(statistics["total_charge"], dtype=np.float64)
+    tc = np.asarray(statistics["resp_charges"], dtype=np.float64)
+    esp = np.asarray(statistics["esp_charges"], dtype=np.float64)
+
+    fit = solve_resp_normal_batch(H, g, total_charge, mask, restraint=restraint, tol=solver_tol, maxiter=maxiter)
+    has_tc = np.all(np.isfinite(tc), axis=1)
+    kkt = _scatter_frames(
+        has_tc,
+        kkt_residuals_batch(H[has_tc], g[has_tc], tc[has_tc], total_charge[has_tc], mask, restraint=restraint),
+    )
+    inferred = _scatter_frames(
+        has_tc,
+        infer_a_batch(H[has_tc], g[has_tc], tc[has_tc], mask, b=restraint.b, q0=restraint.q0),
+    )
+    diff = fit["q"] - tc
+
+    columns: Dict[str, Any] = {
+        "frame": np.asarray(statistics["frame"]),
+        "total_charge": total_charge,
+        "resp_charges": tc,
+        "fit_charges": fit["q"],
+        "fit_lambda": fit["lagrange_multiplier"],
+        "fit_converged": fit["converged"],
+        "charge_max_abs_diff": np.max(np.abs(diff), axis=1),
+        "charge_rms_diff": np.sqrt(np.mean(diff**2, axis=1)),
+        "tc_lambda": kkt["lambda_star"],
+        "tc_grad_inf_norm": kkt["grad_inf_norm"],
+        "tc_grad_l2_norm": kkt["grad_l2_norm"],
+        "tc_charge_violation": kkt["charge_violation"],
+        "a_hat": inferred["a_hat"],
+        "lambda_hat": inferred["lambda_hat"],
+        "a_hat_grad_inf_norm": inferred["grad_inf_norm"],
+        "tc_rrms": _rrms(H, g, vv, tc),
+        "fit_rrms": _rrms(H, g, vv, fit["q"]),
+        "esp_rrms": _rrms(H, g, vv, esp),
+    }
+    return ParityReport(columns=columns, restraint=restraint)
+
+
+def parity_report(
+    resp_out: Path | str,
+    esp_xyz: Path | str,
+    geometry_xyz: Path | str,
+    number_of_atoms: int,
+    frames: str | slice | None = None,
+    *,
+    restraint: HyperbolicRestraint | None = None,
+    restrain_all_atoms: bool = True,
+    grid_frame_index: int = 0,
+    total_charge: float | None = None,
+    solver_tol: float = 1e-10,
+    maxiter: int = 100,
+    precision: str = "double",
+    jobs: int = 1,
+    threads: int = 0,
+) -> ParityReport:
+    """RESP parity for the selected frames of a TeraChem run."""
+
+    from trajectory.driver import normal_equation_frames
+
+    mask = load_topology(geometry_xyz).restraint_mask(restrain_all_atoms)
+    if mask.shape[0] != number_of_atoms:
+        raise ValueError("Geometry frame atom count does not match requested number_of_atoms")
+    statistics = normal_equation_frames(
+        resp_out,
+        esp_xyz,
+        number_of_atoms,
+        frames,
+        grid_frame_index=grid_frame_index,
+        total_charge=total_charge,
+        precision=precision,
+        jobs=jobs,
+        threads=threads,
+    )
+    return parity_from_statistics(statistics, mask, restraint=restraint, solver_tol=solver_tol, maxiter=maxiter)
+
+
+__all__ = [
+    "ParityReport",
+    "infer_a_batch",
+    "kkt_residuals_batch",
+    "parity_from_statistics",
+    "parity_report",
+]
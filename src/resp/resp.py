@@ -7,11 +7,16 @@ from typing import Mapping, Sequence, Dict
 
 import numpy as np
 
+from linearESPcharges.iterative import CoulombOperator
 from linearESPcharges.linear import (
+    _check_weights,
+    _matvec,
+    _rmatvec,
     explicit_solution,
     prepare_linear_system,
 )
-from parser import ParseDotXYZ
+from instrumentation import active_recorder, count, stage
+from parser import Topology, load_topology
 
 try:  # SciPy ships the Newton-Krylov solver we target here
     from scipy.optimize import newton_krylov  # type: ignore[attr-defined]
@@ -23,6 +28,8 @@ except Exception:  # pragma: no cover - makes missing dependency explicit at run
     newton_krylov = None
     NoConvergence = RuntimeError  # type: ignore[assignment]
 
+HISTORY_MODES = ("off", "outer", "all")
+
 
 @dataclass(frozen=True)
 class HyperbolicRestraint:
@@ -49,34 +56,32 @@ class HyperbolicRestraint:
         return grad
 
 
-def _resolve_frame_index(frame_index: int | None, total_frames: int) -> int:
-    if total_frames == 0:
-        raise ValueError("No frames available in geometry file")
-    if frame_index is None:
-        frame_index = -1
-    if frame_index < 0:
-        frame_index = total_frames + frame_index
-    if frame_index < 0 or frame_index >= total_frames:
-        raise IndexError(f"frame_index {frame_index} out of range for {total_frames} frames")
-    return frame_index
-
-
-def _heavy_atom_mask(symbols: Sequence[str]) -> np.ndarray:
+def _heavy_atom_mask(symbols: Sequence[str] | Topology) -> np.ndarray:
+    if isinstance(symbols, Topology):
+        return symbols.heavy_atom_mask.copy()
     return np.array([sym.upper() != "H" for sym in symbols], dtype=bool)
 
 
-def _restraint_mask(symbols: Sequence[str], restrain_all_atoms: bool = True) -> np.ndarray:
+def _restraint_mask(symbols: Sequence[str] | Topology, restrain_all_atoms: bool = True) -> np.ndarray:
     """Return a mask selecting atoms that participate in the RESP restraint."""
+    if isinstance(symbols, Topology):
+        return symbols.restraint_mask(restrain_all_atoms)
     if restrain_all_atoms:
         return np.ones(len(symbols), dtype=bool)
     return _heavy_atom_mask(symbols)
 
 
+def _as_design_matrix(design_matrix: np.ndarray | CoulombOperator) -> np.ndarray | CoulombOperator:
+    if isinstance(design_matrix, CoulombOperator):
+        return design_matrix
+    return np.asarray(design_matrix, dtype=float)
+
+
 def kkt_residual_at(
     q_at_solution: np.ndarray,
-    design_matrix: np.ndarray,
+    design_matrix: np.ndarray | CoulombOperator,
     esp_values: np.ndarray,
-    symbols: Sequence[str],
+    symbols: Sequence[str] | Topology,
     total_charge: float,
     *,
     a: float,
@@ -84,12 +89,19 @@ def kkt_residual_at(
     q0: float = 0.0,
     restrain_all_atoms: bool | None = None,
     restrain_hydrogen: bool | None = None,
+    weights: np.ndarray | None = None,
 ) -> Mapping[str, float]:
-    """Evaluate first-order KKT residuals for a given RESP charge vector."""
+    """Evaluate first-order KKT residuals for a given RESP charge vector.
+
+    Pass the per-point ``weights`` of a weighted fit to evaluate its KKT system.
+    ``design_matrix`` may be a :class:`~linearESPcharges.iterative.CoulombOperator`.
+    """
 
     q = np.asarray(q_at_solution, dtype=float)
-    A = np.asarray(design_matrix, dtype=float)
+    A = _as_design_matrix(design_matrix)
     V = np.asarray(esp_values, dtype=float)
+    if weights is not None:
+        weights = _check_weights(weights, A.shape[0])
 
     if q.ndim != 1:
         raise ValueError("q_at_solution must be a 1-D array of charges")
@@ -105,14 +117,15 @@ def kkt_residual_at(
     mask = _restraint_mask(symbols, restrain_all_atoms=restrain_all_atoms)
     restraint = HyperbolicRestraint(a=a, b=b, q0=q0)
 
-    residual = A @ q - V
-    gradient = 2.0 * (A.T @ residual) + restraint.gradient(q, mask)
+    residual = _matvec(A, q) - V
+    weighted_residual = residual if weights is None else weights * residual
+    gradient = 2.0 * _rmatvec(A, weighted_residual) + restraint.gradient(q, mask)
 
     ones = np.ones_like(q)
     lambda_star = -float(ones @ gradient) / float(ones @ ones)
     kkt_gradient = gradient + lambda_star * ones
 
-    loss_terms = _loss_terms(A, V, q, restraint, mask)
+    loss_terms = _loss_terms(A, V, q, restraint, mask, weights)
 
     return {
         "lambda_star": lambda_star,
@@ -127,19 +140,22 @@ def kkt_residual_at(
 
 def infer_a_from_tc(
     q_at_solution: np.ndarray,
-    design_matrix: np.ndarray,
+    design_matrix: np.ndarray | CoulombOperator,
     esp_values: np.ndarray,
-    symbols: Sequence[str],
+    symbols: Sequence[str] | Topology,
     *,
     b: float,
     q0: float = 0.0,
     restrain_all_atoms: bool | None = None,
     restrain_hydrogen: bool | None = None,
 ) -> Mapping[str, float]:
-    """Infer the restraint strength ``a`` that best fits a given charge vector."""
+    """Infer the restraint strength ``a`` that best fits a given charge vector.
+
+    ``design_matrix`` may be a :class:`~linearESPcharges.iterative.CoulombOperator`.
+    """
 
     q = np.asarray(q_at_solution, dtype=float)
-    A = np.asarray(design_matrix, dtype=float)
+    A = _as_design_matrix(design_matrix)
     V = np.asarray(esp_values, dtype=float)
 
     if A.shape[1] != q.size:
@@ -154,8 +170,8 @@ def infer_a_from_tc(
     if not np.any(mask):
         raise ValueError("No atoms selected for restraint; cannot infer 'a'")
 
-    residual = A @ q - V
-    g = 2.0 * (A.T @ residual)
+    residual = _matvec(A, q) - V
+    g = 2.0 * _rmatvec(A, residual)
 
     h = np.zeros_like(q)
     diff = q[mask] - q0
@@ -192,9 +208,12 @@ def load_geometry_symbols(
     *,
     frame_index: int | None = None,
 ) -> Sequence[str]:
-    frames = ParseDotXYZ(geometry_xyz).elements()
-    idx = _resolve_frame_index(frame_index, len(frames))
-    return frames[idx].symbols
+    """Element symbols of ``geometry_xyz``, read once per file by :func:`parser.load_topology`.
+
+    Symbols are the same in every frame of a trajectory, so ``frame_index``
+    is accepted for compatibility only.
+    """
+    return list(load_topology(geometry_xyz).symbols)
 
 
 def _loss_terms(
@@ -203,9 +222,10 @@ def _loss_terms(
     charges: np.ndarray,
     restraint: HyperbolicRestraint,
     mask: np.ndarray,
+    weights: np.ndarray | None = None,
 ) -> Mapping[str, float]:
-    residual = design_matrix @ charges - esp_values
-    ls = float(residual @ residual)
+    residual = _matvec(design_matrix, charges) - esp_values
+    ls = float(residual @ residual) if weights is None else float(weights @ residual**2)
     restraint_value = restraint.value(charges, mask)
     return {
         "ls_term": ls,
@@ -216,25 +236,37 @@ def _loss_terms(
     }
 
 
-def fit_resp_charges(
-    resp_out: Path | str,
-    esp_xyz: Path | str,
-    geometry_xyz: Path | str,
-    number_of_atoms: int,
+def fit_resp_system(
+    design_matrix: np.ndarray,
+    esp_values: np.ndarray,
+    mask: np.ndarray,
+    total_charge: float,
     *,
-    frame_index: int | None = None,
-    grid_frame_index: int = 0,
     restraint: HyperbolicRestraint | None = None,
     initial_charges: Sequence[float] | None = None,
-    total_charge: float | None = None,
     solver_tol: float = 1e-11,
     maxiter: int = 100,
-    save_loss_plot: bool = False,
-    loss_plot_path: Path | str | None = None,
-    show_loss_plot: bool = False,
-    restrain_all_atoms: bool = True,
-) -> Mapping[str, object]:
-    """Run RESP fitting with a hyperbolic restraint via Newton-Krylov."""
+    history: str = "outer",
+    weights: np.ndarray | None = None,
+) -> Dict[str, object]:
+    """Solve the RESP KKT system for an already assembled ``(A, V)`` pair.
+
+    This is the array-level core of :func:`fit_resp_charges`, used directly by
+    trajectory drivers that build the design matrix themselves.
+
+    ``history`` selects what ends up in ``loss_history`` (see
+    :data:`HISTORY_MODES`): ``"off"`` records nothing, ``"outer"`` records the
+    loss at the initial guess and after every Newton step (via the solver
+    callback), and ``"all"`` records it at every residual evaluation, including
+    the finite-difference Jacobian probes.
+
+    ``weights`` (one per grid point) weights the least-squares term, i.e. the
+    loss becomes ``sum_i w_i r_i^2`` plus the restraint.  ``design_matrix``
+    may be a :class:`~linearESPcharges.iterative.CoulombOperator`.
+    """
+
+    if history not in HISTORY_MODES:
+        raise ValueError(f"Unknown history mode {history!r}; choose from {', '.join(HISTORY_MODES)}")
 
     if newton_krylov is None:
         raise ImportError(
@@ -242,57 +274,75 @@ def fit_resp_charges(
         )
 
     restraint = restraint or HyperbolicRestraint()
-
-    A, V, Q_linear, _esp_charges = prepare_linear_system(
-        resp_out,
-        esp_xyz,
-        number_of_atoms,
-        frame_index=frame_index,
-        grid_frame_index=grid_frame_index,
-    )
-
-    symbols = load_geometry_symbols(geometry_xyz, frame_index=frame_index)
-    mask = _restraint_mask(symbols, restrain_all_atoms=restrain_all_atoms)
-    if mask.shape[0] != number_of_atoms:
-        raise ValueError(
-            "Geometry frame atom count does not match requested number_of_atoms"
-        )
+    A = design_matrix
+    if not isinstance(A, CoulombOperator):
+        A = np.asarray(A)
+        if A.dtype.kind != "f":
+            A = A.astype(float)
+    V = np.asarray(esp_values, dtype=float)
+    number_of_atoms = A.shape[1]
+    if weights is not None:
+        weights = _check_weights(weights, A.shape[0])
 
     if initial_charges is None:
-        linear_solution = explicit_solution()
-        initial_charges = linear_solution.fit(A, V, Q_linear)["q"]
+        with stage("resp.initial_guess"):
+            linear_solution = explicit_solution()
+            initial_charges = linear_solution.fit(A, V, total_charge, weights=weights)["q"]
     q0 = np.asarray(initial_charges, dtype=float)
     if q0.shape != (number_of_atoms,):
         raise ValueError("initial_charges must have length equal to number_of_atoms")
 
-    target_total_charge = float(total_charge if total_charge is not None else Q_linear)
+    target_total_charge = float(total_charge)
 
     ones = np.ones_like(q0)
     loss_history: list[float] = []
 
+    def record_loss(charges: np.ndarray, residual: np.ndarray) -> None:
+        with stage("resp.loss_history"):
+            ls = float(residual @ residual) if weights is None else float(weights @ residual**2)
+            loss_history.append(ls + restraint.value(charges, mask))
+
     def kkt_system(vec: np.ndarray) -> np.ndarray:
         charges = vec[:-1]
         lam = vec[-1]
-        residual = A @ charges - V
-        grad = 2.0 * (A.T @ residual)
+        count("resp.residual_evaluations")
+        count("resp.matvecs", 2)
+        residual = _matvec(A, charges) - V
+        grad = 2.0 * _rmatvec(A, residual if weights is None else weights * residual)
         grad += restraint.gradient(charges, mask)
         grad += lam * ones
         constraint = charges.sum() - target_total_charge
-        ls = float(residual @ residual)
-        loss_history.append(ls + restraint.value(charges, mask))
+        if history == "all":
+            record_loss(charges, residual)
         return np.concatenate([grad, np.array([constraint])])
 
+    def outer_iteration(x: np.ndarray, _f: np.ndarray) -> None:
+        count("resp.outer_iterations")
+        if history == "outer":
+            charges = x[:-1]
+            record_loss(charges, _matvec(A, charges) - V)
+
     x0 = np.append(q0, 0.0)
+    if history == "outer":
+        record_loss(q0, _matvec(A, q0) - V)
+    needs_callback = history == "outer" or active_recorder() is not None
 
     try:
-        solution = newton_krylov(kkt_system, x0, f_tol=solver_tol, maxiter=maxiter)
+        with stage("resp.newton_krylov"):
+            solution = newton_krylov(
+                kkt_system,
+                x0,
+                f_tol=solver_tol,
+                maxiter=maxiter,
+                callback=outer_iteration if needs_callback else None,
+            )
     except NoConvergence as exc:  # pragma: no cover - surface solver diagnostics clearly
         raise RuntimeError("RESP solver failed to converge") from exc
 
     charges = solution[:-1]
     lagrange_multiplier = float(solution[-1])
 
-    metrics = dict(_loss_terms(A, V, charges, restraint, mask))
+    metrics = dict(_loss_terms(A, V, charges, restraint, mask, weights))
     metrics.update(
         {
             "charges": charges,
@@ -304,8 +354,92 @@ def fit_resp_charges(
             "loss_history": loss_history,
         }
     )
-    metrics["predicted_esp"] = A @ charges
+    metrics["predicted_esp"] = _matvec(A, charges)
     metrics["residual"] = metrics["predicted_esp"] - V
+    return metrics
+
+
+def fit_resp_charges(
+    resp_out: Path | str,
+    esp_xyz: Path | str,
+    geometry_xyz: Path | str,
+    number_of_atoms: int,
+    *,
+    frame_index: int | None = None,
+    grid_frame_index: int = 0,
+    restraint: HyperbolicRestraint | None = None,
+    initial_charges: Sequence[float] | None = None,
+    total_charge: float | None = None,
+    solver_tol: float = 1e-11,
+    maxiter: int = 100,
+    save_loss_plot: bool = False,
+    loss_plot_path: Path | str | None = None,
+    show_loss_plot: bool = False,
+    restrain_all_atoms: bool = True,
+    precision: str = "double",
+    history: str = "outer",
+    weighting: str | np.ndarray | None = None,
+    strategy: str = "dense",
+    memory_budget: int | None = None,
+) -> Mapping[str, object]:
+    """Run RESP fitting with a hyperbolic restraint via Newton-Krylov.
+
+    ``precision="mixed"`` builds the design matrix in float32 and keeps all
+    grid reductions in float64 (see ``linearESPcharges.linear.PRECISIONS``).
+    ``history`` controls ``loss_history`` as in :func:`fit_resp_system`; pass
+    ``"off"`` when the history is not needed.  ``weighting`` is an array of
+    per-point weights or a scheme name (see ``linearESPcharges.weighting``);
+    the geometry's element symbols are used for the van der Waals radii.
+    ``strategy``/``memory_budget`` choose how ``A`` is held and the initial
+    linear fit is solved (see ``linearESPcharges.planner``); ``"auto"`` is
+    opt-in because its choice depends on the host's free memory.
+    """
+
+    if newton_krylov is None:
+        raise ImportError(
+            "scipy.optimize.newton_krylov is required for RESP fitting; install scipy to proceed"
+        )
+
+    restraint = restraint or HyperbolicRestraint()
+
+    topology = load_topology(geometry_xyz)
+    mask = topology.restraint_mask(restrain_all_atoms)
+    if mask.shape[0] != number_of_atoms:
+        raise ValueError(
+            "Geometry frame atom count does not match requested number_of_atoms"
+        )
+
+    system = prepare_linear_system(
+        resp_out,
+        esp_xyz,
+        number_of_atoms,
+        frame_index=frame_index,
+        grid_frame_index=grid_frame_index,
+        precision=precision,
+        weighting=weighting,
+        symbols=topology.symbols,
+        strategy=strategy,
+        memory_budget=memory_budget,
+    )
+    A, V, Q_linear = system[:3]
+    weights = system[4] if weighting is not None else None
+
+    if initial_charges is None:
+        linear_solution = explicit_solution(strategy=strategy, memory_budget=memory_budget)
+        initial_charges = linear_solution.fit(A, V, Q_linear, weights=weights)["q"]
+
+    metrics = fit_resp_system(
+        A,
+        V,
+        mask,
+        Q_linear if total_charge is None else total_charge,
+        restraint=restraint,
+        initial_charges=initial_charges,
+        solver_tol=solver_tol,
+        maxiter=maxiter,
+        history=history,
+        weights=weights,
+    )
 
     should_plot = save_loss_plot or show_loss_plot or loss_plot_path is not None
     if should_plot:
@@ -396,8 +530,10 @@ def plot_loss_history(
 
 
 __all__ = [
+    "HISTORY_MODES",
     "HyperbolicRestraint",
     "fit_resp_charges",
+    "fit_resp_system",
     "kkt_residual_at",
     "infer_a_from_tc",
     "load_geometry_symbols",
@@ -0,0 +1,383 @@
+"""Cross-validated choice of the RESP restraint parameters ``a`` and ``b``.
+
+The RESP loss only touches the grid through ``H = A^T A``, ``g = A^T V`` and
+``V^T V``::
+
+    ||A q - V||^2 = q^T H q - 2 g^T q + V^T V
+
+so K-fold cross-validation needs one pass over the grid to accumulate those
+sums per fold.  The training system of fold ``k`` is then ``total - fold_k``
+(``O(N^2)`` to assemble) and its held-out squared error is evaluated from the
+fold's own sums, without touching ``A`` again.  Each (fold, ``a``, ``b``) fit
+is a small ``N``-dimensional Newton solve of the KKT system in
+:func:`solve_resp_normal`; with ``jobs > 1`` the folds x candidates grid is
+spread over worker processes.
+
+Folds are random subsets of grid points (``by="points"``) or, when several
+frames share one charge set, whole frames (``by="frames"``).
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import product
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from instrumentation import timed
+from linearESPcharges.linear import _ACCUMULATE_ROWS, explicit_solution
+from linearESPcharges.resampling import solve_constrained_batch
+
+from .resp import HyperbolicRestraint
+
+FOLD_MODES = ("points", "frames")
+
+# Relative slack of the Armijo test: near the optimum the objective changes by
+# less than its own round-off, and a strict test would stall the line search.
+_ROUNDOFF_SLACK = 1e-13
+
+_WORKER_STATE: Dict[str, Any] = {}
+
+
+@dataclass(frozen=True)
+class RestraintSelection:
+    """Held-out ESP error over a grid of restraint candidates.
+
+    ``fold_rmse`` has shape ``(n_folds, len(a_values), len(b_values))``;
+    ``rmse`` pools the held-out squared errors of all folds.
+    """
+
+    a_values: np.ndarray
+    b_values: np.ndarray
+    fold_rmse: np.ndarray
+    rmse: np.ndarray
+    best_a: float
+    best_b: float
+    by: str
+    q0: float = 0.0
+
+    @property
+    def n_folds(self) -> int:
+        return int(self.fold_rmse.shape[0])
+
+    @property
+    def restraint(self) -> HyperbolicRestraint:
+        return HyperbolicRestraint(a=self.best_a, b=self.best_b, q0=self.q0)
+
+
+def solve_resp_normal(
+    H: np.ndarray,
+    g: np.ndarray,
+    total_charge: float,
+    mask: np.ndarray,
+    *,
+    restraint: HyperbolicRestraint | None = None,
+    tol: float = 1e-10,
+    maxiter: int = 100,
+) -> Dict[str, Any]:
+    """Minimise ``q^T H q - 2 g^T q + restraint(q)`` subject to ``1^T q = Q``.
+
+    Newton's method on the KKT system with a backtracking line search; the
+    restraint Hessian is diagonal, so every step is one ``(N + 1)`` solve.
+    Starts from the unrestrained constrained solution and stops when the
+    infinity norm of the KKT gradient falls below ``tol * max(1, |g|_inf)``;
+    the relative scale keeps the test above the round-off floor of
+    ``H q - g`` on large grids.  The returned ``lagrange_multiplier`` follows
+    the sign convention of :func:`resp.resp.fit_resp_system`.
+    """
+
+    restraint = restraint or HyperbolicRestraint()
+    H = np.asarray(H, dtype=np.float64)
+    g = np.asarray(g, dtype=np.float64)
+    mask = np.asarray(mask, dtype=bool)
+    N = H.shape[0]
+
+    def objective(q: np.ndarray) -> float:
+        return float(q @ (H @ q) - 2.0 * (g @ q)) + restraint.value(q, mask)
+
+    q = explicit_solution().solve_normal(H, g, total_charge)["q"]
+    kkt = np.zeros((N + 1, N + 1))
+    kkt[:N, N] = 1.0
+    kkt[N, :N] = 1.0
+    threshold = tol * max(1.0, float(np.max(np.abs(g))))
+    converged = False
+    lam = 0.0
+    for iteration in range(maxiter + 1):
+        gradient = 2.0 * (H @ q - g) + restraint.gradient(q, mask)
+        lam = -float(gradient.mean())
+        if np.max(np.abs(gradient + lam)) <= threshold:
+            converged = True
+            break
+        if iteration == maxiter:
+            break
+        diff = q[mask] - restraint.q0
+        curvature = np.zeros(N)
+        curvature[mask] = restraint.a * restraint.b**2 / (diff * diff + restraint.b**2) ** 1.5
+        kkt[:N, :N] = 2.0 * H + np.diag(curvature)
+        step = np.linalg.solve(kkt, np.append(-gradient, 0.0))[:N]
+        current = objective(q)
+        slope = float(gradient @ step)
+        slack = _ROUNDOFF_SLACK * abs(current)
+        t = 1.0
+        while t > 1e-12 and objective(q + t * step) > current + 1e-4 * t * slope + slack:
+            t *= 0.5
+        q = q + t * step
+    # Newton steps keep 1^T q fixed; remove the accumulated round-off.
+    q += (total_charge - q.sum()) / N
+    return {"q": q, "lagrange_multiplier": lam, "iterations": iteration, "converged": converged}
+
+
+
+def _restraint_values(q: np.ndarray, mask: np.ndarray, restraint: HyperbolicRestraint) -> np.ndarray:
+    diff = q[:, mask] - restraint.q0
+    return restraint.a * (np.sqrt(diff * diff + restraint.b**2) - restraint.b).sum(axis=1)
+
+
+def solve_resp_normal_batch(
+    H: np.ndarray,
+    g: np.ndarray,
+    total_charge: np.ndarray | float,
+    mask: np.ndarray,
+    *,
+    restraint: HyperbolicRestraint | None = None,
+    tol: float = 1e-10,
+    maxiter: int = 100,
+) -> Dict[str, Any]:
+    """:func:`solve_resp_normal` for a stack of systems ``H`` ``(B, N, N)``, ``g`` ``(B, N)``.
+
+    All systems take their Newton steps together as one stacked solve; systems
+    that have converged drop out of later iterations.  Returns arrays with a
+    leading batch axis.
+    """
+
+    restraint = restraint or HyperbolicRestraint()
+    H = np.asarray(H, dtype=np.float64)
+    g = np.asarray(g, dtype=np.float64)
+    mask = np.asarray(mask, dtype=bool)
+    B, N = g.shape
+    Q = np.broadcast_to(np.asarray(total_charge, dtype=np.float64), (B,))
+
+    def objective(index: np.ndarray, q: np.ndarray) -> np.ndarray:
+        quadratic = np.einsum("bi,bij,bj->b", q, H[index], q) - 2.0 * np.einsum("bi,bi->b", g[index], q)
+        return quadratic + _restraint_values(q, mask, restraint)
+
+    q = solve_constrained_batch(H, g, Q)
+    threshold = tol * np.maximum(1.0, np.max(np.abs(g), axis=1, initial=0.0))
+    lam = np.zeros(B)
+    iterations = np.zeros(B, dtype=np.int64)
+    converged = np.zeros(B, dtype=bool)
+    active = np.arange(B)
+    kkt = np.zeros((B, N + 1, N + 1))
+    kkt[:, :N, N] = 1.0
+    kkt[:, N, :N] = 1.0
+    for iteration in range(maxiter + 1):
+        gradient = 2.0 * (np.einsum("bij,bj->bi", H[active], q[active]) - g[active])
+        gradient += restraint.a * _restraint_gradient_direction(q[active], mask, restraint)
+        lam[active] = -gradient.mean(axis=1)
+        done = np.max(np.abs(gradient + lam[active, np.newaxis]), axis=1) <= threshold[active]
+        converged[active[done]] = True
+        iterations[active] = iteration
+        keep = ~done
+        active, gradient = active[keep], gradient[keep]
+        if active.size == 0 or iteration == maxiter:
+            break
+        diff = q[active][:, mask] - restraint.q0
+        curvature = np.zeros((active.size, N))
+        curvature[:, mask] = restraint.a * restraint.b**2 / (diff * diff + restraint.b**2) ** 1.5
+        system = kkt[: active.size].copy()
+        system[:, :N, :N] = 2.0 * H[active]
+        system[:, np.arange(N), np.arange(N)] += curvature
+        rhs = np.concatenate([-gradient, np.zeros((active.size, 1))], axis=1)
+        step = np.linalg.solve(system, rhs[..., np.newaxis])[..., :N, 0]
+        current = objective(active, q[active])
+        slope = np.einsum("bi,bi->b", gradient, step)
+        slack = _ROUNDOFF_SLACK * np.abs(current)
+        t = np.ones(active.size)
+        pending = np.ones(active.size, dtype=bool)
+        while np.any(pending):
+            trial = q[active] + t[:, np.newaxis] * step
+            pending = (objective(active, trial) > current + 1e-4 * t * slope + slack) & (t > 1e-12)
+            t[pending] *= 0.5
+        q[active] += t[:, np.newaxis] * step
+    q += ((Q - q.sum(axis=1)) / N)[:, np.newaxis]
+    return {"q": q, "lagrange_multiplier": lam, "iterations": iterations, "converged": converged}
+
+
+def _restraint_gradient_direction(q: np.ndarray, mask: np.ndarray, restraint: HyperbolicRestraint) -> np.ndarray:
+    """Batched restraint gradient divided by ``a``."""
+    out = np.zeros_like(q)
+    diff = q[:, mask] - restraint.q0
+    out[:, mask] = diff / np.sqrt(diff * diff + restraint.b**2)
+    return out
+
+
+def _as_frames(A: np.ndarray | Sequence[np.ndarray], V: np.ndarray | Sequence[np.ndarray]):
+    if isinstance(A, np.ndarray) and A.ndim == 2:
+        return [A], [np.asarray(V, dtype=np.float64)]
+    A_frames = list(A)
+    V_frames = [np.asarray(v, dtype=np.float64) for v in V]
+    if len(A_frames) != len(V_frames):
+        raise ValueError("Pass one ESP vector per design matrix")
+    if len({a.shape[1] for a in A_frames}) != 1:
+        raise ValueError("All design matrices must have the same number of atoms")
+    return A_frames, V_frames
+
+
+def fold_statistics(
+    A: np.ndarray | Sequence[np.ndarray],
+    V: np.ndarray | Sequence[np.ndarray],
+    labels: Sequence[np.ndarray],
+    n_folds: int,
+    *,
+    chunk_rows: int = _ACCUMULATE_ROWS,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Per-fold ``(H_k, g_k, V_k^T V_k, M_k)`` from one pass over the rows.
+
+    ``labels`` holds, per frame, the fold index of every grid point.
+    """
+
+    A_frames, V_frames = _as_frames(A, V)
+    N = A_frames[0].shape[1]
+    H = np.zeros((n_folds, N, N))
+    g = np.zeros((n_folds, N))
+    vv = np.zeros(n_folds)
+    m = np.zeros(n_folds, dtype=np.int64)
+    for A_f, V_f, labels_f in zip(A_frames, V_frames, labels):
+        for start in range(0, A_f.shape[0], chunk_rows):
+            stop = start + chunk_rows
+            tile = np.asarray(A_f[start:stop], dtype=np.float64)
+            values = V_f[start:stop]
+            fold_of_row = labels_f[start:stop]
+            for k in np.unique(fold_of_row):
+                rows = fold_of_row == k
+                sub = tile[rows]
+                H[k] += sub.T @ sub
+                g[k] += sub.T @ values[rows]
+                vv[k] += values[rows] @ values[rows]
+                m[k] += int(rows.sum())
+    return H, g, vv, m
+
+
+def _fold_labels(n_points: Sequence[int], n_folds: int, by: str, rng: np.random.Generator) -> List[np.ndarray]:
+    if by == "points":
+        total = sum(n_points)
+        if not 2 <= n_folds <= total:
+            raise ValueError(f"n_folds must be in [2, {total}]")
+        flat = rng.permutation(total) % n_folds
+        return np.split(flat, np.cumsum(n_points)[:-1])
+    if by == "frames":
+        if not 2 <= n_folds <= len(n_points):
+            raise ValueError(f"n_folds must be in [2, {len(n_points)}] when folding over frames")
+        fold_of_frame = rng.permutation(len(n_points)) % n_folds
+        return [np.full(size, fold, dtype=np.int64) for size, fold in zip(n_points, fold_of_frame)]
+    raise ValueError(f"Unknown fold mode {by!r}; choose from {', '.join(FOLD_MODES)}")
+
+
+def _init_worker(state: Dict[str, Any]) -> None:
+    _WORKER_STATE.clear()
+    _WORKER_STATE.update(state)
+
+
+def _held_out_error(task: Tuple[int, float, float]) -> float:
+    k, a, b = task
+    H_fold, g_fold, vv_fold = _WORKER_STATE["H"], _WORKER_STATE["g"], _WORKER_STATE["vv"]
+    H_train = _WORKER_STATE["H_total"] - H_fold[k]
+    g_train = _WORKER_STATE["g_total"] - g_fold[k]
+    restraint = HyperbolicRestraint(a=a, b=b, q0=_WORKER_STATE["q0"])
+    q = solve_resp_normal(
+        H_train,
+        g_train,
+        _WORKER_STATE["total_charge"],
+        _WORKER_STATE["mask"],
+        restraint=restraint,
+        tol=_WORKER_STATE["tol"],
+    )["q"]
+    # ||A_k q - V_k||^2 from the held-out fold's own sums; clip round-off below zero.
+    return max(float(q @ (H_fold[k] @ q) - 2.0 * (g_fold[k] @ q) + vv_fold[k]), 0.0)
+
+
+@timed("resp.cross_validate")
+def cross_validate_restraint(
+    A: np.ndarray | Sequence[np.ndarray],
+    V: np.ndarray | Sequence[np.ndarray],
+    total_charge: float,
+    a_values: Sequence[float],
+    *,
+    b_values: Sequence[float] = (HyperbolicRestraint.b,),
+    mask: np.ndarray | None = None,
+    q0: float = 0.0,
+    n_folds: int = 5,
+    by: str = "points",
+    seed: int | None = None,
+    tol: float = 1e-10,
+    jobs: int = 1,
+) -> RestraintSelection:
+    """K-fold cross-validation of RESP restraint strengths.
+
+    ``A``/``V`` are one design matrix and ESP vector, or sequences of them
+    (one per frame, all fitted with a single charge vector).  ``mask`` selects
+    the restrained atoms (default: all).  The candidate with the lowest pooled
+    held-out RMSE wins; ties go to the first candidate in ``a_values`` x
+    ``b_values`` order.
+    """
+
+    A_frames, V_frames = _as_frames(A, V)
+    N = A_frames[0].shape[1]
+    mask = np.ones(N, dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+    if mask.shape != (N,):
+        raise ValueError("mask must have one entry per atom")
+    a_values = np.asarray(a_values, dtype=np.float64).ravel()
+    b_values = np.asarray(b_values, dtype=np.float64).ravel()
+    if a_values.size == 0 or b_values.size == 0:
+        raise ValueError("Pass at least one candidate for a and b")
+
+    rng = np.random.default_rng(seed)
+    labels = _fold_labels([a.shape[0] for a in A_frames], n_folds, by, rng)
+    H, g, vv, m = fold_statistics(A_frames, V_frames, labels, n_folds)
+    state = {
+        "H": H,
+        "g": g,
+        "vv": vv,
+        "H_total": H.sum(axis=0),
+        "g_total": g.sum(axis=0),
+        "total_charge": float(total_charge),
+        "mask": mask,
+        "q0": float(q0),
+        "tol": tol,
+    }
+
+    tasks = [(k, float(a), float(b)) for k, a, b in product(range(n_folds), a_values, b_values)]
+    if jobs <= 1:
+        _init_worker(state)
+        errors = [_held_out_error(task) for task in tasks]
+    else:
+        chunksize = max(1, len(tasks) // (4 * jobs))
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(state,)) as pool:
+            errors = list(pool.map(_held_out_error, tasks, chunksize=chunksize))
+
+    sse = np.asarray(errors).reshape(n_folds, a_values.size, b_values.size)
+    fold_rmse = np.sqrt(sse / np.maximum(m, 1)[:, np.newaxis, np.newaxis])
+    rmse = np.sqrt(sse.sum(axis=0) / m.sum())
+    best_a, best_b = np.unravel_index(int(np.argmin(rmse)), rmse.shape)
+    return RestraintSelection(
+        a_values=a_values,
+        b_values=b_values,
+        fold_rmse=fold_rmse,
+        rmse=rmse,
+        best_a=float(a_values[best_a]),
+        best_b=float(b_values[best_b]),
+        by=by,
+        q0=float(q0),
+    )
+
+
+__all__ = [
+    "FOLD_MODES",
+    "RestraintSelection",
+    "cross_validate_restraint",
+    "fold_statistics",
+    "solve_resp_normal",
+    "solve_resp_normal_batch",
+]
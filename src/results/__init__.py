@@ -0,0 +1,10 @@
+"""Columnar on-disk storage for per-frame fit results."""
+
+from .store import GRID_COLUMNS, VARIABLE_LENGTH_COLUMNS, ResultsReader, ResultsWriter
+
+__all__ = [
+    "GRID_COLUMNS",
+    "ResultsReader",
+    "ResultsWriter",
+    "VARIABLE_LENGTH_COLUMNS",
+]
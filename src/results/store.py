@@ -0,0 +1,222 @@
+"""Append-only columnar store for per-frame fit results.
+
+A store is a directory holding one raw little-endian binary file per column
+(``<name>.bin``) plus ``schema.json`` recording each column's dtype, per-row
+shape and the number of committed rows.  Rows are buffered in memory and
+appended in chunks; the schema is rewritten atomically after every flush, so a
+crash can only lose the rows of the last unflushed chunk.  Readers memory-map
+individual columns, so loading ``charges`` for 10^5 frames never touches the
+diagnostics stored next to it.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Sequence
+
+import numpy as np
+
+SCHEMA_FILE = "schema.json"
+SCHEMA_VERSION = 1
+
+#: Per-grid-point arrays produced by the fitters (``n_grid`` values per frame).
+GRID_COLUMNS = ("pred", "predicted_esp", "residual")
+#: Per-frame values whose length changes from frame to frame.
+VARIABLE_LENGTH_COLUMNS = ("loss_history",)
+
+
+def _column_file(root: Path, name: str) -> Path:
+    return root / f"{name}.bin"
+
+
+def _as_row_array(name: str, value: Any) -> np.ndarray:
+    array = np.asarray(value)
+    if array.dtype == object or array.dtype.kind in "USV":
+        raise TypeError(f"Column {name!r} is not numeric (dtype {array.dtype})")
+    return array
+
+
+class ResultsWriter:
+    """Buffer result rows and append them to a columnar store on disk.
+
+    Parameters
+    ----------
+    path
+        Store directory; created when missing.  An existing store is appended
+        to, in which case its schema must match the incoming rows.
+    columns
+        Optional explicit list of columns to keep.  By default every numeric
+        entry of the first row is stored.
+    drop_grid_arrays
+        Skip the per-grid arrays listed in :data:`GRID_COLUMNS` (``residual``,
+        ``predicted_esp``...) unless they are named in ``columns``.
+    chunk_size
+        Number of buffered rows that triggers a flush.
+    """
+
+    def __init__(
+        self,
+        path: Path | str,
+        *,
+        columns: Sequence[str] | None = None,
+        drop_grid_arrays: bool = True,
+        chunk_size: int = 64,
+    ) -> None:
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        self._requested = list(columns) if columns is not None else None
+        self._dropped = set(VARIABLE_LENGTH_COLUMNS)
+        if drop_grid_arrays:
+            self._dropped.update(GRID_COLUMNS)
+        if self._requested is not None:
+            self._dropped.difference_update(self._requested)
+
+        self._schema: Dict[str, Dict[str, Any]] | None = None
+        self._n_rows = 0
+        self._buffer: List[Dict[str, np.ndarray]] = []
+
+        schema_path = self.path / SCHEMA_FILE
+        if schema_path.exists():
+            schema = json.loads(schema_path.read_text())
+            self._schema = schema["columns"]
+            self._n_rows = int(schema["n_rows"])
+            # Discard bytes of rows that were written but never committed.
+            for name, spec in self._schema.items():
+                row_bytes = np.dtype(spec["dtype"]).itemsize * int(np.prod(spec["shape"], dtype=np.int64))
+                with _column_file(self.path, name).open("ab") as fh:
+                    fh.truncate(self._n_rows * row_bytes)
+
+    @property
+    def n_rows(self) -> int:
+        """Rows committed to disk plus rows still buffered."""
+        return self._n_rows + len(self._buffer)
+
+    def _select(self, row: Mapping[str, Any]) -> Dict[str, np.ndarray]:
+        names = self._requested if self._requested is not None else [k for k in row if k not in self._dropped]
+        selected: Dict[str, np.ndarray] = {}
+        for name in names:
+            if name not in row:
+                raise KeyError(f"Row is missing column {name!r}")
+            selected[name] = _as_row_array(name, row[name])
+        return selected
+
+    def _check_schema(self, row: Mapping[str, np.ndarray]) -> None:
+        if self._schema is None:
+            self._schema = {
+                name: {"dtype": np.dtype(value.dtype).newbyteorder("<").str, "shape": list(value.shape)}
+                for name, value in row.items()
+            }
+            return
+        if set(row) != set(self._schema):
+            raise ValueError(
+                f"Row columns {sorted(row)} do not match store columns {sorted(self._schema)}"
+            )
+        for name, value in row.items():
+            dtype = np.dtype(value.dtype).newbyteorder("<").str
+            if dtype != self._schema[name]["dtype"]:
+                raise ValueError(f"Column {name!r} expects dtype {self._schema[name]['dtype']}, got {value.dtype}")
+            if list(value.shape) != self._schema[name]["shape"]:
+                raise ValueError(
+                    f"Column {name!r} expects per-row shape {tuple(self._schema[name]['shape'])}, got {value.shape}"
+                )
+
+    def append(self, row: Mapping[str, Any]) -> None:
+        """Queue one result row (e.g. a fitter's output dict plus ``frame``)."""
+        selected = self._select(row)
+        self._check_schema(selected)
+        self._buffer.append(selected)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def extend(self, rows: Iterable[Mapping[str, Any]]) -> None:
+        for row in rows:
+            self.append(row)
+
+    def flush(self) -> None:
+        """Append buffered rows to the column files and commit the schema."""
+        if not self._buffer or self._schema is None:
+            return
+        for name, spec in self._schema.items():
+            block = np.stack([row[name] for row in self._buffer]).astype(spec["dtype"], copy=False)
+            with _column_file(self.path, name).open("ab") as fh:
+                fh.write(np.ascontiguousarray(block).tobytes())
+                fh.flush()
+                os.fsync(fh.fileno())
+        self._n_rows += len(self._buffer)
+        self._buffer.clear()
+        self._write_schema()
+
+    def _write_schema(self) -> None:
+        payload = {"version": SCHEMA_VERSION, "n_rows": self._n_rows, "columns": self._schema}
+        tmp = self.path / (SCHEMA_FILE + ".tmp")
+        tmp.write_text(json.dumps(payload, indent=1))
+        os.replace(tmp, self.path / SCHEMA_FILE)
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "ResultsWriter":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+class ResultsReader:
+    """Memory-mapped access to a store written by :class:`ResultsWriter`."""
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        schema_path = self.path / SCHEMA_FILE
+        if not schema_path.exists():
+            raise FileNotFoundError(f"No results store found at {self.path}")
+        schema = json.loads(schema_path.read_text())
+        if schema.get("version") != SCHEMA_VERSION:
+            raise ValueError(f"Unsupported results store version {schema.get('version')!r}")
+        self._schema: Dict[str, Dict[str, Any]] = schema["columns"]
+        self.n_rows = int(schema["n_rows"])
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._schema)
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._schema
+
+    def read(self, name: str, *, mmap: bool = True) -> np.ndarray:
+        """Return column ``name`` with shape ``(n_rows, *row_shape)``.
+
+        With ``mmap=True`` (default) the data stay on disk and are paged in on
+        access; pass ``mmap=False`` for an in-memory copy.
+        """
+        if name not in self._schema:
+            raise KeyError(f"Unknown column {name!r}; available: {self.columns}")
+        spec = self._schema[name]
+        shape = (self.n_rows, *spec["shape"])
+        if self.n_rows == 0:
+            return np.empty(shape, dtype=spec["dtype"])
+        array = np.memmap(_column_file(self.path, name), dtype=spec["dtype"], mode="r", shape=shape)
+        return array if mmap else np.array(array)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.read(name)
+
+    def load(self, names: Sequence[str] | None = None, *, mmap: bool = True) -> Dict[str, np.ndarray]:
+        """Return several columns at once (all of them by default)."""
+        return {name: self.read(name, mmap=mmap) for name in (names or self.columns)}
+
+
+__all__ = [
+    "GRID_COLUMNS",
+    "ResultsReader",
+    "ResultsWriter",
+    "VARIABLE_LENGTH_COLUMNS",
+]
@@ -7,9 +7,12 @@ from pathlib import Path
 from typing import Dict, List, Mapping, MutableMapping, Sequence, Tuple, Union
 
 import networkx as nx
+import numpy as np
 from rdkit import Chem
 from rdkit.Chem.rdchem import Mol
 
+from parser import Topology
+
 
 NodeLabel = Tuple[str, ...]
 
@@ -121,8 +124,15 @@ def buckets_from_pdb(
     radius: int = 2,
     remove_hs: bool = True,
     use_edge_labels: bool = True,
+    topology: Topology | None = None,
 ) -> List[List[int]]:
-    """Load a PDB and return WL symmetry buckets."""
+    """Load a PDB and return WL symmetry buckets.
+
+    With the ``topology`` of the geometry used for the fits
+    (:func:`parser.load_topology`), the PDB's elements are checked against it
+    atom by atom and the buckets are returned in the geometry's atom indices,
+    which with ``remove_hs`` skip the hydrogens.
+    """
 
     pdb_path = Path(pdb_path)
     if not pdb_path.exists():
@@ -130,4 +140,12 @@ def buckets_from_pdb(
 
     mol = Chem.MolFromPDBFile(str(pdb_path), removeHs=remove_hs)
     graph = mol_to_nx(mol)
-    return buckets_from_graph(graph, radius=radius, use_edge_labels=use_edge_labels)
+    buckets = buckets_from_graph(graph, radius=radius, use_edge_labels=use_edge_labels)
+    if topology is None:
+        return buckets
+    atom_indices = np.flatnonzero(topology.heavy_atom_mask) if remove_hs else np.arange(topology.n_atoms)
+    expected = topology.atomic_numbers[atom_indices]
+    found = np.array([graph.nodes[node]["Z"] for node in sorted(graph.nodes)], dtype=np.int64)
+    if found.shape != expected.shape or np.any(found != expected):
+        raise ValueError(f"Atoms of {pdb_path} do not match the geometry topology element by element")
+    return [[int(atom_indices[node]) for node in bucket] for bucket in buckets]
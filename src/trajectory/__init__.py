@@ -0,0 +1,30 @@
+"""Trajectory-level drivers that operate on frame ranges."""
+
+from .checkpoint import TrajectoryCheckpoint
+from .driver import (
+    convert_frames,
+    dipole_frames,
+    fit_linear_frames,
+    fit_resp_frames,
+    select_frames,
+    stream_frames,
+)
+from .frames import parse_frame_range, resolve_frames
+from .pipeline import ordered_pipeline
+from .stats import ChargeAccumulator, TrajectoryChargeStats, charge_statistics
+
+__all__ = [
+    "ChargeAccumulator",
+    "TrajectoryChargeStats",
+    "TrajectoryCheckpoint",
+    "charge_statistics",
+    "convert_frames",
+    "dipole_frames",
+    "fit_linear_frames",
+    "fit_resp_frames",
+    "ordered_pipeline",
+    "parse_frame_range",
+    "resolve_frames",
+    "select_frames",
+    "stream_frames",
+]
@@ -0,0 +1,182 @@
+"""Resumable trajectory runs.
+
+A checkpoint is a directory holding ``checkpoint.json`` and one
+``frame_<index>.npz`` per finished frame.  The manifest records what the rows
+depend on: the SHA-256 of every input file, the driver's fit parameters and
+the atom count.  Reopening a checkpoint with different inputs raises instead
+of mixing rows of two runs; the frame selection is not part of the manifest,
+so a resumed run may cover more or fewer frames than the interrupted one.
+
+Each row is written to a temporary file, fsynced and renamed into place, so
+a crash or preemption leaves either the complete row or no row for a frame.
+:meth:`TrajectoryCheckpoint.merge` interleaves the stored rows with freshly
+fitted ones, and the drivers only parse and fit the frames still missing.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Sequence, Set
+
+import numpy as np
+
+CHECKPOINT_FILE = "checkpoint.json"
+CHECKPOINT_VERSION = 1
+
+_FRAME_PREFIX = "frame_"
+_HASH_CHUNK = 1024**2
+
+
+def file_digest(path: Path | str) -> str:
+    """SHA-256 of the bytes of ``path`` (as stored, i.e. before decompression)."""
+    digest = hashlib.sha256()
+    with Path(path).open("rb") as fh:
+        for chunk in iter(lambda: fh.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _frame_file(root: Path, index: int) -> Path:
+    return root / f"{_FRAME_PREFIX}{index:08d}.npz"
+
+
+def _normalised(value: Any) -> Any:
+    """``value`` as it reads back from JSON, so manifests compare like for like."""
+    return json.loads(json.dumps(value))
+
+
+class TrajectoryCheckpoint:
+    """Per-frame result rows of one trajectory run, kept on disk.
+
+    Parameters
+    ----------
+    path
+        Checkpoint directory; created when missing.
+    inputs
+        Input files by role (e.g. ``{"resp_out": ..., "esp_xyz": ...}``); their
+        contents are hashed.
+    parameters
+        JSON-serialisable settings the rows depend on.
+    number_of_atoms
+        Atom count of the fitted molecule.
+
+    Raises ``ValueError`` when ``path`` already holds a checkpoint written for
+    different inputs, parameters or atom count.
+    """
+
+    def __init__(
+        self,
+        path: Path | str,
+        *,
+        inputs: Mapping[str, Path | str],
+        parameters: Mapping[str, Any],
+        number_of_atoms: int,
+    ) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        manifest = {
+            "version": CHECKPOINT_VERSION,
+            "number_of_atoms": int(number_of_atoms),
+            "inputs": {name: {"path": str(p), "sha256": file_digest(p)} for name, p in inputs.items()},
+            "parameters": _normalised(dict(parameters)),
+        }
+
+        manifest_path = self.path / CHECKPOINT_FILE
+        if manifest_path.exists():
+            self._validate(json.loads(manifest_path.read_text()), manifest)
+        else:
+            tmp = self.path / (CHECKPOINT_FILE + ".tmp")
+            tmp.write_text(json.dumps(manifest, indent=1))
+            os.replace(tmp, manifest_path)
+        self.manifest = manifest
+
+        # Rows whose rename never happened are incomplete; drop them.
+        for stale in self.path.glob(f".{_FRAME_PREFIX}*.tmp"):
+            stale.unlink()
+        self._completed: Set[int] = {
+            int(p.stem[len(_FRAME_PREFIX) :]) for p in self.path.glob(f"{_FRAME_PREFIX}*.npz")
+        }
+
+    def _validate(self, stored: Mapping[str, Any], current: Mapping[str, Any]) -> None:
+        where = f"Checkpoint {self.path}"
+        if stored.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"{where} has unsupported version {stored.get('version')!r}")
+        if stored["number_of_atoms"] != current["number_of_atoms"]:
+            raise ValueError(
+                f"{where} was written for {stored['number_of_atoms']} atoms, not {current['number_of_atoms']}"
+            )
+        if set(stored["inputs"]) != set(current["inputs"]):
+            raise ValueError(f"{where} was written for inputs {sorted(stored['inputs'])}")
+        for name, entry in current["inputs"].items():
+            if stored["inputs"][name]["sha256"] != entry["sha256"]:
+                raise ValueError(f"{where}: {name} ({entry['path']}) changed since the checkpoint was written")
+        changed = sorted(
+            key
+            for key in set(stored["parameters"]) | set(current["parameters"])
+            if stored["parameters"].get(key) != current["parameters"].get(key)
+        )
+        if changed:
+            raise ValueError(f"{where} was written with different {', '.join(changed)}")
+
+    @property
+    def completed(self) -> List[int]:
+        """Indices of the frames with a stored row, ascending."""
+        return sorted(self._completed)
+
+    def __contains__(self, index: object) -> bool:
+        return index in self._completed
+
+    def __len__(self) -> int:
+        return len(self._completed)
+
+    def record(self, row: Mapping[str, Any]) -> None:
+        """Store one result row atomically; ``row["frame"]`` names the frame."""
+        index = int(row["frame"])
+        final = _frame_file(self.path, index)
+        tmp = self.path / f".{final.name}.tmp"
+        with tmp.open("wb") as fh:
+            np.savez(fh, **{name: np.asarray(value) for name, value in row.items()})
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, final)
+        self._completed.add(index)
+
+    def load(self, index: int) -> Dict[str, Any]:
+        """The stored row of frame ``index``, with 0-d arrays turned back into scalars."""
+        if index not in self._completed:
+            raise KeyError(f"Frame {index} is not in checkpoint {self.path}")
+        row: Dict[str, Any] = {}
+        with np.load(_frame_file(self.path, index), allow_pickle=False) as data:
+            for name in data.files:
+                value = data[name]
+                row[name] = value.item() if value.ndim == 0 else value
+        return row
+
+    def pending(self, indices: Sequence[int]) -> List[int]:
+        """The entries of ``indices`` without a stored row, in order."""
+        return [index for index in indices if index not in self._completed]
+
+    def merge(self, indices: Sequence[int], rows: Iterable[Mapping[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Rows of ``indices`` in order: stored ones loaded, the others taken from ``rows`` and recorded.
+
+        ``rows`` must yield the rows of :meth:`pending` ``(indices)``, in order.
+        """
+        fresh = iter(rows)
+        for index in indices:
+            if index in self._completed:
+                yield self.load(index)
+                continue
+            row = next(fresh, None)
+            if row is None:
+                raise ValueError(f"No row was produced for frame {index}")
+            row = dict(row)
+            if int(row["frame"]) != index:
+                raise ValueError(f"Expected the row of frame {index}, got frame {row['frame']}")
+            self.record(row)
+            yield row
+
+
+__all__ = ["CHECKPOINT_FILE", "TrajectoryCheckpoint", "file_digest"]
@@ -0,0 +1,579 @@
+"""Frame-parallel trajectory drivers built on the shared parse cache.
+
+Each driver parses only the selected frames of ``resp.out`` (seeking through the
+cached frame offsets), reads the reference grid once, and fans the per-frame
+work out over a process pool (``jobs``) or, with ``threads``, overlaps parsing
+with fitting in a threaded pipeline (:mod:`trajectory.pipeline`).  Results come back as columns: a mapping from
+name to a NumPy array whose first axis runs over the selected frames.  Passing
+a :class:`results.ResultsWriter` as ``sink`` streams the rows to disk in frame
+order instead, and the driver returns ``None``.
+
+The fitting drivers take a ``checkpoint`` directory
+(:class:`trajectory.checkpoint.TrajectoryCheckpoint`): every finished row is
+saved there as it arrives, and a rerun with the same inputs and parameters
+fits only the frames that are still missing.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from dipole.dipole import BOHR_PER_ANG, _dipole_from_charges
+from instrumentation import frame_scope, stage
+from linearESPcharges.incremental import IncrementalLinearSystem
+from linearESPcharges.linear import (
+    ANGSTROM_TO_BOHR,
+    _precision_dtype,
+    build_design_matrix,
+    explicit_solution,
+    normal_equations,
+)
+from parser import ParseRespDotOut, load_esp_grid, load_resp_frames, load_resp_offsets, load_topology
+from parser.parser import Frame
+from resp.resp import HyperbolicRestraint, fit_resp_system
+from results import ResultsReader, ResultsWriter
+from results.store import VARIABLE_LENGTH_COLUMNS
+
+from .checkpoint import TrajectoryCheckpoint
+from .frames import resolve_frames
+from .pipeline import ordered_pipeline
+
+Columns = Dict[str, np.ndarray]
+FrameTask = Tuple[int, Frame]
+
+_STREAM_CHUNK = 16
+
+_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _init_worker(state: Mapping[str, Any]) -> None:
+    _WORKER_STATE.clear()
+    _WORKER_STATE.update(state)
+
+
+def _check_parallelism(jobs: int, threads: int) -> None:
+    if threads < 0:
+        raise ValueError("threads must be non-negative")
+    if threads and jobs > 1:
+        raise ValueError("Use either worker processes (jobs) or pipeline threads (threads), not both")
+
+
+def _in_frame_scope(func: Callable[[FrameTask], Dict[str, Any]]) -> Callable[[FrameTask], Dict[str, Any]]:
+    def run(task: FrameTask) -> Dict[str, Any]:
+        with frame_scope(task[0]), stage("trajectory.frame"):
+            return func(task)
+
+    return run
+
+
+def _map_frames(
+    func: Callable[[FrameTask], Dict[str, Any]],
+    tasks: Iterable[FrameTask],
+    state: Mapping[str, Any],
+    jobs: int,
+    threads: int = 0,
+) -> Iterator[Dict[str, Any]]:
+    if threads:
+        _init_worker(state)
+        yield from ordered_pipeline(tasks, _in_frame_scope(func), workers=threads)
+        return
+    tasks = list(tasks)
+    if jobs <= 1 or len(tasks) <= 1:
+        _init_worker(state)
+        for task in tasks:
+            with frame_scope(task[0]), stage("trajectory.frame"):
+                row = func(task)
+            yield row
+        return
+    chunksize = max(1, len(tasks) // (4 * jobs))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(dict(state),)) as pool:
+        yield from pool.map(func, tasks, chunksize=chunksize)
+
+
+def _stack_rows(rows: Sequence[Mapping[str, Any]]) -> Columns:
+    if not rows:
+        return {}
+    columns: Columns = {}
+    for key in rows[0]:
+        if key in VARIABLE_LENGTH_COLUMNS:
+            ragged = np.empty(len(rows), dtype=object)
+            ragged[:] = [row[key] for row in rows]
+            columns[key] = ragged
+        else:
+            columns[key] = np.asarray([row[key] for row in rows])
+    return columns
+
+
+def _rows_in_sink(sink: ResultsWriter, selected: Sequence[int]) -> int:
+    """Leading rows of ``selected`` that an existing store already holds from an interrupted run."""
+    if sink.n_rows == 0:
+        return 0
+    reader = ResultsReader(sink.path)
+    stored = reader["frame"].tolist() if "frame" in reader else None
+    if stored != list(selected[: len(reader)]):
+        raise ValueError(f"Results store {sink.path} already holds rows that do not start the selected frames")
+    return len(reader)
+
+
+def _collect(
+    rows: Iterator[Mapping[str, Any]],
+    sink: ResultsWriter | None,
+    checkpoint: TrajectoryCheckpoint | None = None,
+    selected: Sequence[int] = (),
+) -> Columns | None:
+    if checkpoint is not None:
+        rows = checkpoint.merge(selected, rows)
+        if sink is not None:
+            rows = islice(rows, _rows_in_sink(sink, selected), None)
+    if sink is None:
+        return _stack_rows(list(rows))
+    for row in rows:
+        sink.append(row)
+    sink.flush()
+    return None
+
+
+def select_frames(
+    resp_out: Path | str,
+    number_of_atoms: int,
+    frames: str | slice | None = None,
+) -> Tuple[List[int], List[Frame]]:
+    """Resolve a frame range against ``resp_out`` and parse only those frames."""
+
+    offsets = load_resp_offsets(resp_out)
+    if not offsets:
+        all_frames = load_resp_frames(resp_out, number_of_atoms)
+        indices = resolve_frames(frames, len(all_frames))
+        return indices, [all_frames[idx] for idx in indices]
+    indices = resolve_frames(frames, len(offsets))
+    with stage("trajectory.select_frames"):
+        parsed = ParseRespDotOut(resp_out, number_of_atoms).extract_frames(indices, offsets=offsets)
+    return indices, parsed
+
+
+def stream_frames(
+    resp_out: Path | str,
+    number_of_atoms: int,
+    frames: str | slice | None = None,
+    *,
+    chunk_size: int = _STREAM_CHUNK,
+) -> Iterator[FrameTask]:
+    """Lazily parse the selected frames, ``chunk_size`` at a time, as ``(index, frame)`` pairs.
+
+    Unlike :func:`select_frames` nothing is parsed until the iterator is
+    advanced, which lets a pipeline fit early frames while later ones are read.
+    """
+
+    offsets = load_resp_offsets(resp_out)
+    if not offsets:
+        yield from zip(*select_frames(resp_out, number_of_atoms, frames))
+        return
+    indices = resolve_frames(frames, len(offsets))
+    parser = ParseRespDotOut(resp_out, number_of_atoms)
+    for start in range(0, len(indices), chunk_size):
+        chunk = indices[start : start + chunk_size]
+        with stage("trajectory.stream_frames"):
+            parsed = parser.extract_frames(chunk, offsets=offsets)
+        yield from zip(chunk, parsed)
+
+
+def _frame_tasks(
+    resp_out: Path | str,
+    number_of_atoms: int,
+    frames: str | slice | Sequence[int] | None,
+    threads: int,
+) -> Iterable[FrameTask]:
+    if isinstance(frames, list) and not frames:
+        # Every selected frame is already checkpointed.
+        return []
+    if threads:
+        return stream_frames(resp_out, number_of_atoms, frames)
+    return list(zip(*select_frames(resp_out, number_of_atoms, frames)))
+
+
+def _open_checkpoint(
+    checkpoint: Path | str | None,
+    resp_out: Path | str,
+    number_of_atoms: int,
+    frames: str | slice | None,
+    *,
+    inputs: Mapping[str, Path | str],
+    parameters: Mapping[str, Any],
+) -> Tuple[TrajectoryCheckpoint | None, List[int], str | slice | Sequence[int] | None]:
+    """The opened checkpoint, the selected frames and the selection still to be fitted."""
+
+    if checkpoint is None:
+        return None, [], frames
+    store = TrajectoryCheckpoint(
+        checkpoint,
+        inputs={"resp_out": resp_out, **inputs},
+        parameters=parameters,
+        number_of_atoms=number_of_atoms,
+    )
+    offsets = load_resp_offsets(resp_out)
+    total = len(offsets) if offsets else len(load_resp_frames(resp_out, number_of_atoms))
+    selected = resolve_frames(frames, total)
+    return store, selected, store.pending(selected)
+
+
+def _grid_state(esp_xyz: Path | str, grid_frame_index: int) -> Dict[str, Any]:
+    grid = load_esp_grid(esp_xyz, grid_frame_index)
+    return {
+        "grid_bohr": np.asarray(grid.coordinates, dtype=np.float64) * ANGSTROM_TO_BOHR,
+        "esp_values": np.asarray(grid.potentials, dtype=np.float64),
+    }
+
+
+def _frame_total_charge(frame: Frame) -> float:
+    total_charge = _WORKER_STATE.get("total_charge")
+    if total_charge is not None:
+        return float(total_charge)
+    return float(np.sum(frame.esp_charges))
+
+
+def _fit_linear_task(task: FrameTask) -> Dict[str, Any]:
+    index, frame = task
+    positions = np.asarray(frame.positions, dtype=np.float64)
+    A = build_design_matrix(_WORKER_STATE["grid_bohr"], positions, dtype=_WORKER_STATE["dtype"])
+    V = _WORKER_STATE["esp_values"]
+    result = explicit_solution(ridge=_WORKER_STATE["ridge"]).fit(A, V, _frame_total_charge(frame))
+    return {
+        "frame": index,
+        "charges": result["q"],
+        "rmse": result["rmse"],
+        "rrms": result["rrms"],
+        "sum_q": result["sum_q"],
+    }
+
+
+def _fit_resp_task(task: FrameTask) -> Dict[str, Any]:
+    index, frame = task
+    positions = np.asarray(frame.positions, dtype=np.float64)
+    A = build_design_matrix(_WORKER_STATE["grid_bohr"], positions, dtype=_WORKER_STATE["dtype"])
+    result = fit_resp_system(
+        A,
+        _WORKER_STATE["esp_values"],
+        _WORKER_STATE["mask"],
+        _frame_total_charge(frame),
+        restraint=_WORKER_STATE["restraint"],
+        solver_tol=_WORKER_STATE["solver_tol"],
+        maxiter=_WORKER_STATE["maxiter"],
+        history=_WORKER_STATE["history"],
+    )
+    row = {
+        "frame": index,
+        "charges": result["charges"],
+        "lagrange_multiplier": result["lagrange_multiplier"],
+        "loss": result["loss"],
+        "ls_term": result["ls_term"],
+        "restraint": result["restraint"],
+        "rmse": result["rmse"],
+        "rrms": result["rrms"],
+        "sum_q": result["sum_q"],
+    }
+    if _WORKER_STATE["history"] != "off":
+        row["loss_history"] = np.asarray(result["loss_history"], dtype=np.float64)
+    return row
+
+
+def _normal_equations_task(task: FrameTask) -> Dict[str, Any]:
+    index, frame = task
+    positions = np.asarray(frame.positions, dtype=np.float64)
+    A = build_design_matrix(_WORKER_STATE["grid_bohr"], positions, dtype=_WORKER_STATE["dtype"])
+    V = _WORKER_STATE["esp_values"]
+    H, g = normal_equations(A, V)
+    n_atoms = positions.shape[0]
+    return {
+        "frame": index,
+        "H": H,
+        "g": g,
+        "vv": float(V @ V),
+        "n_points": V.shape[0],
+        "total_charge": _frame_total_charge(frame),
+        "esp_charges": np.asarray(frame.esp_charges, dtype=np.float64),
+        "resp_charges": (
+            np.asarray(frame.resp_charges, dtype=np.float64) if frame.resp_charges else np.full(n_atoms, np.nan)
+        ),
+    }
+
+
+def _dipole_task(task: FrameTask) -> Dict[str, Any]:
+    index, frame = task
+    if frame.center_of_mass is None or frame.dipole_moment_vector is None:
+        raise ValueError(f"Frame {index} is missing CENTER OF MASS or DIPOLE MOMENT data")
+    positions = np.asarray(frame.positions, dtype=np.float64)
+    com_bohr = np.asarray(frame.center_of_mass, dtype=np.float64) * BOHR_PER_ANG
+    A = build_design_matrix(_WORKER_STATE["grid_bohr"], positions)
+    fitted = explicit_solution().fit(A, _WORKER_STATE["esp_values"], _frame_total_charge(frame))["q"]
+
+    esp_vec, esp_mag = _dipole_from_charges(np.asarray(frame.esp_charges, dtype=np.float64), positions, com_bohr)
+    fit_vec, fit_mag = _dipole_from_charges(fitted, positions, com_bohr)
+    if frame.resp_charges:
+        resp_vec, resp_mag = _dipole_from_charges(np.asarray(frame.resp_charges, dtype=np.float64), positions, com_bohr)
+    else:
+        resp_vec, resp_mag = np.full(3, np.nan), float("nan")
+
+    qm_vec = np.asarray(frame.dipole_moment_vector, dtype=np.float64)
+    qm_mag = frame.dipole_moment_magnitude
+    return {
+        "frame": index,
+        "qm_dipole": qm_vec,
+        "qm_dipole_magnitude": float(np.linalg.norm(qm_vec)) if qm_mag is None else float(qm_mag),
+        "esp_dipole": esp_vec,
+        "esp_dipole_magnitude": esp_mag,
+        "resp_dipole": resp_vec,
+        "resp_dipole_magnitude": resp_mag,
+        "fitted_dipole": fit_vec,
+        "fitted_dipole_magnitude": fit_mag,
+        "center_of_mass_bohr": com_bohr,
+    }
+
+
+def convert_frames(
+    resp_out: Path | str,
+    number_of_atoms: int,
+    frames: str | slice | None = None,
+    *,
+    sink: ResultsWriter | None = None,
+) -> Columns | None:
+    """Flatten the parsed ``resp.out`` blocks of the selected frames into columns."""
+
+    indices, parsed = select_frames(resp_out, number_of_atoms, frames)
+
+    def rows() -> Iterator[Dict[str, Any]]:
+        for index, frame in zip(indices, parsed):
+            yield {
+                "frame": index,
+                "positions_bohr": np.asarray(frame.positions, dtype=np.float64),
+                "esp_charges": np.asarray(frame.esp_charges, dtype=np.float64),
+                "exposure_fractions": np.asarray(frame.exposure_fractions, dtype=np.float64),
+                "esp_rrms": np.nan if frame.esp_rms_error is None else frame.esp_rms_error,
+                "resp_charges": (
+                    np.asarray(frame.resp_charges, dtype=np.float64)
+                    if frame.resp_charges
+                    else np.full(number_of_atoms, np.nan)
+                ),
+                "resp_rrms": np.nan if frame.resp_rms_error is None else frame.resp_rms_error,
+                "center_of_mass": np.asarray(frame.center_of_mass or (np.nan,) * 3, dtype=np.float64),
+                "dipole_moment": np.asarray(frame.dipole_moment_vector or (np.nan,) * 3, dtype=np.float64),
+            }
+
+    return _collect(rows(), sink)
+
+
+def fit_linear_frames(
+    resp_out: Path | str,
+    esp_xyz: Path | str,
+    number_of_atoms: int,
+    frames: str | slice | None = None,
+    *,
+    grid_frame_index: int = 0,
+    total_charge: float | None = None,
+    ridge: float = 0.0,
+    precision: str = "double",
+    incremental_tol: float | None = None,
+    jobs: int = 1,
+    threads: int = 0,
+    sink: ResultsWriter | None = None,
+    checkpoint: Path | str | None = None,
+) -> Columns | None:
+    """Fit unrestrained ESP charges for every selected frame.
+
+    With ``incremental_tol`` (bohr) frames are fitted in order against one
+    :class:`~linearESPcharges.incremental.IncrementalLinearSystem`, recomputing
+    only the design-matrix columns of atoms that moved further than the
+    tolerance; rows gain a ``columns_recomputed`` column.  This mode is
+    sequential and requires ``jobs=1``; with ``threads`` it still overlaps
+    parsing with a single fitting thread.
+    """
+
+    _check_parallelism(jobs, threads)
+    checkpoint, selected, frames = _open_checkpoint(
+        checkpoint,
+        resp_out,
+        number_of_atoms,
+        frames,
+        inputs={"esp_xyz": esp_xyz},
+        parameters={
+            "driver": "fit_linear",
+            "grid_frame_index": grid_frame_index,
+            "total_charge": total_charge,
+            "ridge": ridge,
+            "precision": precision,
+            "incremental_tol": incremental_tol,
+        },
+    )
+    tasks = _frame_tasks(resp_out, number_of_atoms, frames, threads)
+    state = _grid_state(esp_xyz, grid_frame_index)
+    if incremental_tol is not None:
+        if jobs > 1:
+            raise ValueError("Incremental design-matrix updates are sequential; use jobs=1")
+        system = IncrementalLinearSystem(
+            state["grid_bohr"],
+            state["esp_values"],
+            tolerance=incremental_tol,
+            dtype=_precision_dtype(precision),
+        )
+        _WORKER_STATE.clear()
+        _WORKER_STATE["total_charge"] = total_charge
+
+        def fit_incremental(task: FrameTask) -> Dict[str, Any]:
+            index, frame = task
+            update = system.update(np.asarray(frame.positions, dtype=np.float64))
+            result = system.fit(_frame_total_charge(frame), ridge=ridge)
+            return {
+                "frame": index,
+                "charges": result["q"],
+                "rmse": result["rmse"],
+                "rrms": result["rrms"],
+                "sum_q": result["sum_q"],
+                "columns_recomputed": update.columns_recomputed,
+            }
+
+        run = _in_frame_scope(fit_incremental)
+        if threads:
+            return _collect(ordered_pipeline(tasks, run, workers=1), sink, checkpoint, selected)
+        return _collect((run(task) for task in tasks), sink, checkpoint, selected)
+
+    state.update({"ridge": ridge, "total_charge": total_charge, "dtype": _precision_dtype(precision)})
+    return _collect(_map_frames(_fit_linear_task, tasks, state, jobs, threads), sink, checkpoint, selected)
+
+
+def fit_resp_frames(
+    resp_out: Path | str,
+    esp_xyz: Path | str,
+    geometry_xyz: Path | str,
+    number_of_atoms: int,
+    frames: str | slice | None = None,
+    *,
+    grid_frame_index: int = 0,
+    total_charge: float | None = None,
+    restraint: HyperbolicRestraint | None = None,
+    restrain_all_atoms: bool = True,
+    solver_tol: float = 1e-11,
+    maxiter: int = 100,
+    precision: str = "double",
+    history: str = "off",
+    jobs: int = 1,
+    threads: int = 0,
+    sink: ResultsWriter | None = None,
+    checkpoint: Path | str | None = None,
+) -> Columns | None:
+    """Fit RESP charges for every selected frame.
+
+    Loss histories are not recorded by default; with ``history="outer"`` or
+    ``"all"`` each row gains a variable-length ``loss_history`` column.
+    """
+
+    mask = load_topology(geometry_xyz).restraint_mask(restrain_all_atoms)
+    if mask.shape[0] != number_of_atoms:
+        raise ValueError("Geometry frame atom count does not match requested number_of_atoms")
+
+    _check_parallelism(jobs, threads)
+    restraint = restraint or HyperbolicRestraint()
+    checkpoint, selected, frames = _open_checkpoint(
+        checkpoint,
+        resp_out,
+        number_of_atoms,
+        frames,
+        inputs={"esp_xyz": esp_xyz, "geometry_xyz": geometry_xyz},
+        parameters={
+            "driver": "fit_resp",
+            "grid_frame_index": grid_frame_index,
+            "total_charge": total_charge,
+            "restraint": asdict(restraint),
+            "restrain_all_atoms": restrain_all_atoms,
+            "solver_tol": solver_tol,
+            "maxiter": maxiter,
+            "precision": precision,
+            "history": history,
+        },
+    )
+    tasks = _frame_tasks(resp_out, number_of_atoms, frames, threads)
+    state = _grid_state(esp_xyz, grid_frame_index)
+    state.update(
+        {
+            "mask": mask,
+            "total_charge": total_charge,
+            "restraint": restraint,
+            "solver_tol": solver_tol,
+            "maxiter": maxiter,
+            "history": history,
+            "dtype": _precision_dtype(precision),
+        }
+    )
+    return _collect(_map_frames(_fit_resp_task, tasks, state, jobs, threads), sink, checkpoint, selected)
+
+
+def normal_equation_frames(
+    resp_out: Path | str,
+    esp_xyz: Path | str,
+    number_of_atoms: int,
+    frames: str | slice | None = None,
+    *,
+    grid_frame_index: int = 0,
+    total_charge: float | None = None,
+    precision: str = "double",
+    jobs: int = 1,
+    threads: int = 0,
+) -> Columns:
+    """Per-frame sufficient statistics ``H = A^T A``, ``g = A^T V`` and ``V^T V``.
+
+    Every quadratic quantity of a frame's ESP fit (residual norms, KKT
+    gradients, the loss) follows from these, so whole-trajectory analyses can
+    work on ``(n_frames, N, N)`` stacks instead of the ``M x N`` design
+    matrices.  Rows also carry the frame's total charge and its TeraChem ESP
+    and RESP charges (NaN when absent).
+    """
+
+    _check_parallelism(jobs, threads)
+    tasks = _frame_tasks(resp_out, number_of_atoms, frames, threads)
+    state = _grid_state(esp_xyz, grid_frame_index)
+    state.update({"total_charge": total_charge, "dtype": _precision_dtype(precision)})
+    return _stack_rows(list(_map_frames(_normal_equations_task, tasks, state, jobs, threads)))
+
+
+def dipole_frames(
+    resp_out: Path | str,
+    esp_xyz: Path | str,
+    number_of_atoms: int,
+    frames: str | slice | None = None,
+    *,
+    grid_frame_index: int = 0,
+    jobs: int = 1,
+    threads: int = 0,
+    sink: ResultsWriter | None = None,
+    checkpoint: Path | str | None = None,
+) -> Columns | None:
+    """QM, TeraChem ESP/RESP and refitted dipoles (Debye) about the logged center of mass."""
+
+    _check_parallelism(jobs, threads)
+    checkpoint, selected, frames = _open_checkpoint(
+        checkpoint,
+        resp_out,
+        number_of_atoms,
+        frames,
+        inputs={"esp_xyz": esp_xyz},
+        parameters={"driver": "dipoles", "grid_frame_index": grid_frame_index},
+    )
+    tasks = _frame_tasks(resp_out, number_of_atoms, frames, threads)
+    state = _grid_state(esp_xyz, grid_frame_index)
+    state["total_charge"] = None
+    return _collect(_map_frames(_dipole_task, tasks, state, jobs, threads), sink, checkpoint, selected)
+
+
+__all__ = [
+    "convert_frames",
+    "dipole_frames",
+    "fit_linear_frames",
+    "fit_resp_frames",
+    "normal_equation_frames",
+    "select_frames",
+    "stream_frames",
+]
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from typing import List, Sequence
+
+
+def parse_frame_range(spec: str | None) -> slice:
+    """Turn a ``start:stop:step`` string (or a single index) into a slice.
+
+    ``None``/``""``/``":"`` select every frame; ``"-1"`` selects the last one.
+    """
+
+    if spec is None or not spec.strip():
+        return slice(None)
+
+    text = spec.strip()
+    if ":" not in text:
+        index = int(text)
+        return slice(index, index + 1 if index != -1 else None)
+
+    parts = text.split(":")
+    if len(parts) > 3:
+        raise ValueError(f"Frame range must look like start:stop[:step], got {spec!r}")
+    values = [int(part) if part.strip() else None for part in parts]
+    values += [None] * (3 - len(values))
+    if values[2] == 0:
+        raise ValueError("Frame range step cannot be zero")
+    return slice(*values)
+
+
+def resolve_frames(spec: str | slice | Sequence[int] | None, total_frames: int) -> List[int]:
+    """Return the concrete frame indices selected by ``spec`` out of ``total_frames``.
+
+    ``spec`` may also list the indices explicitly; negative ones count from the end.
+    """
+
+    if spec is None or isinstance(spec, (str, slice)):
+        selection = spec if isinstance(spec, slice) else parse_frame_range(spec)
+        indices = list(range(*selection.indices(total_frames)))
+    else:
+        indices = [int(index) + total_frames if int(index) < 0 else int(index) for index in spec]
+        for index in indices:
+            if not 0 <= index < total_frames:
+                raise IndexError(f"frame index {index} out of range for {total_frames} frames")
+    if not indices:
+        raise ValueError(f"Frame selection {spec!r} is empty for {total_frames} frames")
+    return indices
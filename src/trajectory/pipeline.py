@@ -0,0 +1,131 @@
+"""Overlapped parsing and fitting for the trajectory drivers.
+
+:func:`ordered_pipeline` runs a producer/consumer pipeline in threads: a reader
+thread drains ``source`` (typically the lazily parsed frames of ``resp.out``)
+into a bounded queue, and a pool of ``workers`` threads applies ``func`` to
+the queued items.  Parsing is I/O and string work, fitting is dominated by
+NumPy/BLAS calls that release the GIL, so the two stages overlap and a run
+takes roughly ``max(parse, fit)`` instead of their sum.
+
+Backpressure: at most ``depth`` items wait in the queue or in the worker pool
+(plus the one the reader is holding), so a slow consumer, for example a
+results store on a slow disk, stalls the reader instead of letting parsed
+frames pile up in memory.  Results are yielded in source order.  An exception raised by the reader or by ``func`` is re-raised
+in the consuming thread; closing the iterator early stops the reader.
+
+Worker threads run in copies of the caller's context, so an active
+:func:`instrumentation.recording` sees the stages of every thread.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Callable, Deque, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_POLL_S = 0.1
+
+
+class _Done:
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException | None = None) -> None:
+        self.error = error
+
+
+def _read(source: Iterable[T], items: "queue.Queue[object]", stop: threading.Event) -> None:
+    def put(item: object) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=_POLL_S)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        for item in source:
+            if not put(item):
+                return
+    except BaseException as exc:  # re-raised by the consumer
+        put(_Done(exc))
+        return
+    put(_Done())
+
+
+def ordered_pipeline(
+    source: Iterable[T],
+    func: Callable[[T], R],
+    *,
+    workers: int = 2,
+    depth: int | None = None,
+) -> Iterator[R]:
+    """Yield ``func(item)`` for every item of ``source``, in order, with reading and work overlapped.
+
+    Parameters
+    ----------
+    source
+        Iterable consumed by a dedicated reader thread.
+    func
+        Per-item work, called from ``workers`` threads.
+    workers
+        Number of worker threads.
+    depth
+        Maximum number of items read ahead of the consumer (queued plus in
+        flight); defaults to ``2 * workers``.
+    """
+
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    depth = 2 * workers if depth is None else int(depth)
+    if depth < workers:
+        raise ValueError("depth must be at least the number of workers")
+
+    # The queue holds what the workers cannot take yet; together with the
+    # pending futures it bounds the read-ahead to ``depth`` items.
+    items: "queue.Queue[object]" = queue.Queue(maxsize=max(1, depth - workers))
+    stop = threading.Event()
+    reader = threading.Thread(
+        target=copy_context().run,
+        args=(_read, source, items, stop),
+        name="biliresp-pipeline-reader",
+        daemon=True,
+    )
+    pending: Deque["Future[R]"] = deque()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="biliresp-pipeline-worker")
+    reader.start()
+    try:
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < workers:
+                item = items.get()
+                if isinstance(item, _Done):
+                    exhausted = True
+                    if item.error is not None:
+                        raise item.error
+                    break
+                pending.append(pool.submit(copy_context().run, func, item))
+            if not pending:
+                return
+            yield pending.popleft().result()
+    finally:
+        stop.set()
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+        # Unblock a reader waiting on a full queue, then wait for it to notice ``stop``.
+        while reader.is_alive():
+            try:
+                items.get(timeout=_POLL_S)
+            except queue.Empty:
+                pass
+        reader.join()
+
+
+__all__ = ["ordered_pipeline"]
@@ -0,0 +1,333 @@
+"""Streaming per-atom charge statistics over a trajectory.
+
+:class:`ChargeAccumulator` consumes charge vectors frame by frame (or in
+batches) and keeps, for every atom,
+
+- the running mean and variance (Welford, combined across batches with Chan's
+  pairwise update),
+- the minimum and maximum,
+- a fixed-bin histogram plus under/overflow counts,
+- optionally a :class:`QuantileSketch` for approximate quantiles.
+
+Memory is ``O(n_atoms x bins)`` (plus ``O(n_atoms x k log(n / k))`` for the
+sketch) whatever the number of frames, and two accumulators built over
+disjoint frames combine exactly with :meth:`ChargeAccumulator.merge`, which is
+how :func:`charge_statistics` joins the partial results of worker processes.
+:class:`TrajectoryChargeStats` pairs one accumulator for the ESP charges with
+one for the RESP charges of each ``resp.out`` frame.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from parser import load_resp_offsets
+from parser.parser import Frame
+
+from .driver import stream_frames
+from .frames import resolve_frames
+
+DEFAULT_BINS = np.linspace(-1.5, 1.5, 121)
+
+_SKETCH_SIZE = 256
+
+
+def atom_labels(symbols: Sequence[str]) -> List[str]:
+    """Per-element running labels (``N1``, ``N2``, ``O1``, ...) in atom order."""
+
+    counters: Counter[str] = Counter()
+    labels = []
+    for symbol in symbols:
+        counters[symbol] += 1
+        labels.append(f"{symbol}{counters[symbol]}")
+    return labels
+
+
+class QuantileSketch:
+    """Mergeable per-atom quantile sketch (KLL-style compactors).
+
+    Level ``l`` holds samples that each stand for ``2^l`` observations.  When a
+    level reaches ``k`` samples it is sorted and every other sample (random
+    parity) is promoted to the next level.  All atoms receive one value per
+    frame, so their compactors stay in lockstep and each level is a single
+    ``(n_atoms, m)`` array.  The rank error is roughly ``n log2(n / k) / k``.
+    """
+
+    def __init__(self, n_atoms: int, *, k: int = _SKETCH_SIZE, seed: int | np.random.SeedSequence | None = None):
+        if k < 2:
+            raise ValueError("k must be at least 2")
+        self.n_atoms = int(n_atoms)
+        self.k = int(k)
+        self.count = 0
+        self.levels: List[np.ndarray] = [np.empty((self.n_atoms, 0))]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values: np.ndarray) -> None:
+        """Add a ``(n_atoms,)`` frame or a ``(n_frames, n_atoms)`` batch."""
+        values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+        self.levels[0] = np.concatenate([self.levels[0], values.T], axis=1)
+        self.count += values.shape[0]
+        self._compress()
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        if other.n_atoms != self.n_atoms or other.k != self.k:
+            raise ValueError("Can only merge sketches with the same number of atoms and k")
+        for level, samples in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty((self.n_atoms, 0)))
+            self.levels[level] = np.concatenate([self.levels[level], samples], axis=1)
+        self.count += other.count
+        self._compress()
+        return self
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            samples = self.levels[level]
+            if samples.shape[1] >= self.k:
+                samples = np.sort(samples, axis=1)
+                paired = 2 * (samples.shape[1] // 2)
+                promoted = samples[:, int(self._rng.integers(2)) : paired : 2]
+                self.levels[level] = samples[:, paired:]
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty((self.n_atoms, 0)))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted], axis=1)
+            level += 1
+
+    def quantiles(self, q: Sequence[float] | float) -> np.ndarray:
+        """Approximate quantiles, shape ``(len(q), n_atoms)`` (or ``(n_atoms,)`` for a scalar)."""
+        if self.count == 0:
+            raise ValueError("Sketch is empty")
+        q_arr = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if np.any((q_arr < 0.0) | (q_arr > 1.0)):
+            raise ValueError("quantiles must lie in [0, 1]")
+        samples = np.concatenate(self.levels, axis=1)
+        weights = np.concatenate([np.full(level.shape[1], 2.0**depth) for depth, level in enumerate(self.levels)])
+        order = np.argsort(samples, axis=1)
+        sorted_samples = np.take_along_axis(samples, order, axis=1)
+        cumulative = np.cumsum(weights[order], axis=1)
+        rows = np.arange(self.n_atoms)
+        out = np.empty((q_arr.size, self.n_atoms))
+        for i, fraction in enumerate(q_arr):
+            target = fraction * cumulative[:, -1:]
+            index = np.minimum((cumulative < target).sum(axis=1), samples.shape[1] - 1)
+            out[i] = sorted_samples[rows, index]
+        return out[0] if np.ndim(q) == 0 else out
+
+
+class ChargeAccumulator:
+    """Running per-atom mean/variance, extrema, histogram and optional quantile sketch.
+
+    Parameters
+    ----------
+    n_atoms
+        Length of every charge vector.
+    bins
+        Histogram bin edges (e); values outside land in ``underflow``/``overflow``.
+    sketch
+        Keep a :class:`QuantileSketch` with ``k = sketch_size``.
+    """
+
+    def __init__(
+        self,
+        n_atoms: int,
+        *,
+        bins: Sequence[float] = DEFAULT_BINS,
+        sketch: bool = False,
+        sketch_size: int = _SKETCH_SIZE,
+        seed: int | np.random.SeedSequence | None = None,
+    ) -> None:
+        self.n_atoms = int(n_atoms)
+        self.edges = np.asarray(bins, dtype=np.float64)
+        if self.edges.ndim != 1 or self.edges.size < 2 or np.any(np.diff(self.edges) <= 0.0):
+            raise ValueError("bins must be at least two strictly increasing edges")
+        self.count = 0
+        self.mean = np.zeros(self.n_atoms)
+        self._m2 = np.zeros(self.n_atoms)
+        self.minimum = np.full(self.n_atoms, np.inf)
+        self.maximum = np.full(self.n_atoms, -np.inf)
+        self.histogram = np.zeros((self.n_atoms, self.edges.size - 1), dtype=np.int64)
+        self.underflow = np.zeros(self.n_atoms, dtype=np.int64)
+        self.overflow = np.zeros(self.n_atoms, dtype=np.int64)
+        self.sketch = QuantileSketch(self.n_atoms, k=sketch_size, seed=seed) if sketch else None
+
+    def update(self, charges: np.ndarray) -> None:
+        """Add one ``(n_atoms,)`` charge vector or a ``(n_frames, n_atoms)`` batch."""
+        batch = np.atleast_2d(np.asarray(charges, dtype=np.float64))
+        if batch.shape[1] != self.n_atoms:
+            raise ValueError(f"Expected {self.n_atoms} charges per frame, got {batch.shape[1]}")
+        if batch.shape[0] == 0:
+            return
+        n_b = batch.shape[0]
+        mean_b = batch.mean(axis=0)
+        m2_b = ((batch - mean_b) ** 2).sum(axis=0)
+        self._combine(n_b, mean_b, m2_b)
+        self.minimum = np.minimum(self.minimum, batch.min(axis=0))
+        self.maximum = np.maximum(self.maximum, batch.max(axis=0))
+
+        n_bins = self.edges.size - 1
+        # numpy.histogram convention: the last bin includes its right edge.
+        index = np.searchsorted(self.edges, batch, side="right") - 1
+        index[batch == self.edges[-1]] = n_bins - 1
+        self.underflow += (index < 0).sum(axis=0)
+        self.overflow += (index >= n_bins).sum(axis=0)
+        inside = (index >= 0) & (index < n_bins)
+        atoms = np.broadcast_to(np.arange(self.n_atoms), batch.shape)
+        flat = atoms[inside] * n_bins + index[inside]
+        self.histogram += np.bincount(flat, minlength=self.histogram.size).reshape(self.histogram.shape)
+        if self.sketch is not None:
+            self.sketch.update(batch)
+
+    def _combine(self, n_b: int, mean_b: np.ndarray, m2_b: np.ndarray) -> None:
+        n_a = self.count
+        total = n_a + n_b
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * (n_b / total)
+        self._m2 = self._m2 + m2_b + delta * delta * (n_a * n_b / total)
+        self.count = total
+
+    def merge(self, other: "ChargeAccumulator") -> "ChargeAccumulator":
+        """Fold in an accumulator built over other frames (same atoms and bins)."""
+        if other.n_atoms != self.n_atoms or not np.array_equal(other.edges, self.edges):
+            raise ValueError("Can only merge accumulators with the same number of atoms and bins")
+        if (self.sketch is None) != (other.sketch is None):
+            raise ValueError("Cannot merge accumulators with and without quantile sketches")
+        if other.count:
+            self._combine(other.count, other.mean, other._m2)
+            self.minimum = np.minimum(self.minimum, other.minimum)
+            self.maximum = np.maximum(self.maximum, other.maximum)
+            self.histogram += other.histogram
+            self.underflow += other.underflow
+            self.overflow += other.overflow
+            if self.sketch is not None:
+                self.sketch.merge(other.sketch)
+        return self
+
+    def variance(self, ddof: int = 1) -> np.ndarray:
+        if self.count <= ddof:
+            return np.full(self.n_atoms, np.nan)
+        return self._m2 / (self.count - ddof)
+
+    def std(self, ddof: int = 1) -> np.ndarray:
+        return np.sqrt(self.variance(ddof))
+
+    def density(self) -> np.ndarray:
+        """Histogram normalised like ``numpy.histogram(..., density=True)`` per atom."""
+        counts = self.histogram.sum(axis=1, keepdims=True)
+        widths = np.diff(self.edges)
+        return np.divide(self.histogram, counts * widths, out=np.zeros(self.histogram.shape), where=counts > 0)
+
+    def quantiles(self, q: Sequence[float] | float) -> np.ndarray:
+        if self.sketch is None:
+            raise ValueError("Quantiles need an accumulator created with sketch=True")
+        return self.sketch.quantiles(q)
+
+    def to_columns(self, prefix: str = "") -> Dict[str, np.ndarray]:
+        columns = {
+            f"{prefix}count": np.asarray(self.count),
+            f"{prefix}mean": self.mean,
+            f"{prefix}std": self.std(),
+            f"{prefix}min": self.minimum,
+            f"{prefix}max": self.maximum,
+            f"{prefix}histogram": self.histogram,
+            f"{prefix}underflow": self.underflow,
+            f"{prefix}overflow": self.overflow,
+            f"{prefix}bin_edges": self.edges,
+        }
+        if self.sketch is not None and self.count:
+            columns[f"{prefix}quartiles"] = self.quantiles([0.25, 0.5, 0.75])
+        return columns
+
+
+class TrajectoryChargeStats:
+    """ESP and RESP charge accumulators fed by parsed ``resp.out`` frames.
+
+    Frames without RESP charges only update the ESP side.
+    """
+
+    def __init__(self, n_atoms: int, **options: Any) -> None:
+        seed = options.pop("seed", None)
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        esp_seed, resp_seed = seed.spawn(2)
+        self.esp = ChargeAccumulator(n_atoms, seed=esp_seed, **options)
+        self.resp = ChargeAccumulator(n_atoms, seed=resp_seed, **options)
+
+    def update(self, frame: Frame) -> None:
+        self.esp.update(np.asarray(frame.esp_charges, dtype=np.float64))
+        if frame.resp_charges:
+            self.resp.update(np.asarray(frame.resp_charges, dtype=np.float64))
+
+    def update_frames(self, frames: Iterable[Frame]) -> "TrajectoryChargeStats":
+        for frame in frames:
+            self.update(frame)
+        return self
+
+    def merge(self, other: "TrajectoryChargeStats") -> "TrajectoryChargeStats":
+        self.esp.merge(other.esp)
+        self.resp.merge(other.resp)
+        return self
+
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        columns = self.esp.to_columns("esp_")
+        columns.update(self.resp.to_columns("resp_"))
+        return columns
+
+
+def _stats_task(task: Tuple[str, int, str | slice | Sequence[int] | None, Dict[str, Any]]) -> TrajectoryChargeStats:
+    resp_out, number_of_atoms, selection, options = task
+    stats = TrajectoryChargeStats(number_of_atoms, **options)
+    return stats.update_frames(frame for _index, frame in stream_frames(resp_out, number_of_atoms, selection))
+
+
+def charge_statistics(
+    resp_out: Path | str,
+    number_of_atoms: int,
+    frames: str | slice | Sequence[int] | None = None,
+    *,
+    bins: Sequence[float] = DEFAULT_BINS,
+    sketch: bool = False,
+    sketch_size: int = _SKETCH_SIZE,
+    seed: int | None = None,
+    jobs: int = 1,
+) -> TrajectoryChargeStats:
+    """Per-atom ESP/RESP charge statistics over the selected frames of ``resp_out``.
+
+    Frames are parsed lazily; with ``jobs > 1`` the selection is split into
+    contiguous ranges, each worker process accumulates its own range and the
+    partial results are merged in order.  Each worker receives its frame
+    indices as an explicit list, so any selection splits correctly.
+    """
+
+    options: Dict[str, Any] = {"bins": np.asarray(bins, dtype=np.float64), "sketch": sketch, "sketch_size": sketch_size}
+    offsets = load_resp_offsets(resp_out)
+    if jobs <= 1 or len(offsets) < 2:
+        return _stats_task((str(resp_out), number_of_atoms, frames, {**options, "seed": seed}))
+
+    indices = resolve_frames(frames, len(offsets))
+    seeds = np.random.SeedSequence(seed).spawn(jobs)
+    tasks = []
+    for part, chunk in enumerate(np.array_split(np.asarray(indices), jobs)):
+        if chunk.size:
+            tasks.append((str(resp_out), number_of_atoms, chunk.tolist(), {**options, "seed": seeds[part]}))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        partials = list(pool.map(_stats_task, tasks))
+    result = partials[0]
+    for partial in partials[1:]:
+        result.merge(partial)
+    return result
+
+
+__all__ = [
+    "ChargeAccumulator",
+    "DEFAULT_BINS",
+    "QuantileSketch",
+    "TrajectoryChargeStats",
+    "atom_labels",
+    "charge_statistics",
+]
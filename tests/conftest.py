@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import NamedTuple, Sequence, Tuple
+
+import numpy as np
+import pytest
+
+from linearESPcharges.linear import ANGSTROM_TO_BOHR, build_design_matrix, explicit_solution
+from parser import ParseDotXYZ, ParseESPXYZ, write_esp_xyz, write_resp_out
+from parser.parser import ESPGridFrame, Frame
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data" / "raw"
+ESP_XYZ = DATA_DIR / "esp.xyz"
+GEOM_XYZ = DATA_DIR / "1.pose.xyz"
+SMALL_SYSTEM_CHARGES = np.array([0.4, -0.2, -0.3, 0.1])
+
+
+class SampleSystem(NamedTuple):
+    A: np.ndarray
+    V: np.ndarray
+    grid_bohr: np.ndarray
+    atoms_bohr: np.ndarray
+    symbols: Sequence[str]
+
+
+@pytest.fixture(scope="session")
+def sample_system():
+    """Build the first-frame fitting problem on every ``stride``-th grid point."""
+
+    geometry = ParseDotXYZ(GEOM_XYZ).elements()[0]
+    grid = ParseESPXYZ(ESP_XYZ).frames()[0]
+    atoms_bohr = np.asarray(geometry.coordinates) * ANGSTROM_TO_BOHR
+
+    def build(stride: int = 1) -> SampleSystem:
+        grid_bohr = np.asarray(grid.coordinates[::stride]) * ANGSTROM_TO_BOHR
+        V = np.asarray(grid.potentials[::stride])
+        return SampleSystem(build_design_matrix(grid_bohr, atoms_bohr), V, grid_bohr, atoms_bohr, geometry.symbols)
+
+    return build
+
+
+class SyntheticTrajectory(NamedTuple):
+    resp_out: Path
+    esp_xyz: Path
+    charges: np.ndarray
+    symbols: Sequence[str]
+
+
+@pytest.fixture(scope="session")
+def synthetic_trajectory():
+    """Write a resp.out/esp.xyz pair whose ESP charges are exact fits on the strided sample grid.
+
+    ``n_atoms`` keeps the first atoms of the sample geometry; frames after the
+    first use positions jittered by ``jitter`` bohr.
+    """
+
+    geometry = ParseDotXYZ(GEOM_XYZ).elements()[0]
+    sample_grid = ParseESPXYZ(ESP_XYZ).frames()[0]
+
+    def write(
+        directory: Path,
+        *,
+        n_atoms: int | None = None,
+        stride: int = 4,
+        n_frames: int = 1,
+        jitter: float = 0.0,
+        total_charge: float = 1.0,
+    ) -> SyntheticTrajectory:
+        n_atoms = n_atoms or len(geometry.symbols)
+        grid = ESPGridFrame(sample_grid.coordinates[::stride], sample_grid.potentials[::stride])
+        grid_bohr = np.asarray(grid.coordinates) * ANGSTROM_TO_BOHR
+        V = np.asarray(grid.potentials)
+
+        rng = np.random.default_rng(0)
+        base = np.asarray(geometry.coordinates[:n_atoms]) * ANGSTROM_TO_BOHR
+        frames = []
+        charges = []
+        for _ in range(n_frames):
+            positions = base + rng.normal(scale=jitter, size=base.shape) if jitter > 0.0 else base
+            q = explicit_solution().fit(build_design_matrix(grid_bohr, positions), V, total_charge)["q"]
+            charges.append(q)
+            frames.append(
+                Frame(
+                    center_of_mass=(0.0, 0.0, 0.0),
+                    dipole_moment_vector=(1.0, 0.0, 0.0),
+                    dipole_moment_magnitude=1.0,
+                    positions=[tuple(row) for row in positions],
+                    esp_charges=list(q),
+                    exposure_fractions=[1.0] * n_atoms,
+                    esp_rms_error=0.1,
+                    resp_charges=list(q),
+                    resp_rms_error=0.1,
+                )
+            )
+
+        directory.mkdir(parents=True, exist_ok=True)
+        resp_out = write_resp_out(directory / "resp.out", frames, geometry.symbols[:n_atoms])
+        esp_xyz = write_esp_xyz(directory / "esp.xyz", [grid])
+        return SyntheticTrajectory(resp_out, esp_xyz, np.asarray(charges), geometry.symbols[:n_atoms])
+
+    return write
+
+
+@pytest.fixture(scope="session")
+def small_system():
+    """Build a seeded four-atom test problem: a 6-9 bohr shell of grid points around random atoms."""
+
+    def build(seed: int, n_points: int = 400, noise: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+        rng = np.random.default_rng(seed)
+        atoms = rng.uniform(-2.0, 2.0, size=(4, 3))
+        directions = rng.normal(size=(n_points, 3))
+        directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+        grid = directions * rng.uniform(6.0, 9.0, size=(n_points, 1))
+        A = build_design_matrix(grid, atoms)
+        V = A @ SMALL_SYSTEM_CHARGES
+        if noise > 0.0:
+            V = V + rng.normal(scale=noise, size=n_points)
+        return A, V
+
+    return build
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+import numpy as np
+
+from linearESPcharges.batch import MoleculeSystem, fit_systems
+from linearESPcharges.linear import explicit_solution, prepare_linear_system
+
+
+def test_batched_systems_match_individual_fits_in_input_order(tmp_path, synthetic_trajectory):
+    systems = []
+    for n, charge in [(12, 0.0), (30, 1.0), (10, -1.0), (16, 0.0)]:
+        written = synthetic_trajectory(tmp_path / f"fragment{n}", n_atoms=n, stride=8, total_charge=charge)
+        systems.append(MoleculeSystem(written.resp_out, written.esp_xyz, n))
+
+    results = fit_systems(systems, bucket_width=8, jobs=2)
+
+    assert [result["q"].shape[0] for result in results] == [12, 30, 10, 16]
+    for system, result in zip(systems, results):
+        A, V, Q, _ = prepare_linear_system(system.resp_out, system.esp_xyz, system.number_of_atoms)
+        reference = explicit_solution().fit(A, V, Q)
+        np.testing.assert_allclose(result["q"], reference["q"], rtol=0.0, atol=1e-8)
+        assert abs(result["sum_q"] - Q) < 1e-10
+        np.testing.assert_allclose(result["rmse"], reference["rmse"], rtol=1e-6)
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+
+from parser import write_resp_out
+from parser.parser import Frame
+from trajectory.stats import ChargeAccumulator, atom_labels, charge_statistics
+
+N_ATOMS = 3
+
+
+def _frames(n_frames: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    esp = rng.normal(loc=[-0.6, 0.1, 0.4], scale=[0.05, 0.2, 0.1], size=(n_frames, N_ATOMS))
+    frames = [
+        Frame(
+            center_of_mass=(0.0, 0.0, 0.0),
+            dipole_moment_vector=(0.0, 0.0, 1.0),
+            dipole_moment_magnitude=1.0,
+            positions=[(float(i), 0.0, 0.0) for i in range(N_ATOMS)],
+            esp_charges=list(row),
+            exposure_fractions=[1.0] * N_ATOMS,
+            esp_rms_error=0.1,
+            resp_charges=list(0.5 * row),
+            resp_rms_error=0.1,
+        )
+        for row in esp
+    ]
+    return frames, esp
+
+
+def test_accumulator_matches_numpy_and_merges_exactly():
+    _, esp = _frames(1000)
+    bins = np.linspace(-1.0, 0.6, 33)
+
+    whole = ChargeAccumulator(N_ATOMS, bins=bins, sketch=True, sketch_size=64, seed=1)
+    for row in esp:
+        whole.update(row)
+    left = ChargeAccumulator(N_ATOMS, bins=bins, sketch=True, sketch_size=64, seed=2)
+    right = ChargeAccumulator(N_ATOMS, bins=bins, sketch=True, sketch_size=64, seed=3)
+    left.update(esp[:317])
+    right.update(esp[317:])
+    merged = left.merge(right)
+
+    for acc in (whole, merged):
+        assert acc.count == 1000
+        np.testing.assert_allclose(acc.mean, esp.mean(axis=0), rtol=1e-12)
+        np.testing.assert_allclose(acc.std(), esp.std(axis=0, ddof=1), rtol=1e-10)
+        np.testing.assert_array_equal(acc.minimum, esp.min(axis=0))
+        for atom in range(N_ATOMS):
+            counts, _ = np.histogram(esp[:, atom], bins=bins)
+            np.testing.assert_array_equal(acc.histogram[atom], counts)
+            inside = (esp[:, atom] >= bins[0]) & (esp[:, atom] <= bins[-1])
+            assert acc.underflow[atom] + acc.overflow[atom] == np.count_nonzero(~inside)
+        # rank error of the sketch stays within a few percent of the frames
+        medians = acc.quantiles(0.5)
+        ranks = (esp < medians).mean(axis=0)
+        assert np.all(np.abs(ranks - 0.5) < 0.05)
+
+    assert atom_labels(["N", "C", "N", "O"]) == ["N1", "C1", "N2", "O1"]
+
+
+def test_charge_statistics_streams_resp_out(tmp_path: Path):
+    frames, esp = _frames(40, seed=4)
+    resp_out = write_resp_out(tmp_path / "resp.out", frames, ["N", "C", "O"])
+
+    serial = charge_statistics(resp_out, N_ATOMS, "1::3")
+    parallel = charge_statistics(resp_out, N_ATOMS, "1::3", jobs=3)
+    selected = np.round(esp[1::3], 6)
+
+    for stats in (serial, parallel):
+        assert stats.esp.count == stats.resp.count == selected.shape[0]
+        np.testing.assert_allclose(stats.esp.mean, selected.mean(axis=0), atol=1e-12)
+        np.testing.assert_allclose(stats.resp.std(), np.round(0.5 * esp[1::3], 6).std(axis=0, ddof=1), atol=1e-6)
+    np.testing.assert_array_equal(serial.esp.histogram, parallel.esp.histogram)
+    assert set(serial.to_columns()) >= {"esp_mean", "resp_histogram", "esp_bin_edges"}
+
+    # Explicit index lists have no common step; every worker must still get its own frames.
+    chosen = [0, 5, 6, 20, 33]
+    for stats in (charge_statistics(resp_out, N_ATOMS, chosen), charge_statistics(resp_out, N_ATOMS, chosen, jobs=2)):
+        assert stats.esp.count == len(chosen)
+        np.testing.assert_allclose(stats.esp.mean, np.round(esp[chosen], 6).mean(axis=0), atol=1e-12)
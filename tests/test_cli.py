@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from cli import main
+from trajectory import parse_frame_range, resolve_frames
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data" / "raw"
+GEOM_XYZ = DATA_DIR / "1.pose.xyz"
+NUMBER_OF_ATOMS = 78
+N_FRAMES = 4
+
+
+def test_parse_frame_range():
+    assert parse_frame_range("0:1200:10") == slice(0, 1200, 10)
+    assert parse_frame_range(":") == slice(None, None, None)
+    assert resolve_frames("-1", 5) == [4]
+    assert resolve_frames("1::2", 6) == [1, 3, 5]
+    with pytest.raises(ValueError):
+        resolve_frames("3:3", 10)
+
+
+def test_fit_linear_writes_selected_frames(tmp_path, synthetic_trajectory):
+    resp_out, esp_xyz, charges, _ = synthetic_trajectory(tmp_path, n_frames=N_FRAMES, jitter=0.02)
+    output = tmp_path / "linear.npz"
+
+    main(["fit-linear", str(resp_out), str(esp_xyz), str(NUMBER_OF_ATOMS), "--frames", "1::2", "-o", str(output)])
+
+    with np.load(output) as columns:
+        np.testing.assert_array_equal(columns["frame"], [1, 3])
+        assert columns["charges"].shape == (2, NUMBER_OF_ATOMS)
+        # resp.out stores six decimals, so the refit matches to rounding precision
+        np.testing.assert_allclose(columns["charges"], charges[[1, 3]], atol=1e-4)
+        np.testing.assert_allclose(columns["sum_q"], 1.0, atol=1e-5)
+
+
+def test_convert_and_dipoles_agree_across_jobs(tmp_path, synthetic_trajectory):
+    resp_out, esp_xyz, *_ = synthetic_trajectory(tmp_path, n_frames=N_FRAMES, jitter=0.02)
+
+    main(["convert", str(resp_out), str(NUMBER_OF_ATOMS), "-o", str(tmp_path / "frames.npz")])
+    with np.load(tmp_path / "frames.npz") as columns:
+        assert columns["positions_bohr"].shape == (N_FRAMES, NUMBER_OF_ATOMS, 3)
+
+    serial = tmp_path / "serial.npz"
+    parallel = tmp_path / "parallel.npz"
+    common = ["dipoles", str(resp_out), str(esp_xyz), str(NUMBER_OF_ATOMS)]
+    main(common + ["-o", str(serial)])
+    main(common + ["--jobs", "2", "-o", str(parallel)])
+    with np.load(serial) as a, np.load(parallel) as b:
+        np.testing.assert_array_equal(a["frame"], b["frame"])
+        np.testing.assert_allclose(a["fitted_dipole"], b["fitted_dipole"])
+        np.testing.assert_allclose(a["fitted_dipole"], a["esp_dipole"], atol=1e-3)
+
+
+def test_fit_linear_streams_into_results_store(tmp_path, synthetic_trajectory):
+    from results import ResultsReader
+
+    resp_out, esp_xyz, charges, _ = synthetic_trajectory(tmp_path, n_frames=N_FRAMES, jitter=0.02)
+    store = tmp_path / "linear-store"
+
+    main(["fit-linear", str(resp_out), str(esp_xyz), str(NUMBER_OF_ATOMS), "--jobs", "2", "-o", str(store)])
+
+    reader = ResultsReader(store)
+    np.testing.assert_array_equal(reader["frame"], np.arange(N_FRAMES))
+    np.testing.assert_allclose(reader["charges"], charges, atol=1e-4)
+
+
+def test_threaded_pipeline_matches_sequential_fits(tmp_path, synthetic_trajectory):
+    resp_out, esp_xyz, charges, _ = synthetic_trajectory(tmp_path, n_frames=N_FRAMES, jitter=0.02)
+    common = ["fit-linear", str(resp_out), str(esp_xyz), str(NUMBER_OF_ATOMS)]
+
+    main(common + ["-o", str(tmp_path / "serial.npz")])
+    main(common + ["--threads", "2", "-o", str(tmp_path / "threaded.npz")])
+    main(common + ["--threads", "2", "--incremental-tol", "0", "-o", str(tmp_path / "incremental.npz")])
+    with np.load(tmp_path / "serial.npz") as a, np.load(tmp_path / "threaded.npz") as b:
+        np.testing.assert_array_equal(b["frame"], np.arange(N_FRAMES))
+        np.testing.assert_allclose(b["charges"], a["charges"], rtol=0.0, atol=1e-12)
+    with np.load(tmp_path / "incremental.npz") as c:
+        np.testing.assert_array_equal(c["frame"], np.arange(N_FRAMES))
+        np.testing.assert_allclose(c["charges"], charges, atol=1e-4)
+
+    with pytest.raises(SystemExit, match="loss-history"):
+        main(
+            ["fit-resp", str(resp_out), str(esp_xyz), str(NUMBER_OF_ATOMS), "--geom-xyz", str(GEOM_XYZ)]
+            + ["--loss-history", "outer", "-o", str(tmp_path / "resp-store")]
+        )
+    assert not (tmp_path / "resp-store").exists()
+
+    with pytest.raises(ValueError, match="not both"):
+        main(common + ["--threads", "2", "--jobs", "2", "-o", str(tmp_path / "both.npz")])
+
+
+def test_parity_reports_every_frame(tmp_path, synthetic_trajectory):
+    resp_out, esp_xyz, charges, _ = synthetic_trajectory(tmp_path, n_frames=N_FRAMES, jitter=0.02)
+    output = tmp_path / "parity.npz"
+
+    main(
+        ["parity", str(resp_out), str(esp_xyz), str(NUMBER_OF_ATOMS), "--geom-xyz", str(GEOM_XYZ)]
+        + ["-a", "1e-6", "--threads", "2", "-o", str(output)]
+    )
+
+    with np.load(output) as columns:
+        np.testing.assert_array_equal(columns["frame"], np.arange(N_FRAMES))
+        assert columns["fit_converged"].all()
+        # the synthetic RESP charges are unrestrained fits, so a tiny restraint reproduces them
+        np.testing.assert_allclose(columns["fit_charges"], charges, atol=1e-3)
+        assert np.all(columns["charge_max_abs_diff"] < 1e-3)
+
+    from results import ResultsReader
+
+    store = tmp_path / "parity-store"
+    main(
+        ["parity", str(resp_out), str(esp_xyz), str(NUMBER_OF_ATOMS), "--geom-xyz", str(GEOM_XYZ)]
+        + ["-a", "1e-6", "-o", str(store)]
+    )
+    reader = ResultsReader(store)
+    np.testing.assert_array_equal(reader["frame"], np.arange(N_FRAMES))
+    np.testing.assert_allclose(reader["fit_charges"], charges, atol=1e-3)
+
+
+def test_checkpoint_resumes_missing_frames_and_rejects_changed_inputs(tmp_path, synthetic_trajectory):
+    from results import ResultsReader
+    from trajectory import TrajectoryCheckpoint
+
+    resp_out, esp_xyz, charges, _ = synthetic_trajectory(tmp_path, n_frames=N_FRAMES, jitter=0.02)
+    common = ["fit-linear", str(resp_out), str(esp_xyz), str(NUMBER_OF_ATOMS), "--checkpoint", str(tmp_path / "ckpt")]
+    store = tmp_path / "linear-store"
+
+    main(common + ["--frames", "0:2", "-o", str(store)])
+    checkpoint = TrajectoryCheckpoint(
+        tmp_path / "ckpt",
+        inputs={"resp_out": resp_out, "esp_xyz": esp_xyz},
+        parameters={
+            "driver": "fit_linear",
+            "grid_frame_index": 0,
+            "total_charge": None,
+            "ridge": 0.0,
+            "precision": "double",
+            "incremental_tol": None,
+        },
+        number_of_atoms=NUMBER_OF_ATOMS,
+    )
+    assert checkpoint.completed == [0, 1]
+    # A stored row is returned as is, so the resumed run must not refit frame 1.
+    marked = checkpoint.load(1)
+    marked["rmse"] = -1.0
+    checkpoint.record(marked)
+
+    main(common + ["-o", str(tmp_path / "resumed.npz")])
+    main(common + ["-o", str(store)])
+    with np.load(tmp_path / "resumed.npz") as resumed:
+        np.testing.assert_array_equal(resumed["frame"], np.arange(N_FRAMES))
+        np.testing.assert_allclose(resumed["charges"], charges, atol=1e-4)
+        assert resumed["rmse"][1] == -1.0
+    reader = ResultsReader(store)
+    np.testing.assert_array_equal(reader["frame"], np.arange(N_FRAMES))
+    np.testing.assert_allclose(reader["charges"], charges, atol=1e-4)
+
+    with pytest.raises(ValueError, match="ridge"):
+        main(common + ["--ridge", "0.1", "-o", str(tmp_path / "ridge.npz")])
+    with esp_xyz.open("a") as fh:
+        fh.write("\n")
+    with pytest.raises(ValueError, match="esp_xyz"):
+        main(common + ["-o", str(tmp_path / "changed.npz")])
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import numpy as np
+
+from linearESPcharges.constraints import (
+    dipole_constraints,
+    group_charge_constraints,
+    stack_constraints,
+    total_charge_constraint,
+)
+from linearESPcharges.linear import constrained_solution, explicit_solution
+
+
+def test_constrained_fit_matches_explicit_and_satisfies_all_constraints(sample_system):
+    A, V, _, atoms_bohr, _ = sample_system(4)
+    N = A.shape[1]
+
+    total_only = constrained_solution().fit(A, V, *total_charge_constraint(N, 1.0))
+    reference = explicit_solution().fit(A, V, 1.0)
+    np.testing.assert_allclose(total_only["q"], reference["q"], rtol=0.0, atol=1e-8)
+
+    C, d = stack_constraints(
+        total_charge_constraint(N, 1.0),
+        group_charge_constraints(N, {"ring": range(0, 20), "tail": range(20, 30)}, {"ring": 0.5, "tail": -0.25}),
+        dipole_constraints(atoms_bohr, atoms_bohr.mean(axis=0), [1.0, -2.0, 0.5]),
+    )
+    result = constrained_solution().fit(A, V, C, d)
+    np.testing.assert_allclose(result["constraint_residual"], 0.0, atol=1e-9)
+    assert result["rmse"] >= reference["rmse"]
+
+
+def test_batched_constrained_solves_match_individual_solves(sample_system):
+    A, V, _, atoms_bohr, _ = sample_system(4)
+    N = A.shape[1]
+    rng = np.random.default_rng(1)
+    solver = constrained_solution()
+    H, g = [], []
+    C, d = [], []
+    for shift in rng.normal(scale=0.01, size=(3, N)):
+        result = solver.fit(A, V + A @ shift, *total_charge_constraint(N, 0.0))
+        H.append(result["H"])
+        g.append(result["g"])
+        C_b, d_b = stack_constraints(
+            total_charge_constraint(N, 0.0),
+            dipole_constraints(atoms_bohr, atoms_bohr.mean(axis=0), rng.normal(size=3)),
+        )
+        C.append(C_b)
+        d.append(d_b)
+
+    batch = solver.solve_batch(np.stack(H), np.stack(g), np.stack(C), np.stack(d))
+    for b in range(3):
+        single = solver.solve_normal(H[b], g[b], C[b], d[b])
+        np.testing.assert_allclose(batch["q"][b], single["q"], rtol=0.0, atol=1e-8)
+    np.testing.assert_allclose(batch["constraint_residual"], 0.0, atol=1e-9)
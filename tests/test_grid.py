@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from linearESPcharges.grid import connolly_grid, vdw_radii_bohr
+from linearESPcharges.linear import ANGSTROM_TO_BOHR, build_design_matrix
+from parser import ParseDotXYZ, ParseESPXYZ
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data" / "raw"
+GEOM_XYZ = DATA_DIR / "1.pose.xyz"
+ESP_XYZ = DATA_DIR / "esp.xyz"
+
+
+def test_connolly_grid_matches_terachem_layout():
+    geometry = ParseDotXYZ(GEOM_XYZ).elements()[0]
+    atoms_bohr = np.asarray(geometry.coordinates) * ANGSTROM_TO_BOHR
+
+    coords, owners, layers = connolly_grid(atoms_bohr, geometry.symbols, density=4.0, return_labels=True)
+
+    # resp.in uses esp_grid_dens 4.0; TeraChem wrote 11486 points for this molecule.
+    terachem_points = len(ParseESPXYZ(ESP_XYZ).frames()[0].potentials)
+    assert coords.shape[0] == pytest.approx(terachem_points, rel=0.1)
+    assert set(np.unique(layers)) == {0, 1, 2, 3}
+
+    # Points sit on their owner's sphere and outside every other sphere of the same layer.
+    radii = vdw_radii_bohr(geometry.symbols)
+    scales = np.array([1.2, 1.4, 1.6, 1.8])[layers]
+    own_distance = np.linalg.norm(coords - atoms_bohr[owners], axis=1)
+    np.testing.assert_allclose(own_distance, scales * radii[owners], rtol=1e-12)
+    distances = np.linalg.norm(coords[:, None, :] - atoms_bohr[None, :, :], axis=2)
+    assert np.all(distances >= scales[:, None] * radii[None, :] * (1.0 - 1e-12))
+
+    A = build_design_matrix(coords, atoms_bohr)
+    assert A.shape == (coords.shape[0], atoms_bohr.shape[0])
+
+
+def test_connolly_grid_density_scales_point_count():
+    geometry = ParseDotXYZ(GEOM_XYZ).elements()[0]
+    atoms_bohr = np.asarray(geometry.coordinates) * ANGSTROM_TO_BOHR
+    sparse = connolly_grid(atoms_bohr, geometry.symbols, density=1.0)
+    dense = connolly_grid(atoms_bohr, geometry.symbols, density=4.0)
+    assert dense.shape[0] / sparse.shape[0] == pytest.approx(4.0, rel=0.05)
+    with pytest.raises(KeyError):
+        connolly_grid(atoms_bohr[:1], ["Xx"])
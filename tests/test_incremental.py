@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+
+from linearESPcharges.incremental import IncrementalLinearSystem
+from linearESPcharges.linear import ANGSTROM_TO_BOHR, build_design_matrix, explicit_solution
+from parser import ParseDotXYZ, ParseESPXYZ
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data" / "raw"
+ESP_XYZ = DATA_DIR / "esp.xyz"
+GEOM_XYZ = DATA_DIR / "1.pose.xyz"
+
+
+def _trajectory(n_frames: int = 5):
+    grid = ParseESPXYZ(ESP_XYZ).frames()[0]
+    grid_bohr = np.asarray(grid.coordinates[::4]) * ANGSTROM_TO_BOHR
+    V = np.asarray(grid.potentials[::4])
+    base = np.asarray(ParseDotXYZ(GEOM_XYZ).elements()[0].coordinates) * ANGSTROM_TO_BOHR
+    rng = np.random.default_rng(4)
+    frames = [base]
+    for _ in range(n_frames - 1):
+        step = frames[-1].copy()
+        # A handful of atoms move appreciably per frame, the rest jiggle slightly.
+        step += rng.normal(scale=1e-5, size=step.shape)
+        movers = rng.choice(step.shape[0], size=6, replace=False)
+        step[movers] += rng.normal(scale=0.05, size=(6, 3))
+        frames.append(step)
+    return grid_bohr, V, frames
+
+
+def test_incremental_updates_match_full_rebuilds():
+    grid_bohr, V, frames = _trajectory()
+    exact = IncrementalLinearSystem(grid_bohr, V, tolerance=0.0)
+    screened = IncrementalLinearSystem(grid_bohr, V, tolerance=1e-3)
+
+    for index, positions in enumerate(frames):
+        reference = explicit_solution().fit(build_design_matrix(grid_bohr, positions), V, 1.0)
+        rebuilt = exact.update(positions)
+        report = screened.update(positions)
+        # With tolerance 0 every jiggling atom counts as moved, so each frame is a full rebuild.
+        assert rebuilt.full_rebuild
+        assert rebuilt.columns_recomputed == positions.shape[0]
+
+        np.testing.assert_allclose(exact.fit(1.0)["q"], reference["q"], rtol=0.0, atol=1e-8)
+        np.testing.assert_allclose(screened.H, screened.A.T @ screened.A, rtol=1e-12)
+        if index == 0:
+            assert report.full_rebuild
+        else:
+            assert not report.full_rebuild
+            assert report.columns_recomputed == 6
+            assert np.max(np.abs(screened.fit(1.0)["q"] - reference["q"])) < 1e-3
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import contextvars
+import json
+
+import numpy as np
+
+from instrumentation import active_recorder, count, frame_scope, recording, stage
+from resp.resp import fit_resp_system
+
+
+def test_hooks_are_inert_without_recorder():
+    def hooks():
+        assert active_recorder() is None
+        with stage("unused"):
+            count("unused")
+
+    hooks()
+    # A context captured before recording starts stays unrecorded while it runs.
+    outside = contextvars.copy_context()
+    with recording() as recorder:
+        outside.run(hooks)
+        assert recorder.stages == {} and recorder.counters == {}
+        with stage("used"):
+            count("used")
+    assert set(recorder.stages) == {"used"} and recorder.counters == {"used": 1}
+    assert active_recorder() is None
+
+
+def test_resp_solver_stages_and_counters_are_recorded(tmp_path, small_system):
+    A, V = small_system(3)
+    mask = np.ones(A.shape[1], dtype=bool)
+
+    with recording(trace=True) as recorder:
+        with frame_scope(7):
+            result = fit_resp_system(A, V, mask, 0.0, history="all")
+
+    assert {"resp.initial_guess", "resp.newton_krylov", "linear.explicit_fit"} <= set(recorder.stages)
+    evaluations = recorder.counters["resp.residual_evaluations"]
+    assert evaluations == len(result["loss_history"])
+    assert recorder.counters["resp.matvecs"] == 2 * evaluations
+    assert recorder.counters["resp.outer_iterations"] >= 1
+    assert recorder.frame_counters[7]["resp.residual_evaluations"] == evaluations
+
+    payload = json.loads(recorder.write_json(tmp_path / "trace.json").read_text())
+    assert payload["frames"]["7"]["counters"]["resp.matvecs"] == 2 * evaluations
+    assert all(event["frame"] == 7 for event in payload["events"])
+    assert "resp.newton_krylov" in recorder.summary()
@@ -68,3 +68,118 @@ def _read_unrestrained_rrms(resp_path: Path, n_atoms: int) -> float:
     if last.esp_rms_error is None:
         raise ValueError("ESP RRMS not available for last frame")
     return float(last.esp_rms_error)
+
+
+def test_mixed_precision_matches_double_precision_fit():
+    from linearESPcharges.linear import ANGSTROM_TO_BOHR, build_design_matrix
+    from parser import ParseDotXYZ, ParseESPXYZ
+
+    grid = ParseESPXYZ(ESP_XYZ).frames()[0]
+    grid_bohr = np.asarray(grid.coordinates) * ANGSTROM_TO_BOHR
+    V = np.asarray(grid.potentials)
+    atoms_bohr = np.asarray(ParseDotXYZ(DATA_DIR / "1.pose.xyz").elements()[0].coordinates) * ANGSTROM_TO_BOHR
+
+    A64 = build_design_matrix(grid_bohr, atoms_bohr)
+    A32 = build_design_matrix(grid_bohr, atoms_bohr, dtype=np.float32)
+    assert A32.dtype == np.float32
+    assert A32.nbytes * 2 == A64.nbytes
+
+    res64 = explicit_solution().fit(A64, V, 1.0)
+    res32 = explicit_solution().fit(A32, V, 1.0)
+
+    max_charge_error = float(np.max(np.abs(res32["q"] - res64["q"])))
+    print(f"mixed vs double precision: max |dq| = {max_charge_error:.3e}")
+    assert res32["H"].dtype == np.float64
+    assert max_charge_error < 1e-4
+    assert res32["sum_q"] == pytest.approx(1.0, abs=1e-10)
+    assert res32["rrms"] == pytest.approx(res64["rrms"], rel=1e-5)
+
+
+@pytest.mark.parametrize("method", ["cg", "lsqr"])
+def test_matrix_free_solver_matches_explicit_solution(method):
+    from linearESPcharges.iterative import CoulombOperator, iterative_solution
+    from linearESPcharges.linear import ANGSTROM_TO_BOHR, build_design_matrix
+    from parser import ParseDotXYZ, ParseESPXYZ
+
+    grid = ParseESPXYZ(ESP_XYZ).frames()[0]
+    grid_bohr = np.asarray(grid.coordinates[::3]) * ANGSTROM_TO_BOHR
+    V = np.asarray(grid.potentials[::3])
+    atoms_bohr = np.asarray(ParseDotXYZ(DATA_DIR / "1.pose.xyz").elements()[0].coordinates) * ANGSTROM_TO_BOHR
+
+    operator = CoulombOperator(grid_bohr, atoms_bohr, tile_rows=1000)
+    reference = explicit_solution().fit(build_design_matrix(grid_bohr, atoms_bohr), V, 1.0)
+    solver = iterative_solution(method=method, tol=1e-12)
+    cold = solver.fit(operator, V, 1.0)
+
+    assert cold["converged"]
+    np.testing.assert_allclose(cold["q"], reference["q"], rtol=0.0, atol=1e-6)
+    assert cold["sum_q"] == pytest.approx(1.0, abs=1e-12)
+    assert cold["rrms"] == pytest.approx(reference["rrms"], rel=1e-8)
+
+    warm = solver.fit(operator, V, 1.0, x0=cold["q"])
+    assert warm["iterations"] < cold["iterations"]
+
+    # The ridge penalises the charges themselves, whatever the starting point.
+    ridged = explicit_solution(ridge=0.01).fit(build_design_matrix(grid_bohr, atoms_bohr), V, 1.0)
+    x0 = np.random.default_rng(0).normal(scale=0.5, size=atoms_bohr.shape[0])
+    for start in (None, x0):
+        fit = iterative_solution(method=method, tol=1e-12, ridge=0.01).fit(operator, V, 1.0, x0=start)
+        np.testing.assert_allclose(fit["q"], ridged["q"], rtol=0.0, atol=1e-6)
+
+
+def test_compressed_operator_meets_tolerance_and_fits_like_dense():
+    from linearESPcharges.compressed import CompressedCoulombOperator
+    from linearESPcharges.grid import connolly_grid
+    from linearESPcharges.iterative import CoulombOperator, iterative_solution
+    from linearESPcharges.linear import ANGSTROM_TO_BOHR, build_design_matrix
+    from parser import ParseDotXYZ
+
+    geometry = ParseDotXYZ(DATA_DIR / "1.pose.xyz").elements()[0]
+    molecule = np.asarray(geometry.coordinates) * ANGSTROM_TO_BOHR
+    spacing = np.ptp(molecule, axis=0) + 8.0
+    atoms_bohr = np.concatenate([molecule + spacing * [i, j, 0] for i in range(2) for j in range(2)])
+    grid_bohr = connolly_grid(atoms_bohr, list(geometry.symbols) * 4)
+
+    exact = CoulombOperator(grid_bohr, atoms_bohr)
+    compressed = CompressedCoulombOperator(grid_bohr, atoms_bohr, tol=1e-6)
+    assert compressed.compression_ratio < 0.8
+
+    rng = np.random.default_rng(0)
+    q = rng.normal(size=atoms_bohr.shape[0])
+    r = rng.normal(size=grid_bohr.shape[0])
+    assert np.linalg.norm(compressed @ q - exact @ q) <= 1e-5 * np.linalg.norm(exact @ q)
+    assert np.linalg.norm(compressed.T @ r - exact.T @ r) <= 1e-5 * np.linalg.norm(exact.T @ r)
+
+    V = exact @ rng.normal(scale=0.3, size=atoms_bohr.shape[0])
+    reference = explicit_solution().fit(build_design_matrix(grid_bohr, atoms_bohr), V, 0.0)
+    fitted = iterative_solution(method="lsqr", tol=1e-10).fit(compressed, V, 0.0)
+    assert fitted["sum_q"] == pytest.approx(0.0, abs=1e-10)
+    assert fitted["rmse"] == pytest.approx(reference["rmse"], abs=1e-5 * np.sqrt(np.mean(V**2)))
+
+
+def test_design_matrices_are_reused_per_grid_and_geometry():
+    from linearESPcharges import ANGSTROM_TO_BOHR, DesignMatrixCache, clear_design_matrix_cache, linear_system_from_frames
+    from linearESPcharges.design_cache import design_matrix_cache
+    from parser import ParseDotXYZ, ParseESPXYZ
+    from parser.parser import Frame
+
+    grid = ParseESPXYZ(ESP_XYZ).frames([0])[0]
+    positions = np.asarray(ParseDotXYZ(DATA_DIR / "1.pose.xyz").elements()[0].coordinates) * ANGSTROM_TO_BOHR
+    frame = Frame(positions=[tuple(row) for row in positions], esp_charges=[0.0] * NUMBER_OF_ATOMS)
+    moved = Frame(positions=[tuple(row) for row in positions + 0.01], esp_charges=[0.0] * NUMBER_OF_ATOMS)
+
+    clear_design_matrix_cache()
+    A = linear_system_from_frames(frame, grid)[0]
+    assert linear_system_from_frames(frame, grid)[0] is A
+    assert linear_system_from_frames(moved, grid)[0] is not A
+    assert linear_system_from_frames(frame, grid, precision="mixed")[0].dtype == np.float32
+    assert (design_matrix_cache().hits, design_matrix_cache().misses) == (1, 3)
+    assert not A.flags.writeable
+
+    small = DesignMatrixCache(max_entries=1)
+    grid_bohr = np.asarray(grid.coordinates[:100])
+    first = small.get(grid_bohr, positions)
+    small.get(grid_bohr, positions + 0.01)
+    assert len(small) == 1
+    assert small.get(grid_bohr, positions) is not first
+    clear_design_matrix_cache()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from resp.parity import infer_a_batch, kkt_residuals_batch, parity_from_statistics
+from resp.resp import HyperbolicRestraint, fit_resp_system, infer_a_from_tc, kkt_residual_at
+
+SYMBOLS = ["C", "H", "O", "N"]
+
+
+def test_batched_kkt_and_inferred_a_match_single_frame_checks(small_system):
+    pytest.importorskip("scipy")
+    systems = [small_system(seed, n_points=300, noise=1e-3) for seed in range(8, 12)]
+    restraint = HyperbolicRestraint(a=5e-3, b=0.1)
+    mask = np.array([True, False, True, True])
+    charges = np.stack([fit_resp_system(A, V, mask, 0.0, restraint=restraint, history="off")["charges"] for A, V in systems])
+    H = np.stack([A.T @ A for A, _ in systems])
+    g = np.stack([A.T @ V for A, V in systems])
+
+    kkt = kkt_residuals_batch(H, g, charges, 0.0, mask, restraint=restraint)
+    inferred = infer_a_batch(H, g, charges, mask, b=restraint.b)
+    for f, (A, V) in enumerate(systems):
+        single = kkt_residual_at(charges[f], A, V, SYMBOLS, 0.0, a=restraint.a, b=restraint.b, restrain_all_atoms=False)
+        assert kkt["lambda_star"][f] == pytest.approx(single["lambda_star"], rel=1e-8)
+        assert kkt["grad_inf_norm"][f] == pytest.approx(single["grad_inf_norm"], rel=1e-6, abs=1e-12)
+        reference = infer_a_from_tc(charges[f], A, V, SYMBOLS, b=restraint.b, restrain_all_atoms=False)
+        assert inferred["a_hat"][f] == pytest.approx(reference["a_hat"], rel=1e-6)
+        assert inferred["a_hat"][f] == pytest.approx(restraint.a, rel=1e-4)
+
+    statistics = {
+        "frame": np.arange(len(systems)),
+        "H": H,
+        "g": g,
+        "vv": np.array([V @ V for _, V in systems]),
+        "total_charge": np.zeros(len(systems)),
+        "resp_charges": charges,
+        "esp_charges": charges,
+    }
+    report = parity_from_statistics(statistics, mask, restraint=restraint)
+    assert report.columns["fit_converged"].all()
+    np.testing.assert_allclose(report.columns["fit_charges"], charges, atol=1e-8)
+    expected_rrms = [np.sqrt(np.sum((A @ q - V) ** 2) / (V @ V)) for (A, V), q in zip(systems, charges)]
+    np.testing.assert_allclose(report.columns["tc_rrms"], expected_rrms, rtol=1e-6)
+    assert "a_hat" in report.summary()
+
+
+def test_frames_without_terachem_resp_charges_are_refitted_but_not_compared(small_system):
+    pytest.importorskip("scipy")
+    systems = [small_system(seed, n_points=300, noise=1e-3) for seed in range(8, 11)]
+    restraint = HyperbolicRestraint(a=5e-3, b=0.1)
+    mask = np.ones(4, dtype=bool)
+    charges = np.stack([fit_resp_system(A, V, mask, 0.0, restraint=restraint, history="off")["charges"] for A, V in systems])
+    tc = charges.copy()
+    tc[1] = np.nan
+    statistics = {
+        "frame": np.arange(len(systems)),
+        "H": np.stack([A.T @ A for A, _ in systems]),
+        "g": np.stack([A.T @ V for A, V in systems]),
+        "vv": np.array([V @ V for _, V in systems]),
+        "total_charge": np.zeros(len(systems)),
+        "resp_charges": tc,
+        "esp_charges": charges,
+    }
+
+    report = parity_from_statistics(statistics, mask, restraint=restraint)
+    columns = report.columns
+    assert columns["fit_converged"].all()
+    np.testing.assert_allclose(columns["fit_charges"], charges, atol=1e-8)
+    for name in ("a_hat", "tc_grad_inf_norm", "tc_charge_violation", "charge_max_abs_diff", "tc_rrms"):
+        assert np.isnan(columns[name][1])
+        assert np.all(np.isfinite(columns[name][[0, 2]]))
+    np.testing.assert_allclose(columns["a_hat"][[0, 2]], restraint.a, rtol=1e-4)
+    assert "a_hat" in report.summary()
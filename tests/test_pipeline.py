@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from trajectory.pipeline import ordered_pipeline
+
+
+def test_pipeline_keeps_order_and_bounds_read_ahead():
+    lock = threading.Lock()
+    produced = []
+    consumed = []
+    read_ahead = []
+
+    def source():
+        for item in range(40):
+            with lock:
+                produced.append(item)
+                read_ahead.append(len(produced) - len(consumed))
+            yield item
+
+    def work(item):
+        # Later items finish first, so ordering has to be restored.
+        time.sleep(0.002 * (item % 3))
+        return item * item
+
+    for result in ordered_pipeline(source(), work, workers=3, depth=4):
+        with lock:
+            consumed.append(result)
+        time.sleep(0.002)
+
+    assert consumed == [item * item for item in range(40)]
+    # depth items in the queue and pool, one held by the reader, one being consumed
+    assert max(read_ahead) <= 4 + 2
+
+
+def test_pipeline_propagates_errors_and_stops_reader():
+    def work(item):
+        if item == 5:
+            raise RuntimeError("bad frame")
+        return item
+
+    with pytest.raises(RuntimeError, match="bad frame"):
+        list(ordered_pipeline(iter(range(100)), work, workers=2))
+
+    def broken_source():
+        yield 0
+        raise ValueError("truncated resp.out")
+
+    with pytest.raises(ValueError, match="truncated"):
+        list(ordered_pipeline(broken_source(), lambda item: item, workers=2))
+
+    before = threading.active_count()
+    results = ordered_pipeline(iter(range(1000)), lambda item: item, workers=2)
+    assert next(results) == 0
+    results.close()
+    assert threading.active_count() <= before
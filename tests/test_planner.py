@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from linearESPcharges.iterative import CoulombOperator
+from linearESPcharges.linear import explicit_solution, prepare_linear_system
+from linearESPcharges.planner import estimate_peak_bytes, plan_fit
+from resp.resp import fit_resp_charges, infer_a_from_tc, kkt_residual_at
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data" / "raw"
+GEOM_XYZ = DATA_DIR / "1.pose.xyz"
+NUMBER_OF_ATOMS = 78
+
+
+def test_planner_respects_the_memory_budget(caplog):
+    M, N = 1_000_000, 200
+    dense = estimate_peak_bytes("dense", M, N)
+    assert estimate_peak_bytes("dense", M, N, precision="mixed") < dense
+    assert estimate_peak_bytes("matrix_free", M, N) < estimate_peak_bytes("tiled", M, N) < dense
+
+    with caplog.at_level(logging.DEBUG, logger="linearESPcharges.planner"):
+        assert plan_fit(M, N, memory_budget=2 * dense).strategy == "dense"
+        # Small N: accumulating H (M N^2) beats hundreds of O(M N) passes.
+        assert plan_fit(M, N, memory_budget=dense // 2).strategy == "tiled"
+    assert "expected peak" in caplog.text
+
+    assert plan_fit(M, 5000, memory_budget=3 * 1024**3).strategy == "matrix_free"
+    assert plan_fit(M, N, memory_budget=1).strategy == "matrix_free"
+    assert plan_fit(M, N, strategy="tiled").reason == "requested explicitly"
+    with pytest.raises(ValueError):
+        plan_fit(M, N, strategy="sparse")
+
+
+def test_operator_strategies_match_dense_fits(tmp_path, synthetic_trajectory):
+    resp_out, esp_xyz, _charges, symbols = synthetic_trajectory(tmp_path, stride=12)
+
+    # Without an explicit strategy A stays an array whatever the memory budget.
+    A, V, Q, _ = prepare_linear_system(resp_out, esp_xyz, NUMBER_OF_ATOMS, memory_budget=1)
+    assert isinstance(A, np.ndarray)
+    operator, *_ = prepare_linear_system(resp_out, esp_xyz, NUMBER_OF_ATOMS, strategy="tiled")
+    assert isinstance(operator, CoulombOperator)
+    mixed, *_ = prepare_linear_system(resp_out, esp_xyz, NUMBER_OF_ATOMS, strategy="tiled", precision="mixed")
+    assert mixed.dtype == np.float32
+
+    dense = explicit_solution().fit(A, V, Q)
+    tiled = explicit_solution(strategy="tiled").fit(operator, V, Q)
+    assert tiled["strategy"] == "tiled"
+    np.testing.assert_allclose(tiled["q"], dense["q"], rtol=0.0, atol=1e-9)
+
+    reference = fit_resp_charges(resp_out, esp_xyz, GEOM_XYZ, NUMBER_OF_ATOMS, history="off")
+    via_tiles = fit_resp_charges(resp_out, esp_xyz, GEOM_XYZ, NUMBER_OF_ATOMS, history="off", strategy="tiled")
+    np.testing.assert_allclose(via_tiles["charges"], reference["charges"], rtol=0.0, atol=1e-7)
+
+    kkt = kkt_residual_at(reference["charges"], operator, V, symbols, Q, a=0.0005, b=0.001)
+    expected = kkt_residual_at(reference["charges"], A, V, symbols, Q, a=0.0005, b=0.001)
+    assert kkt["grad_l2_norm"] == pytest.approx(expected["grad_l2_norm"], rel=1e-9)
+    inferred = infer_a_from_tc(reference["charges"], operator, V, symbols, b=0.001)
+    expected = infer_a_from_tc(reference["charges"], A, V, symbols, b=0.001)
+    assert inferred["a_hat"] == pytest.approx(expected["a_hat"], rel=1e-9)
@@ -55,3 +55,136 @@ def test_parse_dot_xyz_elements():
     assert len(first_elements.coordinates) == 78
     assert first_elements.symbols[0] == "N"
     assert first_elements.coordinates[0] == pytest.approx((20.747, 23.133, 21.972))
+
+
+def test_selected_frames_match_full_parse(tmp_path):
+    from parser import write_resp_out
+    from parser.parser import Frame
+
+    symbols = ParseDotXYZ(DATA_DIR / "1.pose.xyz").elements()[0].symbols[:3]
+    frames = [
+        Frame(
+            center_of_mass=(float(i), 0.0, 0.0),
+            positions=[(float(i), 1.0, 2.0)] * 3,
+            esp_charges=[0.1 * i, -0.1 * i, 0.0],
+            exposure_fractions=[1.0, 0.5, 0.0],
+            esp_rms_error=0.2,
+        )
+        for i in range(5)
+    ]
+    path = write_resp_out(tmp_path / "resp.out", frames, symbols)
+
+    parser = ParseRespDotOut(path, 3)
+    full = parser.extract_frames()
+    assert len(parser.frame_offsets()) == len(full) == 5
+    selected = parser.extract_frames([4, 1, -5])
+    assert [frame.center_of_mass for frame in selected] == [full[4].center_of_mass, full[1].center_of_mass, full[0].center_of_mass]
+    assert selected[0].esp_charges == pytest.approx(full[4].esp_charges)
+
+    grid_offsets = ParseESPXYZ(DATA_DIR / "esp.xyz").block_offsets()
+    assert grid_offsets == [0]
+
+
+@pytest.mark.parametrize("suffix", [".gz", ".xz", ".bz2"])
+def test_compressed_inputs_parse_like_plain_text(tmp_path, suffix):
+    import bz2
+    import gzip
+    import lzma
+
+    from parser import write_resp_out
+    from parser.parser import Frame
+
+    compress = {".gz": gzip.compress, ".xz": lzma.compress, ".bz2": bz2.compress}[suffix]
+    symbols = ParseDotXYZ(DATA_DIR / "1.pose.xyz").elements()[0].symbols[:3]
+    frames = [
+        Frame(
+            center_of_mass=(float(i), 0.0, 0.0),
+            positions=[(float(i), 1.0, 2.0)] * 3,
+            esp_charges=[0.1 * i, -0.1 * i, 0.0],
+            exposure_fractions=[1.0, 0.5, 0.0],
+        )
+        for i in range(40)
+    ]
+    plain = write_resp_out(tmp_path / "resp.out", frames, symbols)
+    packed = tmp_path / f"resp.out{suffix}"
+    packed.write_bytes(compress(plain.read_bytes()))
+    packed_grid = tmp_path / f"esp.xyz{suffix}"
+    packed_grid.write_bytes(compress((DATA_DIR / "esp.xyz").read_bytes()))
+
+    reference = ParseRespDotOut(plain, 3)
+    parser = ParseRespDotOut(packed, 3)
+    assert parser.frame_offsets() == reference.frame_offsets()
+    assert parser.extract_frames() == reference.extract_frames()
+    assert parser.extract_frames([37, 2, -1]) == reference.extract_frames([37, 2, -1])
+
+    grid = ParseESPXYZ(packed_grid)
+    assert grid.block_offsets() == ParseESPXYZ(DATA_DIR / "esp.xyz").block_offsets()
+    assert grid.frames([0])[0] == ParseESPXYZ(DATA_DIR / "esp.xyz").frames()[0]
+
+
+def test_gzip_seek_index_restarts_from_checkpoints(tmp_path):
+    import gzip
+
+    from parser.compressed import GzipSeekIndex
+
+    raw = (DATA_DIR / "esp.xyz").read_bytes()
+    path = tmp_path / "esp.xyz.gz"
+    # Two gzip members, as produced by appending to an archive.
+    path.write_bytes(gzip.compress(raw[:100_000]) + gzip.compress(raw[100_000:]))
+
+    index = GzipSeekIndex(path, spacing=16 * 1024)
+    assert index.read_at(len(raw) - 500, 200) == raw[-500:-300]
+    assert len(index) > 3
+    for offset in range(len(raw) - 1, 0, -37_003):
+        assert index.read_at(int(offset), 3000) == raw[offset : offset + 3000]
+    assert index.read_at(0) == raw
+
+
+def test_identical_grid_blocks_are_stored_once(tmp_path):
+    from parser import write_esp_xyz
+    from parser.parser import ESPGridFrame
+
+    grid = ParseESPXYZ(DATA_DIR / "esp.xyz").frames([0])[0]
+    coordinates = grid.coordinates[:50]
+    shifted = [(x + 1.0, y, z) for x, y, z in coordinates]
+    blocks = [
+        ESPGridFrame(coordinates, grid.potentials[:50]),
+        ESPGridFrame(coordinates, grid.potentials[50:100]),
+        ESPGridFrame(shifted, grid.potentials[:50]),
+    ]
+    path = write_esp_xyz(tmp_path / "esp.xyz", blocks)
+
+    parser = ParseESPXYZ(path)
+    frames = parser.frames()
+    assert frames[0].coordinates is frames[1].coordinates
+    assert frames[0].potentials != frames[1].potentials
+    assert frames[0].grid_hash == blocks[0].grid_hash != frames[2].grid_hash
+    assert list(parser.distinct_grids().values()) == [[0, 1], [2]]
+
+
+def test_sequential_gzip_reads_decompress_the_file_once(tmp_path, monkeypatch):
+    import gzip
+
+    from parser.compressed import GzipSeekIndex, _GzipCursor, _IndexedGzipReader
+
+    raw = (DATA_DIR / "esp.xyz").read_bytes()
+    path = tmp_path / "esp.xyz.gz"
+    path.write_bytes(gzip.compress(raw))
+    restarts = []
+    restart = _GzipCursor._restart
+    monkeypatch.setattr(_GzipCursor, "_restart", lambda self, offset: restarts.append(offset) or restart(self, offset))
+
+    index = GzipSeekIndex(path, spacing=16 * 1024)
+    offsets = list(range(0, len(raw), 6_000))
+    for start in range(0, len(offsets), 16):
+        # One reader per chunk of frames, as in stream_frames.
+        with _IndexedGzipReader(index) as reader:
+            for offset in offsets[start : start + 16]:
+                reader.seek(offset)
+                assert reader.read(3000) == raw[offset : offset + 3000]
+    assert restarts == [0]
+
+    with _IndexedGzipReader(index) as reader:
+        reader.seek(len(raw) // 2)
+        assert reader.read(100) == raw[len(raw) // 2 : len(raw) // 2 + 100]
+    assert len(restarts) == 2
@@ -7,7 +7,7 @@ import pytest
 
 from linearESPcharges.linear import prepare_linear_system, explicit_solution
 from parser import ParseRespDotOut
-from resp.resp import fit_resp_charges, load_geometry_symbols
+from resp.resp import fit_resp_charges, fit_resp_system, load_geometry_symbols
 
 DATA_DIR = Path(__file__).resolve().parents[1] / "data" / "raw"
 RESP_OUT = DATA_DIR / "resp.out"
@@ -93,3 +93,20 @@ def test_resp_solver_matches_terachem_last_frame():
     assert plot_path.exists(), "loss plot file was not created"
     np.testing.assert_allclose(linear_result["q"], expected_esp, rtol=0.0, atol=1e-5)
     assert linear_result["sum_q"] == pytest.approx(float(expected_esp.sum()), abs=1e-10)
+
+
+def test_loss_history_modes_share_the_solution(small_system):
+    A, V = small_system(5, n_points=300)
+    mask = np.ones(4, dtype=bool)
+
+    results = {mode: fit_resp_system(A, V, mask, 0.0, history=mode) for mode in ("off", "outer", "all")}
+
+    assert results["off"]["loss_history"] == []
+    outer = results["outer"]["loss_history"]
+    assert len(outer) >= 2
+    assert outer[-1] == pytest.approx(results["outer"]["loss"], rel=1e-12)
+    assert len(results["all"]["loss_history"]) > len(outer)
+    for mode in ("off", "all"):
+        np.testing.assert_allclose(results[mode]["charges"], results["outer"]["charges"], rtol=0.0, atol=1e-12)
+    with pytest.raises(ValueError):
+        fit_resp_system(A, V, mask, 0.0, history="sometimes")
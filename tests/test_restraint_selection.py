@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from resp.resp import HyperbolicRestraint, fit_resp_system
+from resp.selection import cross_validate_restraint, fold_statistics, solve_resp_normal
+
+
+def test_normal_equation_solver_matches_newton_krylov(small_system):
+    pytest.importorskip("scipy")
+    A, V = small_system(5, noise=2e-3)
+    mask = np.array([True, True, False, True])
+    restraint = HyperbolicRestraint(a=0.01, b=0.1)
+
+    reference = fit_resp_system(A, V, mask, 0.0, restraint=restraint, history="off")
+    result = solve_resp_normal(A.T @ A, A.T @ V, 0.0, mask, restraint=restraint)
+
+    assert result["converged"]
+    np.testing.assert_allclose(result["q"], reference["charges"], rtol=0.0, atol=1e-8)
+    assert result["lagrange_multiplier"] == pytest.approx(reference["lagrange_multiplier"], rel=1e-6)
+
+
+def test_cross_validation_matches_explicit_refits(small_system):
+    A, V = small_system(7, noise=2e-3)
+    a_values = [1e-4, 1e-2, 1.0]
+
+    selection = cross_validate_restraint(A, V, 0.0, a_values, b_values=[0.1], n_folds=4, seed=3)
+    assert selection.rmse.shape == (3, 1)
+    assert selection.best_a in a_values
+    assert selection.rmse[0, 0] < selection.rmse[2, 0]
+
+    # Recompute fold 0 of the middle candidate from its rows directly.
+    labels = np.random.default_rng(3).permutation(A.shape[0]) % 4
+    H, g, _vv, m = fold_statistics(A, V, [labels], 4)
+    np.testing.assert_allclose(H.sum(axis=0), A.T @ A, rtol=1e-12)
+    assert m.sum() == A.shape[0]
+    train = labels != 0
+    q = solve_resp_normal(
+        A[train].T @ A[train], A[train].T @ V[train], 0.0, np.ones(4, dtype=bool),
+        restraint=HyperbolicRestraint(a=1e-2, b=0.1),
+    )["q"]
+    held_out = np.sqrt(np.mean((A[~train] @ q - V[~train]) ** 2))
+    assert selection.fold_rmse[0, 1, 0] == pytest.approx(held_out, rel=1e-6)
+
+    frames = [small_system(seed, noise=2e-3) for seed in (7, 8, 9)]
+    by_frames = cross_validate_restraint(
+        [a for a, _ in frames], [v for _, v in frames], 0.0, a_values, n_folds=3, by="frames", seed=0, jobs=2
+    )
+    serial = cross_validate_restraint(
+        [a for a, _ in frames], [v for _, v in frames], 0.0, a_values, n_folds=3, by="frames", seed=0
+    )
+    np.testing.assert_allclose(by_frames.fold_rmse, serial.fold_rmse, rtol=1e-12)
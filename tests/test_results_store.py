@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from results import ResultsReader, ResultsWriter
+
+
+def _row(frame: int, n_atoms: int = 5, n_grid: int = 40) -> dict:
+    rng = np.random.default_rng(frame)
+    return {
+        "frame": frame,
+        "charges": rng.normal(size=n_atoms),
+        "rmse": float(rng.random()),
+        "lagrange_multiplier": float(rng.normal()),
+        "residual": rng.normal(size=n_grid),
+        "predicted_esp": rng.normal(size=n_grid),
+        "loss_history": list(rng.random(frame + 1)),
+    }
+
+
+def test_writer_round_trips_and_drops_grid_arrays(tmp_path):
+    store = tmp_path / "fits"
+    rows = [_row(i) for i in range(7)]
+    with ResultsWriter(store, chunk_size=3) as writer:
+        writer.extend(rows)
+        assert writer.n_rows == 7
+
+    reader = ResultsReader(store)
+    assert len(reader) == 7
+    assert set(reader.columns) == {"frame", "charges", "rmse", "lagrange_multiplier"}
+
+    charges = reader["charges"]
+    assert isinstance(charges, np.memmap)
+    np.testing.assert_array_equal(charges, np.stack([row["charges"] for row in rows]))
+    np.testing.assert_array_equal(reader.read("frame", mmap=False), np.arange(7))
+
+
+def test_writer_appends_to_existing_store_and_checks_schema(tmp_path):
+    store = tmp_path / "fits"
+    with ResultsWriter(store, columns=["frame", "charges", "residual"]) as writer:
+        writer.append(_row(0))
+
+    # Bytes appended without a schema commit (e.g. a crash mid-flush) are discarded on reopen.
+    with (store / "charges.bin").open("ab") as fh:
+        fh.write(b"\0" * 13)
+
+    with ResultsWriter(store, columns=["frame", "charges", "residual"]) as writer:
+        writer.append(_row(1))
+        with pytest.raises(ValueError):
+            writer.append(_row(2, n_atoms=6))
+        with pytest.raises(ValueError, match="dtype"):
+            writer.append({**_row(2), "charges": _row(2)["charges"].astype(np.float32)})
+
+    reader = ResultsReader(store)
+    np.testing.assert_array_equal(reader["frame"], [0, 1])
+    assert reader["residual"].shape == (2, 40)
+    np.testing.assert_array_equal(reader["charges"][1], _row(1)["charges"])
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from linearESPcharges.linear import build_design_matrix
+from linearESPcharges.spatial import CellList
+
+
+@pytest.mark.parametrize("cell_size, radius", [(2.0, 1.5), (1.0, 3.2), (5.0, 0.4)])
+def test_query_pairs_match_brute_force(cell_size, radius):
+    rng = np.random.default_rng(11)
+    points = rng.uniform(-6.0, 6.0, size=(60, 3))
+    queries = rng.uniform(-10.0, 10.0, size=(500, 3))
+
+    rows, cols, distances = CellList(points, cell_size).query_pairs(queries, radius)
+
+    dense = np.linalg.norm(queries[:, None, :] - points[None, :, :], axis=2)
+    expected = set(zip(*np.nonzero(dense <= radius)))
+    assert set(zip(rows.tolist(), cols.tolist())) == expected
+    np.testing.assert_allclose(distances, dense[rows, cols])
+
+
+def test_design_matrix_cutoff_screens_distant_pairs():
+    rng = np.random.default_rng(2)
+    atoms = rng.uniform(-3.0, 3.0, size=(12, 3))
+    grid = rng.uniform(-9.0, 9.0, size=(800, 3))
+
+    dense = build_design_matrix(grid, atoms)
+    screened = build_design_matrix(grid, atoms, cutoff=6.0)
+    np.testing.assert_allclose(screened, np.where(dense >= 1.0 / 6.0, dense, 0.0), rtol=1e-14, atol=0.0)
+
+    with pytest.raises(ValueError, match="too close"):
+        build_design_matrix(np.vstack([grid, atoms[3]]), atoms)
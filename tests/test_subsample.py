@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from linearESPcharges.subsample import apply_subsample, compare_subsampled_fit, subsample_grid
+
+
+@pytest.mark.parametrize("method", ["leverage", "stratified"])
+def test_subsampled_fit_preserves_full_grid_quality(method, sample_system):
+    A, V, *_ = sample_system()
+
+    subsample = subsample_grid(A, fraction=0.25, method=method, seed=0)
+    assert subsample.indices.size < 0.3 * A.shape[0]
+    assert np.all(subsample.weights > 0.0)
+    # Importance weights make the reduced normal equations an estimate of the full ones.
+    assert subsample.weights.sum() == pytest.approx(A.shape[0], rel=0.1)
+
+    report = compare_subsampled_fit(A, V, 1.0, subsample)
+    print(
+        f"{method}: {report['n_points']} points, RRMS full={report['rrms_full']:.5f} "
+        f"subsampled={report['rrms_subsampled']:.5f}, rms dq={report['rms_charge_diff']:.3e}"
+    )
+    assert report["q_subsampled"].sum() == pytest.approx(1.0, abs=1e-10)
+    assert report["rrms_subsampled"] >= report["rrms_full"]
+    assert report["rrms_subsampled"] <= 1.05 * report["rrms_full"]
+
+
+def test_stratified_subsample_covers_every_atom(sample_system):
+    A, V, *_ = sample_system()
+    subsample = subsample_grid(A, n_points=500, method="stratified", seed=1)
+    A_sub, V_sub = apply_subsample(A, V, subsample)
+    assert A_sub.shape == (subsample.indices.size, A.shape[1])
+    assert set(np.argmax(A[subsample.indices], axis=1)) == set(np.argmax(A, axis=1))
@@ -3,9 +3,11 @@ from __future__ import annotations
 from itertools import chain
 from pathlib import Path
 
+import numpy as np
 import pytest
 from rdkit import Chem
 
+from parser import load_topology
 from symmetry import buckets_from_graph, buckets_from_pdb, mol_to_nx
 
 
@@ -41,3 +43,17 @@ def test_buckets_from_pdb_partitions_atoms():
     assert len(flattened) == total_atoms
     assert sorted(flattened) == list(range(total_atoms))
     assert len(buckets) > 1
+
+
+def test_buckets_from_pdb_use_geometry_atom_indices():
+    repo_root = Path(__file__).resolve().parents[1]
+    topology = load_topology(repo_root / "data" / "raw" / "1.pose.xyz")
+
+    heavy = buckets_from_pdb(repo_root / "data" / "raw" / "1.pose.pdb", radius=2, topology=topology)
+    flattened = sorted(chain.from_iterable(heavy))
+    assert flattened == [int(i) for i in np.flatnonzero(topology.heavy_atom_mask)]
+
+    every_atom = buckets_from_pdb(
+        repo_root / "data" / "raw" / "1.pose.pdb", radius=2, remove_hs=False, topology=topology
+    )
+    assert sorted(chain.from_iterable(every_atom)) == list(range(topology.n_atoms))
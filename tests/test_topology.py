@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from constants.atomic_masses import atomic_masses
+from dipole import center_of_mass_bohr_from_xyz
+from dipole.dipole import BOHR_PER_ANG
+from parser import ParseDotXYZ, Topology, load_topology
+from resp.resp import _restraint_mask, load_geometry_symbols
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data" / "raw"
+GEOM_XYZ = DATA_DIR / "1.pose.xyz"
+
+
+def test_topology_is_read_once_and_matches_the_geometry():
+    topology = load_topology(GEOM_XYZ)
+    assert load_topology(GEOM_XYZ) is topology
+
+    elements = ParseDotXYZ(GEOM_XYZ).elements()[0]
+    assert list(topology.symbols) == elements.symbols == load_geometry_symbols(GEOM_XYZ)
+    np.testing.assert_array_equal(topology.masses, [atomic_masses[s] for s in elements.symbols])
+    assert topology.atomic_numbers[topology.symbols.index("C")] == 6
+    np.testing.assert_array_equal(
+        topology.restraint_mask(False), _restraint_mask(elements.symbols, restrain_all_atoms=False)
+    )
+    with pytest.raises(ValueError):
+        topology.masses[0] = 0.0
+
+    coords = np.asarray(elements.coordinates)
+    expected = (topology.masses[:, None] * coords).sum(axis=0) / topology.masses.sum() * BOHR_PER_ANG
+    np.testing.assert_allclose(center_of_mass_bohr_from_xyz(GEOM_XYZ, frame_index=0), expected, atol=1e-12)
+    assert Topology.from_symbols(["O", "H", "H"]).heavy_atom_mask.tolist() == [True, False, False]
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from linearESPcharges.linear import explicit_solution, normal_equations
+from linearESPcharges.weighting import layer_weights, point_weights
+from resp.resp import HyperbolicRestraint, _restraint_mask, fit_resp_system, kkt_residual_at
+
+
+def test_weighted_normal_equations_and_fit_match_row_scaling(sample_system):
+    A, V, *_ = sample_system(3)
+    weights = np.random.default_rng(0).uniform(0.2, 3.0, size=A.shape[0])
+
+    H, g = normal_equations(A.astype(np.float32), V, weights=weights, chunk_rows=500)
+    np.testing.assert_allclose(H, (A * weights[:, None]).T @ A, rtol=1e-5)
+    np.testing.assert_allclose(g, A.T @ (weights * V), rtol=1e-5)
+
+    weighted = explicit_solution().fit(A, V, 1.0, weights=weights)
+    scale = np.sqrt(weights)
+    scaled = explicit_solution().fit(A * scale[:, None], V * scale, 1.0)
+    np.testing.assert_allclose(weighted["q"], scaled["q"], rtol=0.0, atol=1e-10)
+    assert "weighted_rrms" in weighted
+
+
+@pytest.mark.parametrize("scheme", ["layer", "distance", "exposure"])
+def test_weighting_schemes_feed_weighted_resp(scheme, sample_system):
+    A, V, grid_bohr, atoms_bohr, symbols = sample_system(3)
+    exposure = np.linspace(0.0, 1.0, len(symbols))
+    weights = point_weights(scheme, grid_bohr, atoms_bohr, symbols, exposure_fractions=exposure)
+
+    assert weights.shape == (A.shape[0],)
+    assert np.all(weights > 0.0)
+    assert weights.mean() == pytest.approx(1.0)
+
+    mask = _restraint_mask(symbols, restrain_all_atoms=True)
+    result = fit_resp_system(A, V, mask, 1.0, weights=weights, history="off")
+    restraint = HyperbolicRestraint()
+    kkt = kkt_residual_at(
+        result["charges"], A, V, symbols, 1.0, a=restraint.a, b=restraint.b, weights=weights
+    )
+    unweighted = kkt_residual_at(result["charges"], A, V, symbols, 1.0, a=restraint.a, b=restraint.b)
+    assert kkt["grad_inf_norm"] < 1e-8
+    assert kkt["loss"] == pytest.approx(result["loss"])
+    assert unweighted["grad_inf_norm"] > 100 * kkt["grad_inf_norm"]
+
+
+def test_layer_weights_balance_layers(sample_system):
+    _, _, grid_bohr, atoms_bohr, symbols = sample_system(3)
+    weights = layer_weights(grid_bohr, atoms_bohr, symbols)
+    distinct = np.unique(np.round(weights, 12))
+    # One weight per layer; every layer carries the same total weight.
+    assert 2 <= distinct.size <= 4
+    totals = [weights[np.isclose(weights, value)].sum() for value in distinct]
+    np.testing.assert_allclose(totals, totals[0], rtol=1e-10)